@@ -1,4 +1,4 @@
-import React, { useState, useEffect } from 'react';
+import React, { useState, useEffect, useRef } from 'react';
 import { Link } from 'react-router-dom';
 import { 
   Monitor, 
@@ -13,10 +13,11 @@ import {
 } from 'lucide-react';
 import MachineCard from './MachineCard';
 import StatusSummary from './StatusSummary';
-import { fetchMachines, exportData } from '../services/api';
+import { fetchMachines, fetchMachineById, fetchSummary, exportData, subscribeEvents } from '../services/api';
 
 const Dashboard = () => {
   const [machines, setMachines] = useState([]);
+  const [summary, setSummary] = useState(null);
   const [loading, setLoading] = useState(true);
   const [error, setError] = useState(null);
   const [filters, setFilters] = useState({
@@ -25,15 +26,68 @@ const Dashboard = () => {
     search: ''
   });
 
+  const summaryTimer = useRef(null);
+
   useEffect(() => {
     loadMachines();
+    const unsubscribe = subscribeEvents({
+      onMachine: applyMachineEvent,
+      onResync: loadMachines,
+    });
+    return () => {
+      unsubscribe();
+      clearTimeout(summaryTimer.current);
+    };
   }, []);
 
+  // Patch one machine from a live event instead of refetching the list
+  const applyMachineEvent = (event) => {
+    setMachines(prev => prev.map(machine => {
+      if (machine.id !== event.id) return machine;
+      const checks = [...(machine.checks || [])];
+      event.checks.forEach(change => {
+        const index = checks.findIndex(check => check.check_name === change.check_name);
+        if (index === -1) {
+          checks.push(change);
+        } else {
+          checks[index] = { ...checks[index], ...change };
+        }
+      });
+      return {
+        ...machine,
+        last_checkin: event.last_checkin,
+        metadata: event.overall_status
+          ? { ...machine.metadata, overall_status: event.overall_status }
+          : machine.metadata,
+        checks,
+      };
+    }));
+
+    if (event.created) {
+      fetchMachineById(event.id)
+        .then(machine => setMachines(prev => (
+          prev.some(m => m.id === machine.id) ? prev : [machine, ...prev]
+        )))
+        .catch(err => console.error('Error loading new machine:', err));
+    }
+
+    // Counters come from the server; refresh them at most every few seconds
+    if (!summaryTimer.current) {
+      summaryTimer.current = setTimeout(() => {
+        summaryTimer.current = null;
+        fetchSummary()
+          .then(setSummary)
+          .catch(err => console.error('Error loading summary:', err));
+      }, 5000);
+    }
+  };
+
   const loadMachines = async () => {
     try {
       setLoading(true);
-      const data = await fetchMachines();
+      const [data, fleet] = await Promise.all([fetchMachines(), fetchSummary()]);
       setMachines(data);
+      setSummary(fleet);
       setError(null);
     } catch (err) {
       setError('Failed to load machines');
@@ -65,24 +119,6 @@ const Dashboard = () => {
     return true;
   });
 
-  const getStatusCounts = () => {
-    const counts = { healthy: 0, unhealthy: 0, unknown: 0 };
-    machines.forEach(machine => {
-      const status = machine.metadata?.overall_status || 'unknown';
-      counts[status]++;
-    });
-    return counts;
-  };
-
-  const getOSCounts = () => {
-    const counts = {};
-    machines.forEach(machine => {
-      const os = machine.os_name || 'Unknown';
-      counts[os] = (counts[os] || 0) + 1;
-    });
-    return counts;
-  };
-
   if (loading) {
     return (
       <div className="flex items-center justify-center h-64">
@@ -135,11 +171,11 @@ const Dashboard = () => {
         </div>
       </div>
 
-      {/* Status Summary */}
+      {/* Status Summary (whole fleet, counted by the server) */}
       <StatusSummary 
-        totalMachines={machines.length}
-        statusCounts={getStatusCounts()}
-        osCounts={getOSCounts()}
+        totalMachines={summary?.total ?? 0}
+        statusCounts={summary?.by_status ?? {}}
+        osCounts={summary?.by_os ?? {}}
       />
 
       {/* Filters */}
@@ -222,7 +258,7 @@ const Dashboard = () => {
       {filteredMachines.length > 0 && (
         <div className="text-center">
           <p className="text-sm text-gray-500">
-            Showing {filteredMachines.length} of {machines.length} machines
+            Showing {filteredMachines.length} of {summary?.total ?? machines.length} machines
           </p>
         </div>
       )}
@@ -56,6 +56,28 @@ export const fetchMachineById = async (id) => {
   }
 };
 
+export const fetchSummary = async () => {
+  try {
+    const response = await api.get('/summary');
+    return response;
+  } catch (error) {
+    throw new Error('Failed to fetch fleet summary');
+  }
+};
+
+// Live machine changes over Server-Sent Events. EventSource reconnects on
+// its own and resumes from the last event id it saw. Returns an unsubscribe
+// function.
+export const subscribeEvents = ({ onMachine, onResync }) => {
+  const source = new EventSource(`${API_BASE_URL}/events`);
+  source.addEventListener('machine', (e) => onMachine(JSON.parse(e.data)));
+  source.addEventListener('resync', () => onResync && onResync());
+  source.onerror = () => {
+    console.warn('Event stream interrupted, reconnecting...');
+  };
+  return () => source.close();
+};
+
 export const reportMachineStatus = async (payload) => {
   try {
     const response = await api.post('/report', payload);
@@ -2,13 +2,93 @@ from pydantic_settings import BaseSettings
 from pydantic import AnyHttpUrl
 
 
+# async driver -> sync driver used for the remaining sync code paths
+# (None keeps the dialect's default driver)
+ASYNC_DRIVERS = {"aiosqlite": None, "asyncpg": None, "aiomysql": "pymysql", "asyncmy": "pymysql"}
+
+
 class Settings(BaseSettings):
     DATABASE_URL: str = "sqlite:///./data.db"
     API_PREFIX: str = "/api"
     ALLOW_ORIGINS: list[str] = ["*"]
+    # Upper bound on the number of reports accepted by POST /report/batch
+    REPORT_BATCH_MAX_ITEMS: int = 5000
+    # Rows fetched per round trip while streaming exports
+    EXPORT_BATCH_SIZE: int = 1000
+    # Timestamp export watermarks stay this far behind the clock. Ingest stamps
+    # rows with its transaction's start time, so a write still in flight when
+    # an export runs must land above the watermark; keep it longer than the
+    # slowest ingest transaction.
+    EXPORT_WATERMARK_LAG_SECONDS: float = 60
+    # Cap on a gzip request body (Content-Encoding: gzip) after decompression
+    MAX_DECOMPRESSED_BODY_BYTES: int = 32 * 1024 * 1024
+    # Detail keys ignored when POST /report/delta decides whether a check changed
+    VOLATILE_DETAIL_KEYS: list[str] = ["duration_ms"]
+    # GET /summary is cached until the next ingest, or at most this long
+    SUMMARY_CACHE_TTL_SECONDS: float = 30
+    # GET /events: events kept for Last-Event-ID resume, per-client backlog
+    # before the client is told to resync, and keep-alive comment interval.
+    EVENTS_HISTORY_SIZE: int = 1000
+    EVENTS_QUEUE_SIZE: int = 1000
+    EVENTS_KEEPALIVE_SECONDS: float = 15
+    EVENTS_RETRY_MS: int = 3000  # reconnect delay suggested to EventSource clients
+
+    # "sync" commits each /report before responding; "queued" accepts it with
+    # 202 and writes it from a background micro-batching writer
+    INGEST_MODE: str = "sync"
+    INGEST_QUEUE_SIZE: int = 10000
+    INGEST_BATCH_SIZE: int = 500
+    INGEST_FLUSH_INTERVAL_MS: int = 200
+    # Transient database errors (locked database, dropped connection) are
+    # retried with exponential backoff before the batch is split up; reports
+    # that still cannot be written are kept in an in-memory dead-letter list
+    INGEST_WRITE_RETRIES: int = 3
+    INGEST_RETRY_BACKOFF_MS: int = 100
+    INGEST_DEAD_LETTER_MAX: int = 10000
+
+    # History retention: check_results rows whose interval ended more than
+    # RETENTION_RAW_DAYS ago are folded into daily rollups and deleted, in
+    # chunks of RETENTION_BATCH_SIZE rows per transaction. Rollups older than
+    # RETENTION_ROLLUP_DAYS are dropped (0 keeps them forever). With
+    # RETENTION_INTERVAL_HOURS > 0 the server runs retention in the background.
+    RETENTION_RAW_DAYS: int = 90
+    RETENTION_ROLLUP_DAYS: int = 730
+    RETENTION_BATCH_SIZE: int = 5000
+    RETENTION_INTERVAL_HOURS: float = 0
+    RETENTION_VACUUM: bool = True
+
+    # Connection pool (server databases such as PostgreSQL/MySQL)
+    DB_POOL_SIZE: int = 10
+    DB_MAX_OVERFLOW: int = 20
+    DB_POOL_TIMEOUT: int = 30  # seconds to wait for a free connection
+    DB_POOL_RECYCLE: int = 1800  # seconds; drop connections before server-side idle timeouts
+    DB_POOL_PRE_PING: bool = True
+
+    # SQLite profile, applied as PRAGMAs on every new connection
+    SQLITE_JOURNAL_MODE: str = "WAL"
+    SQLITE_SYNCHRONOUS: str = "NORMAL"
+    SQLITE_MMAP_SIZE: int = 256 * 1024 * 1024  # bytes
+    SQLITE_CACHE_SIZE: int = -64000  # negative = KiB, i.e. ~64 MB per connection
+    SQLITE_BUSY_TIMEOUT_MS: int = 5000
 
     class Config:
         env_file = ".env"
 
+    @property
+    def async_database(self) -> bool:
+        """True when DATABASE_URL names an async driver, e.g. sqlite+aiosqlite or postgresql+asyncpg."""
+        scheme = self.DATABASE_URL.split("://", 1)[0]
+        return "+" in scheme and scheme.split("+", 1)[1] in ASYNC_DRIVERS
+
+    @property
+    def sync_database_url(self) -> str:
+        """DATABASE_URL rewritten to a sync driver, for init_db, exports and batch ingest."""
+        if not self.async_database:
+            return self.DATABASE_URL
+        scheme, rest = self.DATABASE_URL.split("://", 1)
+        dialect, driver = scheme.split("+", 1)
+        sync_driver = ASYNC_DRIVERS[driver]
+        return f"{dialect}+{sync_driver}://{rest}" if sync_driver else f"{dialect}://{rest}"
+
 
 settings = Settings()
@@ -1,15 +1,117 @@
-from sqlalchemy import create_engine
+from sqlalchemy import create_engine, event, inspect, text
 from sqlalchemy.orm import sessionmaker, declarative_base
-from config import settings
+from config import settings, Settings
 
-engine = create_engine(
-    settings.DATABASE_URL, connect_args={"check_same_thread": False} if "sqlite" in settings.DATABASE_URL else {}
-)
+
+def engine_options(url: str, cfg: Settings = settings) -> dict:
+    """create_engine keyword arguments for ``url`` under the given settings."""
+    if url.startswith("sqlite"):
+        return {
+            "connect_args": {
+                "check_same_thread": False,
+                # sqlite3's own lock wait, in seconds; mirrors busy_timeout
+                "timeout": cfg.SQLITE_BUSY_TIMEOUT_MS / 1000,
+            }
+        }
+    return {
+        "pool_size": cfg.DB_POOL_SIZE,
+        "max_overflow": cfg.DB_MAX_OVERFLOW,
+        "pool_timeout": cfg.DB_POOL_TIMEOUT,
+        "pool_recycle": cfg.DB_POOL_RECYCLE,
+        "pool_pre_ping": cfg.DB_POOL_PRE_PING,
+    }
+
+
+def apply_sqlite_pragmas(sync_engine, cfg: Settings = settings):
+    """Apply the SQLite profile from settings to every new connection."""
+    in_memory = sync_engine.url.database in (None, "", ":memory:")
+
+    @event.listens_for(sync_engine, "connect")
+    def _set_pragmas(dbapi_connection, connection_record):
+        cursor = dbapi_connection.cursor()
+        if not in_memory:
+            cursor.execute(f"PRAGMA journal_mode={cfg.SQLITE_JOURNAL_MODE}")
+        cursor.execute(f"PRAGMA synchronous={cfg.SQLITE_SYNCHRONOUS}")
+        cursor.execute(f"PRAGMA mmap_size={int(cfg.SQLITE_MMAP_SIZE)}")
+        cursor.execute(f"PRAGMA cache_size={int(cfg.SQLITE_CACHE_SIZE)}")
+        cursor.execute(f"PRAGMA busy_timeout={int(cfg.SQLITE_BUSY_TIMEOUT_MS)}")
+        cursor.close()
+
+
+def make_engine(url: str, cfg: Settings = settings):
+    eng = create_engine(url, **engine_options(url, cfg))
+    if eng.dialect.name == "sqlite":
+        apply_sqlite_pragmas(eng, cfg)
+    return eng
+
+
+engine = make_engine(settings.sync_database_url)
 SessionLocal = sessionmaker(autocommit=False, autoflush=False, bind=engine)
 Base = declarative_base()
 
+# With an async DATABASE_URL the hot request paths (/report, /machines) run on
+# an async engine; everything else keeps using the sync engine above.
+if settings.async_database:
+    from sqlalchemy.ext.asyncio import async_sessionmaker, create_async_engine
+
+    async_engine = create_async_engine(settings.DATABASE_URL, **engine_options(settings.DATABASE_URL))
+    if async_engine.dialect.name == "sqlite":
+        apply_sqlite_pragmas(async_engine.sync_engine)
+    AsyncSessionLocal = async_sessionmaker(async_engine, autoflush=False, expire_on_commit=False)
+else:
+    async_engine = None
+    AsyncSessionLocal = None
+
+
+if settings.async_database:
+    async def get_session():
+        async with AsyncSessionLocal() as db:
+            yield db
+else:
+    def get_session():
+        db = SessionLocal()
+        try:
+            yield db
+        finally:
+            db.close()
+
+
+def add_missing_columns(bind=None):
+    """Add model columns that are missing from existing tables.
+
+    create_all() only creates whole tables, so columns added to a model later
+    are appended with ALTER TABLE ... ADD COLUMN. New columns must be nullable.
+    """
+    bind = bind or engine
+    inspector = inspect(bind)
+    quote = bind.dialect.identifier_preparer.quote
+    with bind.begin() as conn:
+        for table in Base.metadata.sorted_tables:
+            if not inspector.has_table(table.name):
+                continue
+            existing = {c["name"] for c in inspector.get_columns(table.name)}
+            for column in table.columns:
+                if column.name in existing:
+                    continue
+                col_type = column.type.compile(dialect=bind.dialect)
+                conn.execute(text(f"ALTER TABLE {quote(table.name)} ADD COLUMN {quote(column.name)} {col_type}"))
+
 
 def init_db():
     # Import models here to ensure they are registered before create_all()
-    from models.machine import Machine, CheckResult  # noqa: F401
+    from models.machine import Machine, CheckResult, LatestCheckResult, CheckDailyRollup  # noqa: F401
     Base.metadata.create_all(bind=engine)
+    add_missing_columns(engine)
+    # create_all skips indexes on tables that already exist
+    for table in Base.metadata.sorted_tables:
+        for index in table.indexes:
+            index.create(bind=engine, checkfirst=True)
+
+    # Databases created before latest_check_results existed need a one-off backfill
+    from services.machine_service import rebuild_latest_check_results
+    db = SessionLocal()
+    try:
+        if db.query(LatestCheckResult).first() is None and db.query(CheckResult).first() is not None:
+            rebuild_latest_check_results(db)
+    finally:
+        db.close()
@@ -1,10 +1,27 @@
+from contextlib import asynccontextmanager
+
 from fastapi import FastAPI
 from fastapi.middleware.cors import CORSMiddleware
 from route import machines, export
 from database import init_db
 from config import settings
+from services.ingest_queue import ingest_queue
+from services.retention import retention_worker
+
+
+@asynccontextmanager
+async def lifespan(app: FastAPI):
+    if settings.INGEST_MODE == "queued":
+        ingest_queue.start()
+    if settings.RETENTION_INTERVAL_HOURS > 0:
+        retention_worker.start()
+    yield
+    retention_worker.stop()
+    # flush queued reports before the process exits
+    ingest_queue.stop()
+
 
-app = FastAPI(title="System Utility Backend")
+app = FastAPI(title="System Utility Backend", lifespan=lifespan)
 init_db()
 
 app.add_middleware(
@@ -1,4 +1,4 @@
-from sqlalchemy import Column, Integer, String, DateTime, JSON, ForeignKey, Boolean
+from sqlalchemy import Column, Integer, String, Date, DateTime, JSON, ForeignKey, Boolean, Index
 from sqlalchemy.orm import relationship
 from datetime import datetime
 from database import Base
@@ -13,9 +13,17 @@ class Machine(Base):
     os_version = Column(String, nullable=True)
     last_checkin = Column(DateTime, default=datetime.utcnow)
     machine_metadata = Column("metadata", JSON, nullable=True)
+    # agent-computed hash of the last reported check state; heartbeats match against it
+    state_hash = Column(String, nullable=True)
+    # bumped on every write to this machine; the weak ETag of GET /machines/{id}.
+    # Indexed so GET /machines can fingerprint the fleet with count + sum(version)
+    # from the index alone.
+    version = Column(Integer, nullable=True, default=1, index=True)
 
     # relationship to check results (one-to-many)
     checks = relationship("CheckResult", back_populates="machine", cascade="all, delete-orphan")
+    # current result per check name (see LatestCheckResult)
+    latest_checks = relationship("LatestCheckResult", cascade="all, delete-orphan")
 
 
 class CheckResult(Base):
@@ -25,6 +33,64 @@ class CheckResult(Base):
     check_name = Column(String, nullable=False)
     status = Column(String, nullable=False)  # e.g., "ok", "warning", "fail"
     details = Column(JSON, nullable=True)
+    # History is run-length encoded: a row is one interval during which the
+    # check kept the same status and details hash. created_at is when the
+    # interval started (first seen), last_seen the latest report repeating it.
     created_at = Column(DateTime, default=datetime.utcnow)
+    last_seen = Column(DateTime, nullable=True)
+    repeat_count = Column(Integer, nullable=True, default=1)
+    details_hash = Column(String, nullable=True)
+    # server time the row was inserted or last extended; unlike created_at and
+    # last_seen (agent observation times) it only moves forward, so timestamp
+    # export watermarks are based on it
+    modified_at = Column(DateTime, nullable=True)
 
     machine = relationship("Machine", back_populates="checks")
+
+    __table_args__ = (
+        # serves per-machine history pages, optionally narrowed to one check
+        Index("ix_check_results_machine_check_created", "machine_id_fk", "check_name", "created_at"),
+    )
+
+
+class LatestCheckResult(Base):
+    """Most recent result per (machine, check_name), maintained on ingest.
+
+    Lets status lookups scale with fleet size instead of history length.
+    """
+    __tablename__ = "latest_check_results"
+    machine_id_fk = Column(Integer, ForeignKey("machines.id"), primary_key=True)
+    check_name = Column(String, primary_key=True)
+    check_result_id = Column(Integer, ForeignKey("check_results.id"), nullable=False)
+    status = Column(String, nullable=False)
+    details = Column(JSON, nullable=True)
+    details_hash = Column(String, nullable=True)
+    created_at = Column(DateTime, default=datetime.utcnow)
+    last_seen = Column(DateTime, nullable=True)
+
+    __table_args__ = (
+        Index("ix_latest_check_results_status", "status", "machine_id_fk"),
+        # retention's "still current?" anti-join looks rows up by check_result_id
+        Index("ix_latest_check_results_check_result_id", "check_result_id"),
+    )
+
+
+class CheckDailyRollup(Base):
+    """Per-day summary of history that retention has removed from check_results.
+
+    One row per machine, check, day and status. An interval is counted on the
+    day it started (its created_at).
+    """
+    __tablename__ = "check_daily_rollups"
+    machine_id_fk = Column(Integer, ForeignKey("machines.id"), primary_key=True)
+    check_name = Column(String, primary_key=True)
+    day = Column(Date, primary_key=True)
+    status = Column(String, primary_key=True)
+    intervals = Column(Integer, nullable=False, default=0)  # history rows rolled up
+    observations = Column(Integer, nullable=False, default=0)  # reports those rows stood for
+    first_seen = Column(DateTime, nullable=True)
+    last_seen = Column(DateTime, nullable=True)
+
+    __table_args__ = (
+        Index("ix_check_daily_rollups_day", "day"),
+    )
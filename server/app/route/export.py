@@ -1,10 +1,24 @@
-from fastapi import APIRouter, Depends, Response
+from typing import Literal, Optional
+
+from fastapi import APIRouter, Depends, HTTPException
+from fastapi.responses import StreamingResponse
+from sqlalchemy import String, cast, exists, func, select
 from sqlalchemy.orm import Session
 from database import SessionLocal
+from config import settings
 import csv
+import json
+from datetime import datetime, timedelta, timezone
 from io import StringIO
 from models import machine as machine_models
 
+try:
+    import pyarrow as pa
+    import pyarrow.ipc
+    import pyarrow.parquet
+except ImportError:  # columnar formats are optional
+    pa = None
+
 router = APIRouter()
 
 
@@ -16,37 +30,305 @@ def get_db():
         db.close()
 
 
-@router.get("/export/csv")
-def export_csv(db: Session = Depends(get_db)):
-    # produce CSV with machines and their latest check
-    from sqlalchemy import func
-    sub = (
-        db.query(machine_models.CheckResult.machine_id_fk, func.max(machine_models.CheckResult.created_at).label("m"))
-        .group_by(machine_models.CheckResult.machine_id_fk)
-        .subquery()
-    )
-    q = db.query(
+CSV_HEADER = ["machine_id", "hostname", "os_name", "os_version", "last_checkin", "latest_check", "latest_status"]
+
+HISTORY_HEADER = ["check_id", "machine_id", "hostname", "os_name", "os_version", "check_name", "status", "details",
+                  "created_at", "last_seen", "repeat_count"]
+
+MEDIA_TYPES = {
+    "csv": "text/csv",
+    "ndjson": "application/x-ndjson",
+    "parquet": "application/vnd.apache.parquet",
+    "arrow": "application/vnd.apache.arrow.stream",
+}
+
+FILE_EXTENSIONS = {"csv": "csv", "ndjson": "ndjson", "parquet": "parquet", "arrow": "arrows"}
+
+# timestamp watermark of an empty export
+EPOCH = datetime(1970, 1, 1)
+
+
+def parse_watermark(since: Optional[str]):
+    """Parse an export watermark: a check result id or an ISO-8601 timestamp.
+
+    Stored times are naive UTC, so an offset-aware timestamp is converted to
+    UTC and made naive before it is compared with them.
+    """
+    if since is None or since == "":
+        return None
+    if since.isdigit():
+        return int(since)
+    try:
+        value = datetime.fromisoformat(since)
+    except ValueError:
+        raise ValueError("since must be a check result id or an ISO-8601 timestamp")
+    if value.tzinfo is not None:
+        value = value.astimezone(timezone.utc).replace(tzinfo=None)
+    return value
+
+
+def _latest_state_query(since=None, watermark: Optional[int] = None, ts_watermark: Optional[datetime] = None):
+    # one row per machine and current check
+    Machine = machine_models.Machine
+    LatestCheckResult = machine_models.LatestCheckResult
+    q = select(
+        Machine.machine_id,
+        Machine.hostname,
+        Machine.os_name,
+        Machine.os_version,
+        Machine.last_checkin,
+        LatestCheckResult.check_name,
+        LatestCheckResult.status,
+    ).outerjoin(
+        LatestCheckResult,
+        Machine.id == LatestCheckResult.machine_id_fk,
+    ).order_by(Machine.id, LatestCheckResult.check_name)
+
+    # delta exports return the full current state of machines that changed.
+    # An id only finds machines with a new interval; a timestamp also finds
+    # extended intervals and host field changes, since every report moves
+    # last_checkin.
+    if isinstance(since, int):
+        changed = LatestCheckResult.__table__.alias("changed")
+        cond = [changed.c.machine_id_fk == Machine.id, changed.c.check_result_id > since]
+        if watermark is not None:
+            cond.append(changed.c.check_result_id <= watermark)
+        q = q.where(exists().where(*cond))
+    elif isinstance(since, datetime):
+        q = q.where(Machine.last_checkin > since)
+        if ts_watermark is not None:
+            q = q.where(Machine.last_checkin <= ts_watermark)
+    return q
+
+
+def _history_modified():
+    CheckResult = machine_models.CheckResult
+    # rows written before modified_at existed fall back to their observation times
+    return func.coalesce(CheckResult.modified_at, CheckResult.last_seen, CheckResult.created_at)
+
+
+def _history_query(details_as_text: bool = True, since=None, watermark: Optional[int] = None,
+                   ts_watermark: Optional[datetime] = None):
+    # one row per history interval (created_at .. last_seen), in insertion order
+    CheckResult = machine_models.CheckResult
+    details = CheckResult.details
+    last_seen = func.coalesce(CheckResult.last_seen, CheckResult.created_at)
+    q = select(
+        CheckResult.id.label("check_id"),
         machine_models.Machine.machine_id,
         machine_models.Machine.hostname,
         machine_models.Machine.os_name,
         machine_models.Machine.os_version,
-        machine_models.Machine.last_checkin,
-        machine_models.CheckResult.check_name,
-        machine_models.CheckResult.status,
-    ).outerjoin(machine_models.CheckResult, machine_models.Machine.id == machine_models.CheckResult.machine_id_fk)\
-     .outerjoin(sub, (machine_models.CheckResult.machine_id_fk == sub.c.machine_id_fk) & (machine_models.CheckResult.created_at == sub.c.m))
+        CheckResult.check_name,
+        CheckResult.status,
+        (cast(details, String) if details_as_text else details).label("details"),
+        CheckResult.created_at,
+        last_seen.label("last_seen"),
+        func.coalesce(CheckResult.repeat_count, 1).label("repeat_count"),
+    ).join(
+        machine_models.Machine,
+        machine_models.Machine.id == CheckResult.machine_id_fk,
+    ).order_by(CheckResult.id)
+
+    # An id watermark returns new intervals only; a timestamp also returns
+    # intervals extended since then (by server write time, so reports
+    # delivered late from an agent's outbox are not skipped)
+    if isinstance(since, datetime):
+        modified = _history_modified()
+        q = q.where(modified > since)
+        if ts_watermark is not None:
+            q = q.where(modified <= ts_watermark)
+        return q
+    if isinstance(since, int):
+        q = q.where(CheckResult.id > since)
+    if watermark is not None:
+        q = q.where(CheckResult.id <= watermark)
+    return q
+
+
+def _arrow_schema(scope: str):
+    if scope == "history":
+        return pa.schema([
+            ("check_id", pa.int64()),
+            ("machine_id", pa.string()),
+            ("hostname", pa.string()),
+            ("os_name", pa.string()),
+            ("os_version", pa.string()),
+            ("check_name", pa.string()),
+            ("status", pa.string()),
+            ("details", pa.string()),  # JSON text
+            ("created_at", pa.timestamp("us")),
+            ("last_seen", pa.timestamp("us")),
+            ("repeat_count", pa.int64()),
+        ])
+    return pa.schema([
+        ("machine_id", pa.string()),
+        ("hostname", pa.string()),
+        ("os_name", pa.string()),
+        ("os_version", pa.string()),
+        ("last_checkin", pa.timestamp("us")),
+        ("latest_check", pa.string()),
+        ("latest_status", pa.string()),
+    ])
+
+
+def _stream_partitions(stmt):
+    """Yield lists of result rows, ``EXPORT_BATCH_SIZE`` at a time.
+
+    The generator owns its session: it outlives the request handler, and
+    yield_per keeps only one batch of rows in memory at a time.
+    """
+    db = SessionLocal()
+    try:
+        result = db.execute(stmt.execution_options(yield_per=settings.EXPORT_BATCH_SIZE))
+        for rows in result.partitions():
+            yield rows
+    finally:
+        db.close()
 
+
+def _csv_value(value):
+    if value is None:
+        return ""
+    if isinstance(value, datetime):
+        return value.isoformat()
+    return value
+
+
+def _stream_csv(stmt, header):
     buf = StringIO()
     writer = csv.writer(buf)
-    writer.writerow(["machine_id", "hostname", "os_name", "os_version", "last_checkin", "latest_check", "latest_status"])
-    for row in q.all():
-        writer.writerow([
-            row.machine_id,
-            row.hostname or "",
-            row.os_name or "",
-            row.os_version or "",
-            row.last_checkin.isoformat() if row.last_checkin else "",
-            row.check_name or "",
-            row.status or ""
-        ])
-    return Response(content=buf.getvalue(), media_type="text/csv")
+    writer.writerow(header)
+    for rows in _stream_partitions(stmt):
+        writer.writerows([_csv_value(v) for v in row] for row in rows)
+        yield buf.getvalue()
+        buf.seek(0)
+        buf.truncate(0)
+    if buf.tell():
+        yield buf.getvalue()
+
+
+def _stream_ndjson(stmt, header):
+    for rows in _stream_partitions(stmt):
+        yield "".join(json.dumps(dict(zip(header, row)), default=_csv_value) + "\n" for row in rows)
+
+
+class _ChunkSink:
+    """Write-only file object that lets a pyarrow writer be drained incrementally."""
+
+    def __init__(self):
+        self._chunks = []
+        self._position = 0
+        self.closed = False
+
+    def write(self, data):
+        data = bytes(data)
+        self._chunks.append(data)
+        self._position += len(data)
+        return len(data)
+
+    def tell(self):
+        # writers record absolute offsets (e.g. the Parquet footer), so this
+        # must count everything written, not just what is still buffered
+        return self._position
+
+    def flush(self):
+        pass
+
+    def close(self):
+        self.closed = True
+
+    def writable(self):
+        return True
+
+    def drain(self) -> bytes:
+        data = b"".join(self._chunks)
+        self._chunks.clear()
+        return data
+
+
+def _stream_arrow(stmt, schema, fmt):
+    sink = _ChunkSink()
+    out = pa.PythonFile(sink, mode="w")
+    if fmt == "parquet":
+        writer = pa.parquet.ParquetWriter(out, schema)
+    else:
+        writer = pa.ipc.new_stream(out, schema)
+    for rows in _stream_partitions(stmt):
+        # transpose the row tuples into columns; no per-row dicts
+        columns = zip(*rows)
+        batch = pa.RecordBatch.from_arrays(
+            [pa.array(col, type=field.type) for col, field in zip(columns, schema)],
+            schema=schema,
+        )
+        writer.write_batch(batch)
+        chunk = sink.drain()
+        if chunk:
+            yield chunk
+    writer.close()
+    yield sink.drain()
+
+
+@router.get("/export")
+def export(
+    format: Literal["csv", "ndjson", "parquet", "arrow"] = "csv",
+    scope: Literal["latest", "history"] = "latest",
+    since: Optional[str] = None,
+    db: Session = Depends(get_db),
+):
+    """Stream machine state or check history.
+
+    ``since`` restricts the export to rows changed after a previous export's
+    watermark. ``X-Export-Watermark`` is a timestamp: passing it back returns
+    new intervals, extended intervals and (for the latest scope) machines
+    that reported since. ``X-Export-Id-Watermark`` is the highest check
+    result id included; passing it back returns new intervals only.
+    """
+    try:
+        since_value = parse_watermark(since)
+    except ValueError as e:
+        raise HTTPException(status_code=400, detail=str(e))
+    # Pin the upper bounds before streaming so rows ingested mid-export are
+    # left for the next delta instead of being skipped or duplicated.
+    watermark = db.scalar(select(func.coalesce(func.max(machine_models.CheckResult.id), 0)))
+    if scope == "history":
+        ts_watermark = db.scalar(select(func.max(_history_modified())))
+    else:
+        ts_watermark = db.scalar(select(func.max(machine_models.Machine.last_checkin)))
+    # never past now - lag, so writes that started before this export but
+    # commit after it are still above the watermark
+    lagged = datetime.utcnow() - timedelta(seconds=settings.EXPORT_WATERMARK_LAG_SECONDS)
+    ts_watermark = min(ts_watermark or EPOCH, lagged)
+
+    header = HISTORY_HEADER if scope == "history" else CSV_HEADER
+
+    def query(details_as_text=True):
+        if scope == "history":
+            return _history_query(details_as_text, since=since_value, watermark=watermark,
+                                  ts_watermark=ts_watermark)
+        return _latest_state_query(since=since_value, watermark=watermark, ts_watermark=ts_watermark)
+
+    if format in ("parquet", "arrow"):
+        if pa is None:
+            raise HTTPException(status_code=501, detail=f"{format} export requires pyarrow to be installed")
+        body = _stream_arrow(query(), _arrow_schema(scope), format)
+    elif format == "ndjson":
+        body = _stream_ndjson(query(details_as_text=False), header)
+    else:
+        body = _stream_csv(query(), header)
+
+    filename = f"machines-{scope}.{FILE_EXTENSIONS[format]}"
+    return StreamingResponse(
+        body,
+        media_type=MEDIA_TYPES[format],
+        headers={
+            "Content-Disposition": f'attachment; filename="{filename}"',
+            "X-Export-Watermark": ts_watermark.isoformat(),
+            "X-Export-Id-Watermark": str(watermark),
+        },
+    )
+
+
+@router.get("/export/csv")
+def export_csv(db: Session = Depends(get_db)):
+    return export(format="csv", scope="latest", since=None, db=db)
@@ -1,11 +1,93 @@
-from fastapi import APIRouter, Depends, HTTPException, status
+import asyncio
+import zlib
+
+from fastapi import APIRouter, Depends, HTTPException, Query, Request, Response, status
+from fastapi.concurrency import run_in_threadpool
+from fastapi.responses import JSONResponse, StreamingResponse
+from fastapi.routing import APIRoute
 from sqlalchemy.orm import Session
-from database import SessionLocal
-from schemas.machine import CheckInPayload, MachineOut
-from services.machine_service import upsert_machine_and_checks, list_machines, get_machine
-from typing import List, Optional
+from database import SessionLocal, get_session
+from config import settings
+from schemas.machine import (
+    CheckInPayload, MachineOut, BatchReportOut, CheckHistoryPage, DeltaReportOut, HeartbeatIn, HeartbeatOut,
+    FleetSummaryOut,
+)
+from services.machine_service import (
+    upsert_machine_and_checks,
+    upsert_machine_and_checks_async,
+    upsert_machines_and_checks_batch,
+    apply_delta_report,
+    record_heartbeat,
+    list_machines,
+    list_machines_async,
+    get_machine,
+    get_machine_async,
+    get_fleet_version,
+    get_fleet_version_async,
+    get_machine_version,
+    get_machine_version_async,
+    get_check_history,
+    machine_exists,
+)
+from services.ingest_queue import ingest_queue
+from services.summary import get_summary
+from services.events import broadcaster, format_sse
+from datetime import datetime
+from typing import Callable, List, Optional
+
+
+def decompress_gzip(body: bytes, limit: int) -> bytes:
+    """Inflate a gzip body, refusing anything that expands beyond ``limit`` bytes."""
+    inflater = zlib.decompressobj(16 + zlib.MAX_WBITS)
+    try:
+        data = inflater.decompress(body, limit)
+    except zlib.error:
+        raise HTTPException(status_code=status.HTTP_400_BAD_REQUEST, detail="Invalid gzip request body")
+    if inflater.unconsumed_tail:
+        raise HTTPException(
+            status_code=status.HTTP_413_REQUEST_ENTITY_TOO_LARGE,
+            detail=f"Decompressed body exceeds {limit} bytes",
+        )
+    return data
+
+
+class GzipRequest(Request):
+    async def body(self) -> bytes:
+        if not hasattr(self, "_body"):
+            body = await super().body()
+            if self.headers.get("content-encoding", "").lower() == "gzip":
+                body = decompress_gzip(body, settings.MAX_DECOMPRESSED_BODY_BYTES)
+            self._body = body
+        return self._body
+
+
+class GzipRoute(APIRoute):
+    """Route class that accepts request bodies sent with Content-Encoding: gzip."""
+
+    def get_route_handler(self) -> Callable:
+        original_route_handler = super().get_route_handler()
+
+        async def route_handler(request: Request):
+            return await original_route_handler(GzipRequest(request.scope, request.receive))
 
-router = APIRouter()
+        return route_handler
+
+
+def etag_matches(if_none_match: Optional[str], etag: str) -> bool:
+    """Weak comparison of an If-None-Match header against ``etag``."""
+    if not if_none_match:
+        return False
+    if if_none_match.strip() == "*":
+        return True
+    opaque = etag.removeprefix("W/")
+    return any(tag.strip().removeprefix("W/") == opaque for tag in if_none_match.split(","))
+
+
+def not_modified(etag: str) -> Response:
+    return Response(status_code=status.HTTP_304_NOT_MODIFIED, headers={"ETag": etag, "Cache-Control": "no-cache"})
+
+
+router = APIRouter(route_class=GzipRoute)
 
 
 def get_db():
@@ -16,21 +98,177 @@ def get_db():
         db.close()
 
 
-@router.post("/report", status_code=status.HTTP_201_CREATED, response_model=MachineOut)
-def report(payload: CheckInPayload, db: Session = Depends(get_db)):
-    machine = upsert_machine_and_checks(db, payload)
-    return machine
+# /report and the machine reads are async handlers. get_session yields an
+# AsyncSession when DATABASE_URL uses an async driver; otherwise the sync
+# service runs in the threadpool exactly as a plain `def` handler would.
+
+@router.post(
+    "/report",
+    status_code=status.HTTP_201_CREATED,
+    response_model=MachineOut,
+    responses={202: {"description": "Queued for write-behind ingestion"}, 429: {"description": "Ingest queue full"}},
+)
+async def report(payload: CheckInPayload, db=Depends(get_session)):
+    if settings.INGEST_MODE == "queued":
+        if not ingest_queue.submit(payload):
+            raise HTTPException(
+                status_code=status.HTTP_429_TOO_MANY_REQUESTS,
+                detail="Ingest queue is full",
+                headers={"Retry-After": "1"},
+            )
+        return JSONResponse(
+            status_code=status.HTTP_202_ACCEPTED,
+            content={"status": "queued", "machine_id": payload.machine_id},
+        )
+    if settings.async_database:
+        return await upsert_machine_and_checks_async(db, payload)
+    return await run_in_threadpool(upsert_machine_and_checks, db, payload)
+
+
+@router.post("/report/batch", status_code=status.HTTP_201_CREATED, response_model=BatchReportOut)
+def report_batch(payloads: List[CheckInPayload], db: Session = Depends(get_db)):
+    if len(payloads) > settings.REPORT_BATCH_MAX_ITEMS:
+        raise HTTPException(
+            status_code=status.HTTP_413_REQUEST_ENTITY_TOO_LARGE,
+            detail=f"Batch exceeds {settings.REPORT_BATCH_MAX_ITEMS} reports",
+        )
+    results = upsert_machines_and_checks_batch(db, payloads)
+    return {"accepted": len(results), "results": results}
+
 
+@router.post("/report/delta", response_model=DeltaReportOut)
+def report_delta(payload: CheckInPayload, db: Session = Depends(get_db)):
+    # Only changed checks are sent; an empty delta is a heartbeat
+    return apply_delta_report(db, payload)
+
+
+@router.post("/heartbeat", response_model=HeartbeatOut)
+def heartbeat(beat: HeartbeatIn, db: Session = Depends(get_db)):
+    # A mismatched (or missing) state hash means our copy is stale
+    ok = beat.state_hash is not None and record_heartbeat(db, beat.machine_id, beat.state_hash)
+    return {"machine_id": beat.machine_id, "full_report_required": not ok}
+
+
+@router.get("/ingest/metrics")
+def ingest_metrics():
+    return {"mode": settings.INGEST_MODE, **ingest_queue.metrics()}
+
+
+@router.get("/summary", response_model=FleetSummaryOut)
+def api_summary(db: Session = Depends(get_db)):
+    # Counts for the whole fleet, computed in SQL and cached until the next ingest
+    return get_summary(db)
+
+
+@router.get("/events")
+async def api_events(request: Request):
+    """Server-Sent Events stream of machine changes.
+
+    Each "machine" event carries the machine's ids, its reported overall
+    status, last_checkin and the checks that changed. Reconnecting clients
+    send Last-Event-ID and receive what they missed; a "resync" event means
+    they must refetch /machines instead.
+    """
+    sub, backlog = broadcaster.subscribe(request.headers.get("last-event-id"))
+
+    async def stream():
+        try:
+            yield f"retry: {settings.EVENTS_RETRY_MS}\n\n"
+            for event in backlog:
+                yield format_sse(event)
+            while not await request.is_disconnected():
+                try:
+                    event = await asyncio.wait_for(sub.queue.get(), settings.EVENTS_KEEPALIVE_SECONDS)
+                except asyncio.TimeoutError:
+                    yield ": keep-alive\n\n"
+                    continue
+                yield format_sse(event)
+        finally:
+            broadcaster.unsubscribe(sub)
+
+    return StreamingResponse(
+        stream(),
+        media_type="text/event-stream",
+        headers={"Cache-Control": "no-cache", "X-Accel-Buffering": "no"},
+    )
+
+
+# The machine reads carry weak ETags built from the per-machine version that
+# every write bumps. A matching If-None-Match is answered with 304 after one
+# indexed lookup, before any machine or check rows are loaded. Heartbeats bump
+# the version too, since they move last_checkin.
 
 @router.get("/machines", response_model=List[MachineOut])
-def api_list_machines(os: Optional[str] = None, status: Optional[str] = None, limit: int = 100, offset: int = 0, db: Session = Depends(get_db)):
-    machines = list_machines(db=db, os_name=os, status=status, limit=limit, offset=offset)
-    return machines
+async def api_list_machines(
+    request: Request,
+    response: Response,
+    os: Optional[str] = None,
+    status: Optional[str] = None,
+    limit: int = 100,
+    offset: int = 0,
+    history: bool = False,
+    history_limit: int = Query(20, ge=1, le=1000),
+    db=Depends(get_session),
+):
+    if settings.async_database:
+        version = await get_fleet_version_async(db)
+    else:
+        version = await run_in_threadpool(get_fleet_version, db)
+    etag = f'W/"fleet-{version}"'
+    if etag_matches(request.headers.get("if-none-match"), etag):
+        return not_modified(etag)
+    response.headers["ETag"] = etag
+    response.headers["Cache-Control"] = "no-cache"
+
+    # Latest result per check by default; full history rows only on request
+    kwargs = dict(
+        os_name=os, status=status, limit=limit, offset=offset,
+        history_limit=history_limit if history else None,
+    )
+    if settings.async_database:
+        return await list_machines_async(db, **kwargs)
+    return await run_in_threadpool(list_machines, db, **kwargs)
 
 
 @router.get("/machines/{id}", response_model=MachineOut)
-def api_get_machine(id: int, db: Session = Depends(get_db)):
-    m = get_machine(db, id)
+async def api_get_machine(id: int, request: Request, response: Response, db=Depends(get_session)):
+    if settings.async_database:
+        version = await get_machine_version_async(db, id)
+    else:
+        version = await run_in_threadpool(get_machine_version, db, id)
+    if version is None:
+        raise HTTPException(status_code=404, detail="Machine not found")
+    etag = f'W/"machine-{id}-{version}"'
+    if etag_matches(request.headers.get("if-none-match"), etag):
+        return not_modified(etag)
+
+    if settings.async_database:
+        m = await get_machine_async(db, id)
+    else:
+        m = await run_in_threadpool(get_machine, db, id)
     if not m:
         raise HTTPException(status_code=404, detail="Machine not found")
+    response.headers["ETag"] = etag
+    response.headers["Cache-Control"] = "no-cache"
     return m
+
+
+@router.get("/machines/{id}/checks", response_model=CheckHistoryPage)
+def api_machine_checks(
+    id: int,
+    check_name: Optional[str] = None,
+    since: Optional[datetime] = None,
+    until: Optional[datetime] = None,
+    limit: int = Query(100, ge=1, le=1000),
+    cursor: Optional[str] = None,
+    db: Session = Depends(get_db),
+):
+    if not machine_exists(db, id):
+        raise HTTPException(status_code=404, detail="Machine not found")
+    try:
+        items, next_cursor = get_check_history(
+            db, id, check_name=check_name, since=since, until=until, limit=limit, cursor=cursor
+        )
+    except ValueError as e:
+        raise HTTPException(status_code=400, detail=str(e))
+    return {"items": items, "next_cursor": next_cursor}
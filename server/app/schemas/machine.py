@@ -16,6 +16,43 @@ class CheckInPayload(BaseModel):
     os_version: Optional[str] = None
     metadata: Optional[Dict[str, Any]] = None
     checks: Optional[List[CheckInCheck]] = []
+    # When the agent collected the report; set for reports delivered late
+    # from the agent's outbox. Defaults to the time the server receives it.
+    observed_at: Optional[datetime] = None
+    # Agent's hash of its full check state, matched by POST /heartbeat
+    state_hash: Optional[str] = None
+
+
+class BatchReportItem(BaseModel):
+    index: int
+    machine_id: str
+    id: int
+    checks_stored: int  # new history rows; a repeated result only extends its interval
+
+
+class BatchReportOut(BaseModel):
+    accepted: int
+    results: List[BatchReportItem]
+
+
+class DeltaReportOut(BaseModel):
+    machine_id: str
+    id: Optional[int] = None
+    checks_stored: int = 0
+    checks_unchanged: int = 0
+    # The machine is unknown (or has no baseline); the agent should send a full report
+    full_report_required: bool = False
+
+
+class HeartbeatIn(BaseModel):
+    machine_id: str
+    state_hash: Optional[str] = None
+
+
+class HeartbeatOut(BaseModel):
+    machine_id: str
+    # The stored state hash differs (or the machine is unknown); send a full report
+    full_report_required: bool
 
 
 class CheckResultOut(BaseModel):
@@ -23,12 +60,22 @@ class CheckResultOut(BaseModel):
     check_name: str
     status: str
     details: Optional[Dict[str, Any]]
+    # History rows are intervals of unchanged results: first reported at
+    # created_at, last at last_seen, repeat_count reports in total (both
+    # None for rows stored before history was run-length encoded)
     created_at: datetime
+    last_seen: Optional[datetime] = None
+    repeat_count: Optional[int] = None
 
     class Config:
         from_attributes = True
 
 
+class CheckHistoryPage(BaseModel):
+    items: List[CheckResultOut]
+    next_cursor: Optional[str] = None
+
+
 class MachineOut(BaseModel):
     id: int
     machine_id: str
@@ -42,4 +89,13 @@ class MachineOut(BaseModel):
     model_config = {
         "from_attributes": True,
         "validate_by_name": True
-    }
\ No newline at end of file
+    }
+
+
+class FleetSummaryOut(BaseModel):
+    total: int
+    by_status: Dict[str, int]  # overall status reported by the agent
+    by_os: Dict[str, int]
+    by_staleness: Dict[str, int]  # age of last_checkin: 1h, 24h, 7d, older
+    by_check: Dict[str, Dict[str, int]]  # check name -> current status -> machines
+    generated_at: datetime
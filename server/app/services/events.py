@@ -0,0 +1,114 @@
+"""In-process fan-out of machine change events to GET /events subscribers.
+
+Ingest runs in worker threads (the threadpool, the queued writer), so
+publish() is thread-safe and hands each event to every subscriber's
+asyncio queue with ``loop.call_soon_threadsafe``. The last
+EVENTS_HISTORY_SIZE events are kept in a ring buffer so a client that
+reconnects with Last-Event-ID gets what it missed. Event ids carry a
+per-process epoch; an id from another process, or one that has fallen out
+of the buffer, gets a "resync" event telling the client to refetch.
+
+Events only reach clients connected to this process. With several server
+processes each client sees the writes its own process handled.
+"""
+import asyncio
+import json
+import threading
+import uuid
+from collections import deque
+from dataclasses import dataclass, field
+from typing import List, Optional, Tuple
+
+from config import settings
+
+RESYNC = "resync"
+
+
+@dataclass
+class Event:
+    epoch: str
+    seq: int
+    type: str
+    data: dict
+
+    @property
+    def id(self) -> str:
+        return f"{self.epoch}-{self.seq}"
+
+
+@dataclass(eq=False)
+class Subscriber:
+    loop: asyncio.AbstractEventLoop
+    queue: asyncio.Queue = field(default_factory=asyncio.Queue)
+
+
+class EventBroadcaster:
+    def __init__(self, history_size: int = 1000, queue_size: int = 1000):
+        self.epoch = uuid.uuid4().hex[:8]
+        self.queue_size = queue_size
+        self._lock = threading.Lock()
+        self._seq = 0
+        self._history = deque(maxlen=history_size)
+        self._subscribers = set()
+
+    def _resync(self) -> Event:
+        return Event(self.epoch, self._seq, RESYNC, {})
+
+    def publish(self, event_type: str, data: dict) -> Event:
+        """Record an event and deliver it to every subscriber; callable from any thread."""
+        with self._lock:
+            self._seq += 1
+            event = Event(self.epoch, self._seq, event_type, data)
+            self._history.append(event)
+            subscribers = list(self._subscribers)
+        for sub in subscribers:
+            try:
+                sub.loop.call_soon_threadsafe(self._deliver, sub, event)
+            except RuntimeError:  # the subscriber's loop is closed
+                self.unsubscribe(sub)
+        return event
+
+    def _deliver(self, sub: Subscriber, event: Event):
+        # Runs on the subscriber's loop. A client that fell this far behind
+        # is told to refetch rather than buffering without bound.
+        if sub.queue.qsize() >= self.queue_size:
+            while not sub.queue.empty():
+                sub.queue.get_nowait()
+            event = self._resync()
+        sub.queue.put_nowait(event)
+
+    def _since(self, last_event_id: Optional[str]) -> List[Event]:
+        if not last_event_id:
+            return []
+        epoch, _, seq = last_event_id.partition("-")
+        if epoch != self.epoch or not seq.isdigit() or int(seq) > self._seq:
+            return [self._resync()]
+        seq = int(seq)
+        if seq < self._seq and (not self._history or self._history[0].seq > seq + 1):
+            return [self._resync()]  # some of the missed events are gone
+        return [e for e in self._history if e.seq > seq]
+
+    def subscribe(self, last_event_id: Optional[str] = None) -> Tuple[Subscriber, List[Event]]:
+        """Register the calling event loop; returns the subscriber and the events missed since ``last_event_id``."""
+        sub = Subscriber(loop=asyncio.get_running_loop())
+        with self._lock:
+            # under the lock, so nothing is both in the backlog and delivered live
+            backlog = self._since(last_event_id)
+            self._subscribers.add(sub)
+        return sub, backlog
+
+    def unsubscribe(self, sub: Subscriber):
+        with self._lock:
+            self._subscribers.discard(sub)
+
+    def subscriber_count(self) -> int:
+        with self._lock:
+            return len(self._subscribers)
+
+
+def format_sse(event: Event) -> str:
+    data = json.dumps(event.data, default=str, separators=(",", ":"))
+    return f"id: {event.id}\nevent: {event.type}\ndata: {data}\n\n"
+
+
+broadcaster = EventBroadcaster(history_size=settings.EVENTS_HISTORY_SIZE, queue_size=settings.EVENTS_QUEUE_SIZE)
@@ -0,0 +1,183 @@
+"""Write-behind ingestion for POST /report.
+
+With ``INGEST_MODE=queued`` the request handler only validates the payload
+and enqueues it; a background thread drains the bounded queue in
+micro-batches through ``upsert_machines_and_checks_batch``. A full queue is
+reported back to the caller (HTTP 429) instead of growing without bound.
+
+Queued reports were already acknowledged with 202, so a failed write is not
+dropped: transient database errors are retried with backoff, then the batch
+is written report by report so one bad payload cannot sink its neighbours,
+and whatever still fails lands in a dead-letter list (see dead_letters()).
+"""
+import logging
+import queue
+import random
+import threading
+import time
+
+from sqlalchemy.exc import InterfaceError, OperationalError
+
+from config import settings
+from database import SessionLocal
+from services.machine_service import upsert_machines_and_checks_batch
+
+logger = logging.getLogger(__name__)
+
+
+class IngestQueue:
+    def __init__(self, session_factory=SessionLocal, maxsize: int = 10000, batch_size: int = 500,
+                 flush_interval: float = 0.2, write_retries: int = 3, retry_backoff: float = 0.1,
+                 dead_letter_max: int = 10000):
+        self._session_factory = session_factory
+        self._queue = queue.Queue(maxsize=maxsize)
+        self.batch_size = batch_size
+        self.flush_interval = flush_interval
+        self.write_retries = write_retries
+        self.retry_backoff = retry_backoff
+        self.dead_letter_max = dead_letter_max
+        self._dead_letters = []
+        self._stop = threading.Event()
+        self._thread = None
+        self._lock = threading.Lock()
+        self._stats = {
+            "enqueued": 0,
+            "rejected": 0,
+            "written": 0,
+            "failed": 0,
+            "retried": 0,
+            "dead_lettered": 0,
+            "batches": 0,
+            "last_batch_size": 0,
+            "last_flush_ms": 0.0,
+        }
+
+    def start(self):
+        if self._thread and self._thread.is_alive():
+            return
+        self._stop.clear()
+        self._thread = threading.Thread(target=self._run, name="ingest-writer", daemon=True)
+        self._thread.start()
+
+    def stop(self, timeout: float = 10.0):
+        """Stop the writer after flushing whatever is still queued."""
+        self._stop.set()
+        if self._thread:
+            self._thread.join(timeout)
+            self._thread = None
+
+    def submit(self, payload) -> bool:
+        """Enqueue a validated CheckInPayload; False when the queue is full."""
+        try:
+            self._queue.put_nowait(payload)
+        except queue.Full:
+            self._bump("rejected")
+            return False
+        self._bump("enqueued")
+        return True
+
+    def metrics(self) -> dict:
+        with self._lock:
+            stats = dict(self._stats)
+            stats["dead_letters"] = len(self._dead_letters)
+        stats["depth"] = self._queue.qsize()
+        stats["capacity"] = self._queue.maxsize
+        stats["running"] = bool(self._thread and self._thread.is_alive())
+        return stats
+
+    def dead_letters(self) -> list:
+        """Reports that could not be written, oldest first, as (payload, error) pairs."""
+        with self._lock:
+            return list(self._dead_letters)
+
+    def _bump(self, key, n=1):
+        with self._lock:
+            self._stats[key] += n
+
+    def _next_batch(self):
+        """Block for the first item, then collect until the batch is full or the interval elapses."""
+        try:
+            batch = [self._queue.get(timeout=self.flush_interval)]
+        except queue.Empty:
+            return []
+        deadline = time.monotonic() + self.flush_interval
+        while len(batch) < self.batch_size:
+            remaining = deadline - time.monotonic()
+            if remaining <= 0:
+                break
+            try:
+                batch.append(self._queue.get(timeout=remaining))
+            except queue.Empty:
+                break
+        return batch
+
+    def _write_once(self, batch):
+        db = self._session_factory()
+        try:
+            upsert_machines_and_checks_batch(db, batch)
+        except Exception:
+            db.rollback()
+            raise
+        finally:
+            db.close()
+
+    def _write_with_retry(self, batch):
+        """Write a batch, retrying transient database errors with exponential backoff and jitter."""
+        for attempt in range(self.write_retries + 1):
+            try:
+                return self._write_once(batch)
+            except (OperationalError, InterfaceError):
+                if attempt == self.write_retries:
+                    raise
+                self._bump("retried")
+                delay = self.retry_backoff * (2 ** attempt)
+                logger.warning("Transient error writing %d reports; retrying in %.2fs", len(batch), delay,
+                               exc_info=True)
+                time.sleep(random.uniform(delay / 2, delay))
+
+    def _dead_letter(self, payload, error: Exception):
+        with self._lock:
+            if len(self._dead_letters) < self.dead_letter_max:
+                self._dead_letters.append((payload, repr(error)))
+                self._stats["dead_lettered"] += 1
+                return
+            self._stats["failed"] += 1
+        logger.error("Dead-letter list full; dropping report from %s", payload.machine_id)
+
+    def _write(self, batch):
+        started = time.perf_counter()
+        try:
+            self._write_with_retry(batch)
+        except Exception:
+            logger.exception("Failed to write ingest batch of %d reports; writing them one by one", len(batch))
+            written = 0
+            for payload in batch:
+                try:
+                    self._write_with_retry([payload])
+                    written += 1
+                except Exception as e:
+                    logger.exception("Failed to write report from %s", payload.machine_id)
+                    self._dead_letter(payload, e)
+            self._bump("written", written)
+            return
+        with self._lock:
+            self._stats["written"] += len(batch)
+            self._stats["batches"] += 1
+            self._stats["last_batch_size"] = len(batch)
+            self._stats["last_flush_ms"] = round((time.perf_counter() - started) * 1000, 2)
+
+    def _run(self):
+        while not (self._stop.is_set() and self._queue.empty()):
+            batch = self._next_batch()
+            if batch:
+                self._write(batch)
+
+
+ingest_queue = IngestQueue(
+    maxsize=settings.INGEST_QUEUE_SIZE,
+    batch_size=settings.INGEST_BATCH_SIZE,
+    flush_interval=settings.INGEST_FLUSH_INTERVAL_MS / 1000,
+    write_retries=settings.INGEST_WRITE_RETRIES,
+    retry_backoff=settings.INGEST_RETRY_BACKOFF_MS / 1000,
+    dead_letter_max=settings.INGEST_DEAD_LETTER_MAX,
+)
@@ -1,20 +1,48 @@
-from sqlalchemy.orm import Session
+from sqlalchemy import and_, bindparam, exists, func, insert, or_, select, update
+from sqlalchemy.dialects import postgresql, sqlite
+from sqlalchemy.exc import IntegrityError
+from sqlalchemy.ext.asyncio import AsyncSession
+from sqlalchemy.orm import Session, selectinload
 import models
+from config import settings
 from schemas.machine import CheckInPayload
-from datetime import datetime
+from services.events import broadcaster
+from services.summary import invalidate_summary
+from collections import Counter
+from datetime import datetime, timezone
+from typing import List, Optional
+import base64
+import binascii
+import hashlib
+import json
+
+
+def _observed_at(payload: CheckInPayload, now: datetime) -> datetime:
+    """Collection time of a report as naive UTC, clamped so it is never in the future."""
+    ts = payload.observed_at
+    if ts is None:
+        return now
+    if ts.tzinfo is not None:
+        ts = ts.astimezone(timezone.utc).replace(tzinfo=None)
+    return min(ts, now)
 
 
 def upsert_machine_and_checks(db: Session, payload: CheckInPayload):
+    """Store one check-in and return the machine with its latest checks."""
+    now = datetime.utcnow()
     # Get existing machine
     machine = db.query(models.machine.Machine).filter(models.machine.Machine.machine_id == payload.machine_id).first()
-    if not machine:
+    created = machine is None
+    if created:
         machine = models.machine.Machine(
             machine_id=payload.machine_id,
             hostname=payload.hostname,
             os_name=payload.os_name,
             os_version=payload.os_version,
-            metadata=payload.metadata or {},
-            last_checkin=datetime.utcnow()
+            machine_metadata=payload.metadata or {},
+            state_hash=payload.state_hash,
+            last_checkin=now,
+            version=1,
         )
         db.add(machine)
         db.flush()  # get id for foreign keys
@@ -22,77 +50,531 @@ def upsert_machine_and_checks(db: Session, payload: CheckInPayload):
         machine.hostname = payload.hostname or machine.hostname
         machine.os_name = payload.os_name or machine.os_name
         machine.os_version = payload.os_version or machine.os_version
-        machine.metadata = payload.metadata or machine.metadata
-        machine.last_checkin = datetime.utcnow()
-
-    # Only create check results for provided checks (we store history)
-    new_checks = []
-    for ch in payload.checks or []:
-        cr = models.machine.CheckResult(
-            machine=machine,
-            check_name=ch.name,
-            status=ch.status,
-            details=ch.details or {}
+        machine.machine_metadata = payload.metadata or machine.machine_metadata
+        machine.state_hash = payload.state_hash
+        machine.last_checkin = now
+        machine.version = _next_version()
+
+    # Only record provided checks; repeats extend the current history interval
+    observed_at = _observed_at(payload, now)
+    new_rows = _record_checks(db, [
+        {
+            "machine_id_fk": machine.id,
+            "check_name": ch.name,
+            "status": ch.status,
+            "details": ch.details or {},
+            "created_at": observed_at,
+        }
+        for ch in payload.checks or []
+    ], now)
+
+    db.commit()
+    invalidate_summary()
+    publish_machine_events([(machine.id, payload.machine_id, payload.metadata, created)], new_rows, now)
+    return get_machine(db, machine.id)
+
+
+def _next_version():
+    # evaluated by the database, so concurrent writers never hand out the same version
+    return func.coalesce(models.machine.Machine.version, 0) + 1
+
+
+def bump_machine_versions(db: Session, machine_pks):
+    """Bump the version of the given machines in the current transaction."""
+    Machine = models.machine.Machine
+    db.execute(
+        update(Machine)
+        .where(Machine.id.in_(list(machine_pks)))
+        .values(version=_next_version())
+        .execution_options(synchronize_session=False)
+    )
+
+
+def get_fleet_version(db: Session) -> str:
+    """Fingerprint of every machine version (the ETag of GET /machines).
+
+    Versions only ever grow, so the machine count plus the sum of versions
+    changes whenever any machine is written or added. Both come from the
+    index on machines.version; there is no shared row for writers to
+    contend on.
+    """
+    Machine = models.machine.Machine
+    count, total = db.execute(select(func.count(Machine.version), func.coalesce(func.sum(Machine.version), 0))).one()
+    return f"{count}-{total}"
+
+
+def get_machine_version(db: Session, machine_id: int):
+    """Version of one machine (the ETag of GET /machines/{id}), or None if it does not exist."""
+    Machine = models.machine.Machine
+    row = db.execute(select(Machine.version).where(Machine.id == machine_id)).first()
+    return None if row is None else row[0] or 0
+
+
+def _stable_details(details) -> dict:
+    volatile = settings.VOLATILE_DETAIL_KEYS
+    return {k: v for k, v in (details or {}).items() if k not in volatile}
+
+
+def details_hash(details) -> str:
+    """Hash of a check's details, ignoring VOLATILE_DETAIL_KEYS."""
+    canonical = json.dumps(_stable_details(details), sort_keys=True, separators=(",", ":"), default=str)
+    return hashlib.sha256(canonical.encode()).hexdigest()
+
+
+LATEST_COLUMNS = (
+    "machine_id_fk", "check_name", "check_result_id", "status", "details", "details_hash", "created_at", "last_seen",
+)
+
+
+def _upsert_latest(db: Session, rows: List[dict]):
+    """Point latest_check_results at the given check rows, one per (machine, check)."""
+    if not rows:
+        return
+    # Keep the last row per key; Postgres rejects touching a row twice in one statement
+    deduped = list({(r["machine_id_fk"], r["check_name"]): r for r in rows}.values())
+
+    LatestCheckResult = models.machine.LatestCheckResult
+    dialect = db.get_bind().dialect.name
+    if dialect in ("sqlite", "postgresql"):
+        dialect_insert = sqlite.insert if dialect == "sqlite" else postgresql.insert
+        stmt = dialect_insert(LatestCheckResult.__table__)
+        stmt = stmt.on_conflict_do_update(
+            index_elements=["machine_id_fk", "check_name"],
+            set_={c: stmt.excluded[c] for c in LATEST_COLUMNS[2:]},
         )
-        db.add(cr)
-        new_checks.append(cr)
+        db.execute(stmt, deduped)
+    else:
+        for row in deduped:
+            db.merge(LatestCheckResult(**row))
+
 
+def rebuild_latest_check_results(db: Session):
+    """Repopulate latest_check_results from the full check history."""
+    CheckResult = models.machine.CheckResult
+    LatestCheckResult = models.machine.LatestCheckResult
+    latest_ids = select(func.max(CheckResult.id)).group_by(CheckResult.machine_id_fk, CheckResult.check_name)
+    db.execute(LatestCheckResult.__table__.delete())
+    db.execute(
+        insert(LatestCheckResult).from_select(
+            list(LATEST_COLUMNS),
+            select(
+                CheckResult.machine_id_fk,
+                CheckResult.check_name,
+                CheckResult.id,
+                CheckResult.status,
+                CheckResult.details,
+                CheckResult.details_hash,
+                CheckResult.created_at,
+                CheckResult.last_seen,
+            ).where(CheckResult.id.in_(latest_ids)),
+        )
+    )
     db.commit()
-    db.refresh(machine)
-    return machine
 
 
-import json
+def _record_checks(db: Session, rows: List[dict], now: datetime, sources: Optional[List[int]] = None) -> List[dict]:
+    """Store check observations as run-length encoded history.
+
+    ``rows`` hold machine_id_fk, check_name, status, details and created_at
+    (the observation time), in observation order. An observation repeating
+    the current status and details hash of its (machine, check) only extends
+    that interval's last_seen and repeat_count; anything else starts a new
+    interval row. latest_check_results is kept in step. Inserted and
+    extended rows get modified_at = ``now``.
+
+    Returns the new interval rows, i.e. the observations that changed a check.
+    If ``sources`` is given, the index in ``rows`` of each of them is appended
+    to it.
+    """
+    if not rows:
+        return []
+    CheckResult = models.machine.CheckResult
+    LatestCheckResult = models.machine.LatestCheckResult
+
+    current = {
+        (m, c): {"id": cr_id, "status": st, "hash": h, "pending": None}
+        for m, c, cr_id, st, h in db.execute(
+            select(
+                LatestCheckResult.machine_id_fk,
+                LatestCheckResult.check_name,
+                LatestCheckResult.check_result_id,
+                LatestCheckResult.status,
+                LatestCheckResult.details_hash,
+            ).where(LatestCheckResult.machine_id_fk.in_({r["machine_id_fk"] for r in rows}))
+        )
+    }
+
+    new_rows = []
+    extended = {}  # stored interval id -> extension
+    for i, r in enumerate(rows):
+        key = (r["machine_id_fk"], r["check_name"])
+        h = details_hash(r["details"])
+        cur = current.get(key)
+        if cur is not None and cur["status"] == r["status"] and cur["hash"] == h:
+            if cur["pending"] is not None:  # repeats an interval opened in this call
+                cur["pending"]["last_seen"] = r["created_at"]
+                cur["pending"]["repeat_count"] += 1
+            else:
+                ext = extended.setdefault(cur["id"], {"b_id": cur["id"], "b_n": 0, "key": key})
+                ext["b_last_seen"] = r["created_at"]
+                ext["b_n"] += 1
+            continue
+        row = {**r, "details_hash": h, "last_seen": r["created_at"], "repeat_count": 1, "modified_at": now}
+        new_rows.append(row)
+        if sources is not None:
+            sources.append(i)
+        current[key] = {"id": None, "status": r["status"], "hash": h, "pending": row}
+
+    if extended:
+        history = CheckResult.__table__
+        db.execute(
+            history.update()
+            .where(history.c.id == bindparam("b_id"))
+            .values(
+                last_seen=bindparam("b_last_seen"),
+                repeat_count=func.coalesce(history.c.repeat_count, 1) + bindparam("b_n"),
+                modified_at=now,
+            ),
+            [{k: v for k, v in ext.items() if k != "key"} for ext in extended.values()],
+        )
+        # keys that also opened a new interval are repointed by the upsert below
+        latest_updates = [
+            {"b_m": ext["key"][0], "b_c": ext["key"][1], "b_last_seen": ext["b_last_seen"]}
+            for ext in extended.values()
+            if current[ext["key"]]["pending"] is None
+        ]
+        if latest_updates:
+            latest = LatestCheckResult.__table__
+            db.execute(
+                latest.update()
+                .where(latest.c.machine_id_fk == bindparam("b_m"), latest.c.check_name == bindparam("b_c"))
+                .values(last_seen=bindparam("b_last_seen")),
+                latest_updates,
+            )
+
+    if new_rows:
+        if db.get_bind().dialect.insert_executemany_returning_sort_by_parameter_order:
+            ids = db.scalars(
+                insert(CheckResult).returning(CheckResult.id, sort_by_parameter_order=True),
+                new_rows,
+            ).all()
+        else:
+            # no ordered INSERT ... RETURNING (e.g. MySQL/MariaDB): one INSERT per row
+            ids = [db.execute(insert(CheckResult).values(**row)).inserted_primary_key[0] for row in new_rows]
+        _upsert_latest(db, [
+            {**{c: row[c] for c in LATEST_COLUMNS if c != "check_result_id"}, "check_result_id": cr_id}
+            for row, cr_id in zip(new_rows, ids)
+        ])
+    return new_rows
+
+
+def publish_machine_events(machines, new_rows: List[dict], now: datetime):
+    """Publish one "machine" event per written machine to GET /events subscribers.
+
+    ``machines`` holds (machine pk, machine_id, reported metadata or None,
+    created) tuples. Each event lists only the checks whose status or
+    details changed, with the time the new value was observed;
+    overall_status is None when the report carried no metadata.
+    """
+    changed = {}
+    for r in new_rows:
+        changed.setdefault(r["machine_id_fk"], {})[r["check_name"]] = {
+            "check_name": r["check_name"],
+            "status": r["status"],
+            "created_at": r["created_at"],
+        }
+    for pk, machine_id, metadata, created in machines:
+        broadcaster.publish("machine", {
+            "id": pk,
+            "machine_id": machine_id,
+            "created": created,
+            "overall_status": (metadata or {}).get("overall_status"),
+            "last_checkin": now,
+            "checks": [check for _, check in sorted(changed.get(pk, {}).items())],
+        })
+
+
+def _merge_batch_payloads(payloads: List[CheckInPayload], now: datetime):
+    """Collapse a batch into one entry per machine_id, keeping report order.
+
+    Later reports for the same machine win for host fields (falling back to
+    earlier values when a field is missing), and all of their checks are kept
+    as (check, observed_at, payload index) triples.
+    """
+    merged = {}
+    for i, p in enumerate(payloads):
+        entry = merged.get(p.machine_id)
+        if entry is None:
+            entry = merged[p.machine_id] = {
+                "hostname": None,
+                "os_name": None,
+                "os_version": None,
+                "metadata": None,
+                "state_hash": None,
+                "checks": [],
+            }
+        entry["hostname"] = p.hostname or entry["hostname"]
+        entry["os_name"] = p.os_name or entry["os_name"]
+        entry["os_version"] = p.os_version or entry["os_version"]
+        entry["metadata"] = p.metadata or entry["metadata"]
+        entry["state_hash"] = p.state_hash  # describes the latest report only
+        observed_at = _observed_at(p, now)
+        entry["checks"].extend((ch, observed_at, i) for ch in p.checks or [])
+    return merged
+
+
+def _write_batch(db: Session, merged: dict, now: datetime):
+    Machine = models.machine.Machine
+
+    # One SELECT resolves every machine in the batch
+    ids_by_machine = dict(
+        db.execute(select(Machine.machine_id, Machine.id).where(Machine.machine_id.in_(list(merged)))).all()
+    )
+
+    new_machines = [
+        {
+            "machine_id": mid,
+            "hostname": entry["hostname"],
+            "os_name": entry["os_name"],
+            "os_version": entry["os_version"],
+            "machine_metadata": entry["metadata"] or {},
+            "state_hash": entry["state_hash"],
+            "last_checkin": now,
+            "version": 1,
+        }
+        for mid, entry in merged.items()
+        if mid not in ids_by_machine
+    ]
+    if new_machines:
+        db.execute(insert(Machine), new_machines)
+        new_ids = [m["machine_id"] for m in new_machines]
+        ids_by_machine.update(
+            db.execute(select(Machine.machine_id, Machine.id).where(Machine.machine_id.in_(new_ids))).all()
+        )
+
+    # Bulk UPDATE by primary key; missing fields keep their stored value
+    created = {m["machine_id"] for m in new_machines}
+    updates = []
+    for mid, entry in merged.items():
+        if mid in created:
+            continue
+        row = {"id": ids_by_machine[mid], "last_checkin": now, "state_hash": entry["state_hash"]}
+        for field in ("hostname", "os_name", "os_version"):
+            if entry[field]:
+                row[field] = entry[field]
+        if entry["metadata"]:
+            row["machine_metadata"] = entry["metadata"]
+        updates.append(row)
+    if updates:
+        db.execute(update(Machine), updates)
+        bump_machine_versions(db, [u["id"] for u in updates])
+
+    check_rows, owners = [], []
+    for mid, entry in merged.items():
+        for ch, observed_at, i in entry["checks"]:
+            check_rows.append({
+                "machine_id_fk": ids_by_machine[mid],
+                "check_name": ch.name,
+                "status": ch.status,
+                "details": ch.details or {},
+                "created_at": observed_at,
+            })
+            owners.append(i)
+    sources = []
+    new_rows = _record_checks(db, check_rows, now, sources)
+    # history rows each payload started; repeats only extend an interval
+    stored = Counter(owners[j] for j in sources)
+
+    return ids_by_machine, created, new_rows, stored
+
+
+def upsert_machines_and_checks_batch(db: Session, payloads: List[CheckInPayload]):
+    """Ingest many check-ins with a fixed number of bulk statements and one commit.
 
-def list_machines(db: Session, os_name: str | None = None, status: str | None = None, limit: int = 100, offset: int = 0):
+    Returns one result dict per payload, in request order.
+    """
+    if not payloads:
+        return []
+
+    now = datetime.utcnow()
+    merged = _merge_batch_payloads(payloads, now)
+    try:
+        ids_by_machine, created, new_rows, stored = _write_batch(db, merged, now)
+        db.commit()
+    except IntegrityError:
+        # A concurrent request created one of our new machines first; retry
+        # once so those rows are treated as updates.
+        db.rollback()
+        ids_by_machine, created, new_rows, stored = _write_batch(db, merged, now)
+        db.commit()
+    invalidate_summary()
+    publish_machine_events(
+        [(ids_by_machine[mid], mid, entry["metadata"], mid in created) for mid, entry in merged.items()],
+        new_rows,
+        now,
+    )
+
+    return [
+        {
+            "index": i,
+            "machine_id": p.machine_id,
+            "id": ids_by_machine[p.machine_id],
+            "checks_stored": stored[i],
+        }
+        for i, p in enumerate(payloads)
+    ]
+
+
+def apply_delta_report(db: Session, payload: CheckInPayload):
+    """Apply a delta report: the checks that changed since the agent's last report.
+
+    The machine row is touched with one UPDATE (last_checkin, plus any host
+    fields sent). Checks go through the run-length encoded history, so a
+    check whose status and non-volatile details match its latest result
+    only extends that interval, and empty deltas add nothing. Unknown
+    machines are not created; the reply asks for a full report instead.
+    """
+    Machine = models.machine.Machine
+
+    now = datetime.utcnow()
+    out = {"machine_id": payload.machine_id, "checks_stored": 0, "checks_unchanged": 0}
+    machine_pk = db.scalar(select(Machine.id).where(Machine.machine_id == payload.machine_id))
+    if machine_pk is None:
+        return {**out, "full_report_required": True}
+
+    values = {"last_checkin": now, "state_hash": payload.state_hash, "version": _next_version()}
+    for field in ("hostname", "os_name", "os_version"):
+        if getattr(payload, field):
+            values[field] = getattr(payload, field)
+    if payload.metadata:
+        values["machine_metadata"] = payload.metadata
+    db.execute(update(Machine).where(Machine.id == machine_pk).values(**values))
+
+    observed_at = _observed_at(payload, now)
+    new_rows = _record_checks(db, [
+        {
+            "machine_id_fk": machine_pk,
+            "check_name": ch.name,
+            "status": ch.status,
+            "details": ch.details or {},
+            "created_at": observed_at,
+        }
+        for ch in payload.checks or []
+    ], now)
+    db.commit()
+    invalidate_summary()
+    publish_machine_events([(machine_pk, payload.machine_id, payload.metadata, False)], new_rows, now)
+
+    return {
+        **out,
+        "id": machine_pk,
+        "checks_stored": len(new_rows),
+        "checks_unchanged": len(payload.checks or []) - len(new_rows),
+    }
+
+
+def record_heartbeat(db: Session, machine_id: str, state_hash) -> bool:
+    """Bump last_checkin and the version with a single UPDATE, only if the stored state hash matches.
+
+    Returns False when the machine is unknown or its state hash differs, in
+    which case the agent should send a full report. The version bump moves
+    the ETags of GET /machines and /machines/{id}, so cached reads pick up
+    the new last_checkin; it touches only this machine's row.
+    """
+    Machine = models.machine.Machine
+    result = db.execute(
+        update(Machine)
+        .where(Machine.machine_id == machine_id, Machine.state_hash == state_hash)
+        .values(last_checkin=datetime.utcnow(), version=_next_version())
+        .execution_options(synchronize_session=False)
+    )
+    db.commit()
+    return result.rowcount == 1
+
+
+def _machine_metadata(m):
+    md = m.machine_metadata
+    if isinstance(md, str):
+        try:
+            md = json.loads(md)
+        except json.JSONDecodeError:
+            md = None
+    elif not isinstance(md, dict):
+        md = None
+    return md
+
+
+def _latest_check_out(lc):
+    return {
+        "id": lc.check_result_id,
+        "check_name": lc.check_name,
+        "status": lc.status,
+        "details": lc.details,
+        "created_at": lc.created_at,
+        "last_seen": lc.last_seen,
+    }
+
+
+def _recent_history(db: Session, machine_pks: List[int], per_machine: int):
+    """Load the newest ``per_machine`` check results for each machine in one query."""
+    CheckResult = models.machine.CheckResult
+    rn = func.row_number().over(
+        partition_by=CheckResult.machine_id_fk,
+        order_by=(CheckResult.created_at.desc(), CheckResult.id.desc()),
+    ).label("rn")
+    ranked = select(CheckResult.id, rn).where(CheckResult.machine_id_fk.in_(machine_pks)).subquery()
+    rows = db.scalars(
+        select(CheckResult)
+        .join(ranked, ranked.c.id == CheckResult.id)
+        .where(ranked.c.rn <= per_machine)
+        .order_by(CheckResult.machine_id_fk, CheckResult.created_at.desc(), CheckResult.id.desc())
+    ).all()
+    by_machine = {pk: [] for pk in machine_pks}
+    for cr in rows:
+        by_machine[cr.machine_id_fk].append(cr)
+    return by_machine
+
+
+def list_machines(db: Session, os_name: str | None = None, status: str | None = None, limit: int = 100, offset: int = 0,
+                  history_limit: int | None = None):
+    """List machines with their current checks.
+
+    By default ``checks`` holds the latest result per check name, loaded for
+    the whole page in one batched query. Passing ``history_limit`` returns up
+    to that many of the most recent history rows per machine instead.
+    """
     q = db.query(models.machine.Machine)
 
     # Step 2: Optional OS filter
     if os_name:
         q = q.filter(models.machine.Machine.os_name == os_name)
 
-    # Step 3: Optional status filter (latest check per machine)
+    # Step 3: Optional status filter (any current check with that status)
     if status:
-        from sqlalchemy import func
-        sub = (
-            db.query(
-                models.machine.CheckResult.machine_id_fk,
-                func.max(models.machine.CheckResult.created_at).label("m")
+        LatestCheckResult = models.machine.LatestCheckResult
+        q = q.filter(
+            exists().where(
+                LatestCheckResult.machine_id_fk == models.machine.Machine.id,
+                LatestCheckResult.status == status,
             )
-            .group_by(models.machine.CheckResult.machine_id_fk)
-            .subquery()
-        )
-        q = (
-            q.join(
-                models.machine.CheckResult,
-                models.machine.Machine.id == models.machine.CheckResult.machine_id_fk
-            )
-            .join(
-                sub,
-                (models.machine.CheckResult.machine_id_fk == sub.c.machine_id_fk) &
-                (models.machine.CheckResult.created_at == sub.c.m)
-            )
-            .filter(models.machine.CheckResult.status == status)
         )
 
     # Step 4: Apply ordering & pagination
     q = q.order_by(models.machine.Machine.last_checkin.desc()).limit(limit).offset(offset)
+    if history_limit is None:
+        q = q.options(selectinload(models.machine.Machine.latest_checks))
 
     # Step 5: Fetch data
     machines = q.all()
+    history = _recent_history(db, [m.id for m in machines], history_limit) if history_limit and machines else {}
 
     # Step 6: Transform metadata into a dict
     result = []
     for m in machines:
-        md = getattr(m, "metadata", None)
-        if isinstance(md, str):
-            import json
-            try:
-                md = json.loads(md)
-            except json.JSONDecodeError:
-                md = None
-        elif not isinstance(md, dict):
-            md = None
+        if history_limit is None:
+            checks = [_latest_check_out(lc) for lc in sorted(m.latest_checks, key=lambda lc: lc.check_name)]
+        else:
+            checks = history.get(m.id, [])
 
         result.append({
             "id": m.id,
@@ -101,20 +583,117 @@ def list_machines(db: Session, os_name: str | None = None, status: str | None =
             "os_name": m.os_name,
             "os_version": m.os_version,
             "last_checkin": m.last_checkin,
-            "metadata": md,
-            "checks": m.checks,
+            "metadata": _machine_metadata(m),
+            "checks": checks,
         })
 
     return result
 
 
 def get_machine(db: Session, machine_id: int):
-    machine = db.query(models.machine.Machine).filter(models.machine.Machine.id == machine_id).first()
-    if machine and isinstance(machine.metadata, str):
-        try:
-            import json
-            machine.metadata = json.loads(machine.metadata)
-        except json.JSONDecodeError:
-            machine.metadata = {}
-    return machine
+    """Return a machine with the latest result per check, or None."""
+    machine = (
+        db.query(models.machine.Machine)
+        .options(selectinload(models.machine.Machine.latest_checks))
+        .filter(models.machine.Machine.id == machine_id)
+        .first()
+    )
+    if not machine:
+        return None
+    return {
+        "id": machine.id,
+        "machine_id": machine.machine_id,
+        "hostname": machine.hostname,
+        "os_name": machine.os_name,
+        "os_version": machine.os_version,
+        "last_checkin": machine.last_checkin,
+        "metadata": _machine_metadata(machine),
+        "checks": [_latest_check_out(lc) for lc in sorted(machine.latest_checks, key=lambda lc: lc.check_name)],
+    }
+
+
+def machine_exists(db: Session, machine_id: int) -> bool:
+    Machine = models.machine.Machine
+    return db.query(exists().where(Machine.id == machine_id)).scalar()
+
+
+def encode_history_cursor(created_at: datetime, check_id: int) -> str:
+    raw = f"{created_at.isoformat()}|{check_id}".encode()
+    return base64.urlsafe_b64encode(raw).decode().rstrip("=")
+
+
+def decode_history_cursor(cursor: str):
+    """Inverse of encode_history_cursor; raises ValueError on malformed input."""
+    try:
+        raw = base64.urlsafe_b64decode(cursor + "=" * (-len(cursor) % 4)).decode()
+        ts, check_id = raw.split("|", 1)
+        return datetime.fromisoformat(ts), int(check_id)
+    except (binascii.Error, UnicodeDecodeError, ValueError) as e:
+        raise ValueError("Invalid cursor") from e
+
+
+def get_check_history(
+    db: Session,
+    machine_id: int,
+    check_name: str | None = None,
+    since: datetime | None = None,
+    until: datetime | None = None,
+    limit: int = 100,
+    cursor: str | None = None,
+):
+    """Page through a machine's check history, newest first.
+
+    Each item is one run-length encoded interval (created_at to last_seen);
+    ``since``/``until`` select the intervals overlapping that window.
+    Pagination is keyset-based on (created_at, id), so each page is an index
+    range scan regardless of how deep into the history it is.
+    Returns ``(items, next_cursor)``.
+    """
+    CheckResult = models.machine.CheckResult
+    q = db.query(CheckResult).filter(CheckResult.machine_id_fk == machine_id)
+    if check_name:
+        q = q.filter(CheckResult.check_name == check_name)
+    if since:
+        q = q.filter(func.coalesce(CheckResult.last_seen, CheckResult.created_at) >= since)
+    if until:
+        q = q.filter(CheckResult.created_at < until)
+    if cursor:
+        c_ts, c_id = decode_history_cursor(cursor)
+        q = q.filter(
+            or_(
+                CheckResult.created_at < c_ts,
+                and_(CheckResult.created_at == c_ts, CheckResult.id < c_id),
+            )
+        )
+
+    rows = q.order_by(CheckResult.created_at.desc(), CheckResult.id.desc()).limit(limit + 1).all()
+    next_cursor = None
+    if len(rows) > limit:
+        rows = rows[:limit]
+        next_cursor = encode_history_cursor(rows[-1].created_at, rows[-1].id)
+    return rows, next_cursor
+
+
+# Async variants. Each runs the sync implementation above through
+# AsyncSession.run_sync, so statements go through the async driver without
+# blocking the event loop and there is a single copy of the query logic.
+# All of them return plain dicts, so nothing lazy-loads after the call.
+
+async def upsert_machine_and_checks_async(db: AsyncSession, payload: CheckInPayload):
+    return await db.run_sync(upsert_machine_and_checks, payload)
+
+
+async def list_machines_async(db: AsyncSession, **kwargs):
+    return await db.run_sync(list_machines, **kwargs)
+
+
+async def get_machine_async(db: AsyncSession, machine_id: int):
+    return await db.run_sync(get_machine, machine_id)
+
+
+async def get_fleet_version_async(db: AsyncSession) -> str:
+    return await db.run_sync(get_fleet_version)
+
 
+async def get_machine_version_async(db: AsyncSession, machine_id: int):
+    return await db.run_sync(get_machine_version, machine_id)
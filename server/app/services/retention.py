@@ -0,0 +1,221 @@
+"""History retention: roll up and delete old check history, then compact.
+
+check_results rows whose interval ended more than ``raw_days`` ago are
+folded into check_daily_rollups and deleted, ``batch_size`` rows per
+transaction so the write lock is only ever held briefly. Rows that
+latest_check_results still points at are kept whatever their age. Run it
+from scripts/retention.py or, with RETENTION_INTERVAL_HOURS > 0, from the
+background worker started by the app.
+"""
+import logging
+import threading
+import time
+from datetime import datetime, timedelta
+from typing import Optional
+
+from sqlalchemy import case, delete, exists, func, select, text
+from sqlalchemy.dialects import postgresql, sqlite
+from sqlalchemy.orm import Session
+
+import models
+from config import settings
+from database import SessionLocal
+from services.machine_service import bump_machine_versions
+
+logger = logging.getLogger(__name__)
+
+
+def database_size_bytes(bind) -> Optional[int]:
+    """On-disk size of the database, or None where it cannot be measured."""
+    dialect = bind.dialect.name
+    with bind.connect() as conn:
+        if dialect == "sqlite":
+            page_count = conn.execute(text("PRAGMA page_count")).scalar()
+            page_size = conn.execute(text("PRAGMA page_size")).scalar()
+            return page_count * page_size
+        if dialect == "postgresql":
+            return conn.execute(text("SELECT pg_database_size(current_database())")).scalar()
+    return None
+
+
+def _rollup_rows(rows):
+    """Aggregate history rows into one rollup row per (machine, check, day, status)."""
+    rollups = {}
+    for _id, machine_pk, check_name, status, created_at, last_seen, repeat_count in rows:
+        key = (machine_pk, check_name, created_at.date(), status)
+        last_seen = last_seen or created_at
+        r = rollups.get(key)
+        if r is None:
+            rollups[key] = {
+                "machine_id_fk": machine_pk,
+                "check_name": check_name,
+                "day": key[2],
+                "status": status,
+                "intervals": 1,
+                "observations": repeat_count or 1,
+                "first_seen": created_at,
+                "last_seen": last_seen,
+            }
+        else:
+            r["intervals"] += 1
+            r["observations"] += repeat_count or 1
+            r["first_seen"] = min(r["first_seen"], created_at)
+            r["last_seen"] = max(r["last_seen"], last_seen)
+    return list(rollups.values())
+
+
+def _merge_rollups(db: Session, rollups):
+    Rollup = models.machine.CheckDailyRollup
+    dialect = db.get_bind().dialect.name
+    if dialect in ("sqlite", "postgresql"):
+        table = Rollup.__table__
+        dialect_insert = sqlite.insert if dialect == "sqlite" else postgresql.insert
+        stmt = dialect_insert(table)
+        excluded = stmt.excluded
+        stmt = stmt.on_conflict_do_update(
+            index_elements=["machine_id_fk", "check_name", "day", "status"],
+            set_={
+                "intervals": table.c.intervals + excluded.intervals,
+                "observations": table.c.observations + excluded.observations,
+                "first_seen": case((excluded.first_seen < table.c.first_seen, excluded.first_seen),
+                                   else_=table.c.first_seen),
+                "last_seen": case((excluded.last_seen > table.c.last_seen, excluded.last_seen),
+                                  else_=table.c.last_seen),
+            },
+        )
+        db.execute(stmt, rollups)
+        return
+    for r in rollups:
+        row = db.get(Rollup, (r["machine_id_fk"], r["check_name"], r["day"], r["status"]))
+        if row is None:
+            db.add(Rollup(**r))
+        else:
+            row.intervals += r["intervals"]
+            row.observations += r["observations"]
+            row.first_seen = min(row.first_seen, r["first_seen"])
+            row.last_seen = max(row.last_seen, r["last_seen"])
+
+
+def purge_raw_history(db: Session, cutoff: datetime, batch_size: int) -> dict:
+    """Roll up and delete history intervals that ended before ``cutoff``, one chunk per commit."""
+    CheckResult = models.machine.CheckResult
+    LatestCheckResult = models.machine.LatestCheckResult
+    stats = {"rows_deleted": 0, "rollup_rows_written": 0, "chunks": 0}
+    stmt = (
+        select(
+            CheckResult.id,
+            CheckResult.machine_id_fk,
+            CheckResult.check_name,
+            CheckResult.status,
+            CheckResult.created_at,
+            CheckResult.last_seen,
+            CheckResult.repeat_count,
+        )
+        .where(
+            func.coalesce(CheckResult.last_seen, CheckResult.created_at) < cutoff,
+            ~exists().where(LatestCheckResult.check_result_id == CheckResult.id),
+        )
+        .order_by(CheckResult.id)
+        .limit(batch_size)
+    )
+    while True:
+        rows = db.execute(stmt).all()
+        if not rows:
+            return stats
+        rollups = _rollup_rows(rows)
+        _merge_rollups(db, rollups)
+        db.execute(delete(CheckResult).where(CheckResult.id.in_([r[0] for r in rows])))
+        # GET /machines?history=true may have listed the deleted rows
+        bump_machine_versions(db, {r[1] for r in rows})
+        db.commit()
+        stats["rows_deleted"] += len(rows)
+        stats["rollup_rows_written"] += len(rollups)
+        stats["chunks"] += 1
+        if len(rows) < batch_size:
+            return stats
+
+
+def purge_rollups(db: Session, cutoff: datetime) -> int:
+    """Delete daily rollups for days before ``cutoff``."""
+    Rollup = models.machine.CheckDailyRollup
+    result = db.execute(delete(Rollup).where(Rollup.day < cutoff.date()))
+    db.commit()
+    return result.rowcount
+
+
+def compact(bind, vacuum: bool = True):
+    """Refresh planner statistics and, if ``vacuum``, return free pages to the OS."""
+    dialect = bind.dialect.name
+    if dialect not in ("sqlite", "postgresql"):
+        return
+    # VACUUM cannot run inside a transaction
+    with bind.connect().execution_options(isolation_level="AUTOCOMMIT") as conn:
+        conn.execute(text("ANALYZE"))
+        if vacuum:
+            conn.execute(text("VACUUM"))
+
+
+def run_retention(
+    session_factory=SessionLocal,
+    raw_days: int = settings.RETENTION_RAW_DAYS,
+    rollup_days: int = settings.RETENTION_ROLLUP_DAYS,
+    batch_size: int = settings.RETENTION_BATCH_SIZE,
+    vacuum: bool = settings.RETENTION_VACUUM,
+    now: Optional[datetime] = None,
+) -> dict:
+    """Run one retention pass and return what it reclaimed."""
+    started = time.perf_counter()
+    now = now or datetime.utcnow()
+    db = session_factory()
+    try:
+        bind = db.get_bind()
+        bytes_before = database_size_bytes(bind)
+        stats = purge_raw_history(db, now - timedelta(days=raw_days), batch_size)
+        stats["rollup_rows_deleted"] = purge_rollups(db, now - timedelta(days=rollup_days)) if rollup_days else 0
+    finally:
+        db.close()
+
+    compact(bind, vacuum=vacuum)
+    bytes_after = database_size_bytes(bind)
+    stats.update({
+        "bytes_before": bytes_before,
+        "bytes_after": bytes_after,
+        "bytes_reclaimed": bytes_before - bytes_after if bytes_before is not None and bytes_after is not None else None,
+        "duration_ms": round((time.perf_counter() - started) * 1000, 2),
+    })
+    return stats
+
+
+class RetentionWorker:
+    """Background thread running run_retention() every ``interval_hours``."""
+
+    def __init__(self, interval_hours: float, session_factory=SessionLocal):
+        self.interval_hours = interval_hours
+        self._session_factory = session_factory
+        self._stop = threading.Event()
+        self._thread = None
+        self.last_result = None
+
+    def start(self):
+        if self._thread and self._thread.is_alive():
+            return
+        self._stop.clear()
+        self._thread = threading.Thread(target=self._run, name="retention", daemon=True)
+        self._thread.start()
+
+    def stop(self, timeout: float = 10.0):
+        self._stop.set()
+        if self._thread:
+            self._thread.join(timeout)
+            self._thread = None
+
+    def _run(self):
+        while not self._stop.wait(self.interval_hours * 3600):
+            try:
+                self.last_result = run_retention(self._session_factory)
+                logger.info("Retention pass: %s", self.last_result)
+            except Exception:
+                logger.exception("Retention pass failed")
+
+
+retention_worker = RetentionWorker(interval_hours=settings.RETENTION_INTERVAL_HOURS)
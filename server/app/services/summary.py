@@ -0,0 +1,94 @@
+"""Fleet-wide summary counts for GET /summary, cached in-process.
+
+All counts are GROUP BY queries over machines and latest_check_results, so
+the cost does not depend on history length or on how many machines a list
+page would return. The result is cached until the next ingest invalidates it
+(see machine_service) or SUMMARY_CACHE_TTL_SECONDS pass; the TTL keeps the
+staleness buckets moving, since time alone changes them.
+"""
+import threading
+import time
+from datetime import datetime, timedelta
+
+from sqlalchemy import case, func, select
+from sqlalchemy.orm import Session
+
+import models
+from config import settings
+
+# (bucket, maximum age of last_checkin); anything older falls in "older"
+STALENESS_BUCKETS = (
+    ("1h", timedelta(hours=1)),
+    ("24h", timedelta(days=1)),
+    ("7d", timedelta(days=7)),
+)
+
+_lock = threading.Lock()
+_generation = 0
+_cached = None  # (generation, computed at monotonic time, summary)
+
+
+def invalidate_summary():
+    """Drop the cached summary; called after every committed ingest."""
+    global _generation, _cached
+    with _lock:
+        _generation += 1
+        _cached = None
+
+
+def compute_summary(db: Session, now: datetime | None = None) -> dict:
+    Machine = models.machine.Machine
+    LatestCheckResult = models.machine.LatestCheckResult
+    now = now or datetime.utcnow()
+
+    overall = func.coalesce(Machine.machine_metadata["overall_status"].as_string(), "unknown")
+    by_status = dict(db.execute(select(overall, func.count()).group_by(overall)).all())
+
+    os_name = func.coalesce(Machine.os_name, "Unknown")
+    by_os = dict(db.execute(select(os_name, func.count()).group_by(os_name)).all())
+
+    bucket = case(
+        *[(Machine.last_checkin >= now - age, name) for name, age in STALENESS_BUCKETS],
+        else_="older",
+    )
+    by_staleness = {name: 0 for name, _ in STALENESS_BUCKETS}
+    by_staleness["older"] = 0
+    by_staleness.update(db.execute(select(bucket, func.count()).group_by(bucket)).all())
+
+    by_check = {}
+    rows = db.execute(
+        select(LatestCheckResult.check_name, LatestCheckResult.status, func.count())
+        .group_by(LatestCheckResult.check_name, LatestCheckResult.status)
+    ).all()
+    for check_name, status, count in rows:
+        by_check.setdefault(check_name, {})[status] = count
+
+    return {
+        "total": sum(by_status.values()),
+        "by_status": by_status,
+        "by_os": by_os,
+        "by_staleness": by_staleness,
+        "by_check": by_check,
+        "generated_at": now,
+    }
+
+
+def get_summary(db: Session) -> dict:
+    """Cached compute_summary(); recomputed after ingest or when the TTL expires."""
+    global _cached
+    with _lock:
+        generation = _generation
+        cached = _cached
+    if (
+        cached is not None
+        and cached[0] == generation
+        and time.monotonic() - cached[1] < settings.SUMMARY_CACHE_TTL_SECONDS
+    ):
+        return cached[2]
+
+    summary = compute_summary(db)
+    with _lock:
+        # don't cache a result that an ingest may have made stale meanwhile
+        if _generation == generation:
+            _cached = (generation, time.monotonic(), summary)
+    return summary
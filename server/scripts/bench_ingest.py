@@ -0,0 +1,107 @@
+"""Ingest throughput benchmark for the database engine profiles.
+
+Runs concurrent single-report check-ins (the POST /report service path)
+against a scratch database and prints reports/second and lock errors.
+
+    python scripts/bench_ingest.py                      # both SQLite profiles
+    python scripts/bench_ingest.py --profile sqlite-tuned --threads 16
+    python scripts/bench_ingest.py --profile server --url postgresql://user:pw@host/bench
+
+Profiles:
+    sqlite-legacy  create_engine defaults as shipped before engine tuning
+                   (rollback journal, synchronous=FULL, check_same_thread only)
+    sqlite-tuned   make_engine() with the SQLITE_* settings (WAL, NORMAL, ...)
+    server         make_engine() with the DB_POOL_* settings against --url
+"""
+import argparse
+import os
+import sys
+import tempfile
+import threading
+import time
+
+sys.path.insert(0, os.path.join(os.path.dirname(os.path.abspath(__file__)), "..", "app"))
+
+from sqlalchemy import create_engine  # noqa: E402
+from sqlalchemy.exc import OperationalError  # noqa: E402
+from sqlalchemy.orm import sessionmaker  # noqa: E402
+
+from config import Settings  # noqa: E402
+from database import Base, make_engine  # noqa: E402
+from models import machine as machine_models  # noqa: E402,F401
+from schemas.machine import CheckInPayload  # noqa: E402
+from services.machine_service import upsert_machine_and_checks  # noqa: E402
+
+CHECKS = [
+    {"name": "disk_encryption", "status": "encrypted", "details": {"encryption_type": "LUKS/dm-crypt"}},
+    {"name": "os_updates", "status": "up_to_date", "details": {"message": "No updates available"}},
+    {"name": "antivirus", "status": "protected", "details": {"count": 1}},
+    {"name": "inactivity_settings", "status": "compliant", "details": {"timeouts": {"idle_timeout": 5}}},
+]
+
+
+def build_engine(profile: str, url: str):
+    if profile == "sqlite-legacy":
+        return create_engine(url, connect_args={"check_same_thread": False})
+    return make_engine(url, Settings())
+
+
+def run(profile: str, url: str, threads: int, reports: int, fleet: int):
+    engine = build_engine(profile, url)
+    Base.metadata.drop_all(bind=engine)
+    Base.metadata.create_all(bind=engine)
+    Session = sessionmaker(bind=engine, autoflush=False)
+    errors = []
+
+    # each thread owns a disjoint slice of the fleet and re-reports it
+    per_thread = max(1, fleet // threads)
+
+    def worker(n):
+        db = Session()
+        try:
+            for i in range(reports):
+                payload = CheckInPayload(machine_id=f"bench-{n}-{i % per_thread}", checks=CHECKS)
+                try:
+                    upsert_machine_and_checks(db, payload)
+                except OperationalError as e:
+                    db.rollback()
+                    errors.append(str(e.orig))
+        finally:
+            db.close()
+
+    pool = [threading.Thread(target=worker, args=(n,)) for n in range(threads)]
+    start = time.perf_counter()
+    for t in pool:
+        t.start()
+    for t in pool:
+        t.join()
+    elapsed = time.perf_counter() - start
+    engine.dispose()
+
+    done = threads * reports - len(errors)
+    print(f"{profile:14s} threads={threads:<3d} reports={done:<6d} "
+          f"{done / elapsed:8.1f} reports/s  errors={len(errors)}")
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument("--profile", choices=["sqlite-legacy", "sqlite-tuned", "server"])
+    parser.add_argument("--url", help="database URL for the server profile")
+    parser.add_argument("--threads", type=int, default=8)
+    parser.add_argument("--reports", type=int, default=250, help="reports per thread")
+    parser.add_argument("--fleet", type=int, default=500, help="distinct machine ids")
+    args = parser.parse_args()
+
+    if args.profile == "server":
+        if not args.url:
+            parser.error("--profile server requires --url")
+        run("server", args.url, args.threads, args.reports, args.fleet)
+        return
+
+    for profile in [args.profile] if args.profile else ["sqlite-legacy", "sqlite-tuned"]:
+        with tempfile.TemporaryDirectory() as tmp:
+            run(profile, f"sqlite:///{os.path.join(tmp, 'bench.db')}", args.threads, args.reports, args.fleet)
+
+
+if __name__ == "__main__":
+    main()
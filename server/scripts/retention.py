@@ -0,0 +1,44 @@
+"""Roll up and delete old check history, then VACUUM/ANALYZE the database.
+
+Uses the app's DATABASE_URL and RETENTION_* settings unless overridden, and
+prints what was reclaimed as JSON.
+
+    python scripts/retention.py
+    python scripts/retention.py --raw-days 30 --rollup-days 365 --batch-size 2000
+    python scripts/retention.py --no-vacuum        # skip VACUUM (ANALYZE still runs)
+"""
+import argparse
+import json
+import os
+import sys
+
+sys.path.insert(0, os.path.join(os.path.dirname(os.path.abspath(__file__)), "..", "app"))
+
+from config import settings  # noqa: E402
+from database import init_db  # noqa: E402
+from services.retention import run_retention  # noqa: E402
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument("--raw-days", type=int, default=settings.RETENTION_RAW_DAYS,
+                        help="keep raw history intervals that ended within this many days")
+    parser.add_argument("--rollup-days", type=int, default=settings.RETENTION_ROLLUP_DAYS,
+                        help="keep daily rollups this many days (0 = forever)")
+    parser.add_argument("--batch-size", type=int, default=settings.RETENTION_BATCH_SIZE,
+                        help="history rows deleted per transaction")
+    parser.add_argument("--no-vacuum", action="store_true", help="skip VACUUM after deleting")
+    args = parser.parse_args()
+
+    init_db()
+    stats = run_retention(
+        raw_days=args.raw_days,
+        rollup_days=args.rollup_days,
+        batch_size=args.batch_size,
+        vacuum=settings.RETENTION_VACUUM and not args.no_vacuum,
+    )
+    print(json.dumps(stats, indent=2))
+
+
+if __name__ == "__main__":
+    main()
@@ -1,3 +1,5 @@
+import json
+from datetime import datetime, timedelta, timezone
 import pytest
 from fastapi.testclient import TestClient
 from app.main import app
@@ -39,3 +41,579 @@ def test_report_and_list():
     arr = r2.json()
     assert isinstance(arr, list)
     assert len(arr) >= 1
+
+
+def test_report_batch():
+    payloads = [
+        {"machine_id": "batch-1", "hostname": "b1", "os_name": "Linux",
+         "checks": [{"name": "antivirus", "status": "protected"}]},
+        {"machine_id": "batch-2", "hostname": "b2", "os_name": "Windows",
+         "checks": [{"name": "antivirus", "status": "unprotected"},
+                    {"name": "disk_encryption", "status": "encrypted"}]},
+        {"machine_id": "batch-1", "hostname": "b1-renamed", "checks": []},
+    ]
+    r = client.post("/api/report/batch", json=payloads)
+    assert r.status_code == 201
+    data = r.json()
+    assert data["accepted"] == 3
+    assert [item["machine_id"] for item in data["results"]] == ["batch-1", "batch-2", "batch-1"]
+    assert data["results"][0]["id"] == data["results"][2]["id"]
+    assert data["results"][1]["checks_stored"] == 2
+
+    # repeats extend the stored intervals; only the changed check is stored
+    r = client.post("/api/report/batch", json=[payloads[1], {**payloads[1], "checks": [
+        {"name": "antivirus", "status": "protected"}, {"name": "disk_encryption", "status": "encrypted"}]}])
+    assert [item["checks_stored"] for item in r.json()["results"]] == [0, 1]
+
+    m = client.get(f"/api/machines/{data['results'][0]['id']}").json()
+    assert m["hostname"] == "b1-renamed"
+    assert m["os_name"] == "Linux"
+    assert len(m["checks"]) == 1
+
+
+def test_latest_check_results_drive_status_and_export():
+    client.post("/api/report", json={
+        "machine_id": "latest-1",
+        "checks": [{"name": "antivirus", "status": "unprotected"}],
+    })
+    client.post("/api/report", json={
+        "machine_id": "latest-1",
+        "checks": [{"name": "antivirus", "status": "protected"}],
+    })
+    client.post("/api/report/batch", json=[{
+        "machine_id": "latest-2",
+        "checks": [{"name": "antivirus", "status": "unprotected"}],
+    }])
+
+    unprotected = {m["machine_id"] for m in client.get("/api/machines?status=unprotected").json()}
+    assert "latest-2" in unprotected
+    assert "latest-1" not in unprotected
+
+    r = client.get("/api/export/csv")
+    assert r.status_code == 200
+    rows = [line for line in r.text.splitlines() if line.startswith("latest-1,")]
+    assert len(rows) == 1
+    assert rows[0].endswith(",antivirus,protected")
+
+
+def test_list_machines_latest_and_history_modes():
+    for st in ("fail", "warning", "ok"):
+        client.post("/api/report", json={
+            "machine_id": "history-1",
+            "checks": [{"name": "os_update", "status": st}, {"name": "antivirus", "status": "protected"}],
+        })
+
+    machines = {m["machine_id"]: m for m in client.get("/api/machines").json()}
+    latest = machines["history-1"]["checks"]
+    assert sorted((c["check_name"], c["status"]) for c in latest) == [("antivirus", "protected"), ("os_update", "ok")]
+
+    machines = {m["machine_id"]: m for m in client.get("/api/machines?history=true&history_limit=3").json()}
+    history = machines["history-1"]["checks"]
+    assert len(history) == 3
+    assert history[0]["id"] > history[-1]["id"]
+
+
+def test_check_history_pagination():
+    for i in range(5):
+        r = client.post("/api/report", json={
+            "machine_id": "paged-1",
+            "checks": [{"name": "os_update", "status": f"s{i}"}, {"name": "antivirus", "status": "protected"}],
+        })
+    machine_pk = r.json()["id"]
+
+    detail = client.get(f"/api/machines/{machine_pk}").json()
+    assert len(detail["checks"]) == 2
+
+    seen = []
+    cursor = None
+    while True:
+        params = {"check_name": "os_update", "limit": 2}
+        if cursor:
+            params["cursor"] = cursor
+        page = client.get(f"/api/machines/{machine_pk}/checks", params=params).json()
+        seen.extend(item["status"] for item in page["items"])
+        cursor = page["next_cursor"]
+        if not cursor:
+            break
+    assert seen == ["s4", "s3", "s2", "s1", "s0"]
+
+    assert client.get(f"/api/machines/{machine_pk}/checks?cursor=bogus").status_code == 400
+    assert client.get("/api/machines/999999/checks").status_code == 404
+
+
+def test_export_formats():
+    client.post("/api/report", json={
+        "machine_id": "export-1",
+        "checks": [{"name": "antivirus", "status": "protected", "details": {"count": 1}}],
+    })
+
+    r = client.get("/api/export?format=ndjson&scope=history")
+    assert r.status_code == 200
+    rows = [json.loads(line) for line in r.text.splitlines()]
+    row = next(row for row in rows if row["machine_id"] == "export-1")
+    assert row["details"] == {"count": 1}
+
+    pa = pytest.importorskip("pyarrow")
+    import pyarrow.parquet as pq
+    r = client.get("/api/export?format=parquet&scope=latest")
+    assert r.status_code == 200
+    table = pq.read_table(pa.BufferReader(r.content))
+    assert "export-1" in table.column("machine_id").to_pylist()
+
+    r = client.get("/api/export?format=arrow&scope=history")
+    table = pa.ipc.open_stream(r.content).read_all()
+    assert table.num_rows == len(rows)
+
+
+def test_csv_export_streams_in_batches(monkeypatch):
+    from config import settings
+    from route import export as export_route
+
+    client.post("/api/report/batch", json=[
+        {"machine_id": f"stream-{n}", "checks": [{"name": "antivirus", "status": "protected"}]} for n in range(5)
+    ])
+    monkeypatch.setattr(settings, "EXPORT_BATCH_SIZE", 2)
+
+    chunks = list(export_route._stream_csv(export_route._latest_state_query(), export_route.CSV_HEADER))
+    assert len(chunks) > 2
+    lines = "".join(chunks).splitlines()
+    assert lines.count(",".join(export_route.CSV_HEADER)) == 1 and lines[0].startswith("machine_id,")
+    assert {f"stream-{n}" for n in range(5)} <= {line.split(",")[0] for line in lines[1:]}
+
+    # /export/csv keeps its columns, content type and download name
+    r = client.get("/api/export/csv")
+    assert r.status_code == 200 and r.headers["content-type"].startswith("text/csv")
+    assert r.headers["content-disposition"] == 'attachment; filename="machines-latest.csv"'
+    assert r.text.splitlines()[0] == "machine_id,hostname,os_name,os_version,last_checkin,latest_check,latest_status"
+    assert r.text == "".join(chunks)
+
+
+def test_export_since_watermark(monkeypatch):
+    from config import settings
+
+    monkeypatch.setattr(settings, "EXPORT_WATERMARK_LAG_SECONDS", 0)
+    client.post("/api/report", json={"machine_id": "delta-1", "checks": [{"name": "antivirus", "status": "protected"}]})
+    r = client.get("/api/export?format=ndjson&scope=history")
+    watermark = r.headers["X-Export-Watermark"]
+
+    client.post("/api/report", json={"machine_id": "delta-2", "checks": [{"name": "antivirus", "status": "unprotected"}]})
+
+    r = client.get(f"/api/export?format=ndjson&scope=history&since={watermark}")
+    rows = [json.loads(line) for line in r.text.splitlines()]
+    assert [row["machine_id"] for row in rows] == ["delta-2"]
+    assert int(r.headers["X-Export-Id-Watermark"]) == rows[0]["check_id"]
+    history_watermark, id_watermark = r.headers["X-Export-Watermark"], r.headers["X-Export-Id-Watermark"]
+
+    r = client.get(f"/api/export?format=ndjson&since={watermark}")
+    assert {json.loads(line)["machine_id"] for line in r.text.splitlines()} == {"delta-2"}
+    latest_watermark = r.headers["X-Export-Watermark"]
+
+    # a repeat only extends delta-2's interval: the timestamp watermark sees
+    # it, the id watermark (new intervals only) does not
+    client.post("/api/report", json={"machine_id": "delta-2", "checks": [{"name": "antivirus", "status": "unprotected"}]})
+    r = client.get(f"/api/export?format=ndjson&scope=history&since={history_watermark}")
+    assert [(row["machine_id"], row["repeat_count"]) for row in map(json.loads, r.text.splitlines())] == [
+        ("delta-2", 2)]
+    assert client.get(f"/api/export?format=ndjson&scope=history&since={id_watermark}").text == ""
+    # the same instant with a UTC offset selects the same rows
+    shifted = datetime.fromisoformat(history_watermark).replace(tzinfo=timezone.utc).astimezone(
+        timezone(timedelta(hours=2))).isoformat()
+    r2 = client.get("/api/export", params={"format": "ndjson", "scope": "history", "since": shifted})
+    assert r2.text == r.text
+    r = client.get(f"/api/export?format=ndjson&since={latest_watermark}")
+    assert {json.loads(line)["machine_id"] for line in r.text.splitlines()} == {"delta-2"}
+
+    assert client.get("/api/export?since=yesterday").status_code == 400
+
+
+def test_export_watermark_keeps_late_commits(monkeypatch):
+    from config import settings
+    from services import machine_service
+
+    client.post("/api/report", json={"machine_id": "commit-0", "checks": [{"name": "antivirus", "status": "protected"}]})
+    exported_at = datetime.utcnow()
+    watermark = client.get("/api/export?format=ndjson&scope=history").headers["X-Export-Watermark"]
+    assert datetime.fromisoformat(watermark) < exported_at
+
+    # an ingest that started before that export but committed after it
+    class Earlier(datetime):
+        @classmethod
+        def utcnow(cls):
+            return exported_at - timedelta(seconds=5)
+
+    monkeypatch.setattr(machine_service, "datetime", Earlier)
+    client.post("/api/report", json={"machine_id": "commit-1", "checks": [{"name": "antivirus", "status": "protected"}]})
+
+    # it lies above the lagged watermark, so the next delta picks it up (lag
+    # dropped here only so that delta does not hold it back in turn)
+    monkeypatch.setattr(settings, "EXPORT_WATERMARK_LAG_SECONDS", 0)
+    for scope in ("history", "latest"):
+        r = client.get("/api/export", params={"format": "ndjson", "scope": scope, "since": watermark})
+        assert "commit-1" in {json.loads(line)["machine_id"] for line in r.text.splitlines()}
+
+
+def test_async_service_layer(tmp_path):
+    pytest.importorskip("aiosqlite")
+    import asyncio
+    from sqlalchemy import create_engine
+    from sqlalchemy.ext.asyncio import AsyncSession, create_async_engine
+    from schemas.machine import CheckInPayload
+    from services import machine_service
+    import database
+
+    url = f"sqlite:///{tmp_path / 'async.db'}"
+    database.Base.metadata.create_all(bind=create_engine(url))
+    async_engine = create_async_engine(url.replace("sqlite://", "sqlite+aiosqlite://"))
+
+    async def scenario():
+        async with AsyncSession(async_engine, expire_on_commit=False) as db:
+            out = await machine_service.upsert_machine_and_checks_async(db, CheckInPayload(
+                machine_id="async-1", checks=[{"name": "antivirus", "status": "protected"}],
+            ))
+            listed = await machine_service.list_machines_async(db, status="protected")
+            fetched = await machine_service.get_machine_async(db, out["id"])
+        await async_engine.dispose()
+        return out, listed, fetched
+
+    out, listed, fetched = asyncio.run(scenario())
+    assert [m["machine_id"] for m in listed] == ["async-1"]
+    assert fetched["checks"][0]["status"] == "protected"
+
+
+def test_queued_ingest(monkeypatch):
+    from config import settings
+    from services.ingest_queue import IngestQueue
+    from route import machines as machines_route
+
+    q = IngestQueue(maxsize=1, batch_size=10, flush_interval=0.05)
+    monkeypatch.setattr(settings, "INGEST_MODE", "queued")
+    monkeypatch.setattr(machines_route, "ingest_queue", q)
+
+    payload = {"machine_id": "queued-1", "checks": [{"name": "antivirus", "status": "protected"}]}
+    r = client.post("/api/report", json=payload)
+    assert r.status_code == 202
+    # writer not started yet, so the single slot is taken
+    r = client.post("/api/report", json=payload)
+    assert r.status_code == 429
+    assert r.headers["Retry-After"] == "1"
+
+    q.start()
+    q.stop()
+    stats = q.metrics()
+    assert stats["written"] == 1 and stats["rejected"] == 1 and stats["depth"] == 0
+    assert "queued-1" in {m["machine_id"] for m in client.get("/api/machines").json()}
+
+
+def test_queued_ingest_retries_and_dead_letters(monkeypatch):
+    from sqlalchemy.exc import OperationalError
+    from schemas.machine import CheckInPayload
+    from services import ingest_queue as ingest_module
+
+    real_upsert = ingest_module.upsert_machines_and_checks_batch
+    calls = []
+
+    def flaky_upsert(db, batch):
+        calls.append([p.machine_id for p in batch])
+        if len(calls) == 1:
+            raise OperationalError("INSERT", {}, Exception("database is locked"))
+        if any(p.machine_id == "queued-bad" for p in batch):
+            raise ValueError("unwritable payload")
+        return real_upsert(db, batch)
+
+    monkeypatch.setattr(ingest_module, "upsert_machines_and_checks_batch", flaky_upsert)
+    q = ingest_module.IngestQueue(batch_size=10, flush_interval=0.05, retry_backoff=0.01)
+    for mid in ("queued-retry-1", "queued-bad", "queued-retry-2"):
+        assert q.submit(CheckInPayload(machine_id=mid, checks=[{"name": "antivirus", "status": "protected"}]))
+    q.start()
+    q.stop()
+
+    # locked once -> retried; still failing -> split per report
+    assert calls[0] == calls[1] == ["queued-retry-1", "queued-bad", "queued-retry-2"]
+    assert calls[2:] == [["queued-retry-1"], ["queued-bad"], ["queued-retry-2"]]
+    stats = q.metrics()
+    assert stats["retried"] == 1 and stats["written"] == 2 and stats["dead_lettered"] == 1
+    assert [p.machine_id for p, _ in q.dead_letters()] == ["queued-bad"]
+    stored = {m["machine_id"] for m in client.get("/api/machines").json()}
+    assert {"queued-retry-1", "queued-retry-2"} <= stored and "queued-bad" not in stored
+
+
+def test_report_accepts_gzip_body(monkeypatch):
+    import gzip
+    from config import settings
+
+    payload = {"machine_id": "gzip-1", "checks": [{"name": "antivirus", "status": "protected"}]}
+    body = gzip.compress(json.dumps(payload).encode())
+    headers = {"Content-Type": "application/json", "Content-Encoding": "gzip"}
+    r = client.post("/api/report", content=body, headers=headers)
+    assert r.status_code == 201
+    assert r.json()["machine_id"] == "gzip-1"
+
+    assert client.post("/api/report", content=b"not gzip", headers=headers).status_code == 400
+    monkeypatch.setattr(settings, "MAX_DECOMPRESSED_BODY_BYTES", 10)
+    assert client.post("/api/report", content=body, headers=headers).status_code == 413
+
+
+def test_batch_keeps_observed_at_for_late_reports():
+    payloads = [
+        {"machine_id": "late-1", "observed_at": f"2026-01-01T0{h}:00:00",
+         "checks": [{"name": "antivirus", "status": status}]}
+        for h, status in enumerate(["protected", "unprotected", "protected"])
+    ]
+    payloads.append({"machine_id": "late-1", "observed_at": "2999-01-01T00:00:00Z",
+                     "checks": [{"name": "firewall", "status": "enabled"}]})
+    r = client.post("/api/report/batch", json=payloads)
+    assert r.status_code == 201
+    machine_pk = r.json()["results"][0]["id"]
+
+    items = client.get(f"/api/machines/{machine_pk}/checks?check_name=antivirus").json()["items"]
+    assert [i["created_at"][:19] for i in items] == [
+        "2026-01-01T02:00:00", "2026-01-01T01:00:00", "2026-01-01T00:00:00"]
+    latest = {c["check_name"]: c for c in client.get(f"/api/machines/{machine_pk}").json()["checks"]}
+    assert latest["antivirus"]["status"] == "protected"
+    assert latest["firewall"]["created_at"] < "2999"  # future timestamps are clamped
+
+
+def test_delta_report_stores_only_changed_checks():
+    r = client.post("/api/report/delta", json={"machine_id": "delta-report-1", "checks": []})
+    assert r.status_code == 200 and r.json()["full_report_required"] is True
+
+    machine_pk = client.post("/api/report", json={
+        "machine_id": "delta-report-1", "hostname": "d1",
+        "checks": [{"name": "antivirus", "status": "protected", "details": {"duration_ms": 5}},
+                   {"name": "os_updates", "status": "up_to_date"}],
+    }).json()["id"]
+    before = client.get(f"/api/machines/{machine_pk}").json()["last_checkin"]
+
+    r = client.post("/api/report/delta", json={
+        "machine_id": "delta-report-1",
+        "checks": [{"name": "antivirus", "status": "protected", "details": {"duration_ms": 9}},
+                   {"name": "os_updates", "status": "outdated"}],
+    })
+    assert r.status_code == 200
+    body = r.json()
+    assert body["checks_stored"] == 1 and body["checks_unchanged"] == 1 and not body["full_report_required"]
+
+    # heartbeat: no rows, but last_checkin moves
+    assert client.post("/api/report/delta", json={"machine_id": "delta-report-1"}).json()["checks_stored"] == 0
+    m = client.get(f"/api/machines/{machine_pk}").json()
+    assert m["last_checkin"] > before and m["hostname"] == "d1"
+    assert {c["check_name"]: c["status"] for c in m["checks"]} == {"antivirus": "protected", "os_updates": "outdated"}
+    history = client.get(f"/api/machines/{machine_pk}/checks").json()["items"]
+    assert len(history) == 3
+
+
+def test_heartbeat_matches_state_hash():
+    assert client.post("/api/heartbeat", json={"machine_id": "hb-1", "state_hash": "a"}).json()[
+        "full_report_required"] is True
+
+    machine_pk = client.post("/api/report", json={
+        "machine_id": "hb-1", "state_hash": "a", "checks": [{"name": "antivirus", "status": "protected"}],
+    }).json()["id"]
+    before = client.get(f"/api/machines/{machine_pk}").json()["last_checkin"]
+
+    r = client.post("/api/heartbeat", json={"machine_id": "hb-1", "state_hash": "a"})
+    assert r.status_code == 200 and r.json()["full_report_required"] is False
+    assert client.get(f"/api/machines/{machine_pk}").json()["last_checkin"] > before
+
+    assert client.post("/api/heartbeat", json={"machine_id": "hb-1", "state_hash": "b"}).json()[
+        "full_report_required"] is True
+    client.post("/api/report/batch", json=[{"machine_id": "hb-1", "state_hash": "b", "checks": []}])
+    assert client.post("/api/heartbeat", json={"machine_id": "hb-1", "state_hash": "b"}).json()[
+        "full_report_required"] is False
+
+
+def test_add_missing_columns(tmp_path):
+    from sqlalchemy import create_engine, inspect, text
+    from database import add_missing_columns
+
+    old = create_engine(f"sqlite:///{tmp_path / 'old.db'}")
+    with old.begin() as conn:
+        conn.execute(text("CREATE TABLE machines (id INTEGER PRIMARY KEY, machine_id VARCHAR NOT NULL)"))
+    add_missing_columns(old)
+    assert "state_hash" in {c["name"] for c in inspect(old).get_columns("machines")}
+    add_missing_columns(old)  # idempotent
+
+
+def test_history_is_run_length_encoded():
+    def report(status, ts, duration):
+        return {"machine_id": "rle-1", "observed_at": ts,
+                "checks": [{"name": "antivirus", "status": status, "details": {"duration_ms": duration}}]}
+
+    machine_pk = client.post("/api/report", json=report("protected", "2026-02-01T00:00:00", 1)).json()["id"]
+    client.post("/api/report", json=report("protected", "2026-02-01T00:30:00", 2))
+    client.post("/api/report/batch", json=[
+        report("protected", "2026-02-01T01:00:00", 3),
+        report("unprotected", "2026-02-01T01:30:00", 4),
+        report("unprotected", "2026-02-01T02:00:00", 5),
+    ])
+    client.post("/api/report/delta", json=report("protected", "2026-02-01T02:30:00", 6))
+
+    items = client.get(f"/api/machines/{machine_pk}/checks").json()["items"]
+    assert [(i["status"], i["created_at"][11:16], i["last_seen"][11:16], i["repeat_count"]) for i in items] == [
+        ("protected", "02:30", "02:30", 1),
+        ("unprotected", "01:30", "02:00", 2),
+        ("protected", "00:00", "01:00", 3),
+    ]
+    # intervals overlapping the window, not just those starting in it
+    window = client.get(f"/api/machines/{machine_pk}/checks?since=2026-02-01T00:45:00&until=2026-02-01T01:15:00")
+    assert [(i["status"], i["repeat_count"]) for i in window.json()["items"]] == [("protected", 3)]
+
+    latest = client.get(f"/api/machines/{machine_pk}").json()["checks"][0]
+    assert latest["status"] == "protected" and latest["last_seen"][11:16] == "02:30"
+
+    rows = [json.loads(line) for line in client.get("/api/export?format=ndjson&scope=history").text.splitlines()]
+    rle = [r for r in rows if r["machine_id"] == "rle-1"]
+    assert [r["repeat_count"] for r in rle] == [3, 2, 1]
+
+
+def test_history_insert_without_ordered_returning(monkeypatch):
+    import database
+
+    # dialects such as MySQL cannot return ids from an executemany INSERT
+    monkeypatch.setattr(database.engine.dialect, "insert_executemany_returning_sort_by_parameter_order", False)
+    checks = [{"name": "antivirus", "status": "protected"}, {"name": "firewall", "status": "on"}]
+    machine_pk = client.post("/api/report", json={"machine_id": "no-returning-1", "checks": checks}).json()["id"]
+    client.post("/api/report/batch", json=[{"machine_id": "no-returning-1", "checks": [
+        {"name": "antivirus", "status": "unprotected"}, {"name": "firewall", "status": "on"}]}])
+
+    latest = client.get(f"/api/machines/{machine_pk}").json()["checks"]
+    items = client.get(f"/api/machines/{machine_pk}/checks").json()["items"]
+    assert [(c["check_name"], c["status"]) for c in latest] == [("antivirus", "unprotected"), ("firewall", "on")]
+    by_id = {i["id"]: (i["check_name"], i["status"], i["repeat_count"]) for i in items}
+    assert [by_id[c["id"]] for c in latest] == [("antivirus", "unprotected", 1), ("firewall", "on", 2)]
+
+
+def test_retention_rolls_up_and_deletes_old_history():
+    from datetime import datetime
+    from sqlalchemy import select
+    import database
+    import models
+    from services.retention import run_retention
+
+    def report(status, ts):
+        return {"machine_id": "retention-1", "observed_at": ts,
+                "checks": [{"name": "antivirus", "status": status}]}
+
+    machine_pk = client.post("/api/report", json=report("protected", "2025-01-01T00:00:00")).json()["id"]
+    client.post("/api/report/batch", json=[
+        report("protected", "2025-01-01T06:00:00"),
+        report("unprotected", "2025-01-02T00:00:00"),
+        report("protected", "2025-01-03T00:00:00"),
+        report("unprotected", "2025-01-04T00:00:00"),
+    ])
+
+    stats = run_retention(raw_days=30, rollup_days=0, batch_size=2, vacuum=True, now=datetime(2025, 3, 1))
+    assert stats["rows_deleted"] == 3 and stats["chunks"] == 2
+    assert stats["bytes_reclaimed"] == stats["bytes_before"] - stats["bytes_after"]
+
+    # the latest interval is kept, whatever its age
+    items = client.get(f"/api/machines/{machine_pk}/checks").json()["items"]
+    assert [(i["status"], i["created_at"][:10]) for i in items] == [("unprotected", "2025-01-04")]
+    assert client.get(f"/api/machines/{machine_pk}").json()["checks"][0]["status"] == "unprotected"
+
+    Rollup = models.machine.CheckDailyRollup
+    with database.SessionLocal() as db:
+        rollups = db.execute(
+            select(Rollup.day, Rollup.status, Rollup.intervals, Rollup.observations)
+            .where(Rollup.machine_id_fk == machine_pk).order_by(Rollup.day)
+        ).all()
+    assert [(str(d), s, i, o) for d, s, i, o in rollups] == [
+        ("2025-01-01", "protected", 1, 2),
+        ("2025-01-02", "unprotected", 1, 1),
+        ("2025-01-03", "protected", 1, 1),
+    ]
+
+    stats = run_retention(raw_days=30, rollup_days=60, batch_size=2, vacuum=False, now=datetime(2025, 3, 3))
+    assert stats["rows_deleted"] == 0 and stats["rollup_rows_deleted"] == 1
+
+
+def test_summary_counts_whole_fleet_and_invalidates_on_ingest():
+    before = client.get("/api/summary").json()
+    assert before["total"] == sum(before["by_staleness"].values())
+
+    client.post("/api/report", json={
+        "machine_id": "summary-1", "os_name": "Linux", "metadata": {"overall_status": "unhealthy"},
+        "checks": [{"name": "summary_probe", "status": "fail"}],
+    })
+    after = client.get("/api/summary").json()
+    assert after["total"] == before["total"] + 1
+    assert after["by_status"].get("unhealthy", 0) == before["by_status"].get("unhealthy", 0) + 1
+    assert after["by_os"]["Linux"] == before["by_os"].get("Linux", 0) + 1
+    assert after["by_staleness"]["1h"] == before["by_staleness"]["1h"] + 1
+    assert after["by_check"]["summary_probe"] == {"fail": 1}
+
+    client.post("/api/report/delta", json={
+        "machine_id": "summary-1", "checks": [{"name": "summary_probe", "status": "pass"}],
+    })
+    assert client.get("/api/summary").json()["by_check"]["summary_probe"] == {"pass": 1}
+
+
+def test_conditional_get_on_machine_reads():
+    machine_pk = client.post("/api/report", json={
+        "machine_id": "etag-1", "checks": [{"name": "antivirus", "status": "protected"}],
+    }).json()["id"]
+
+    detail = client.get(f"/api/machines/{machine_pk}")
+    listing = client.get("/api/machines")
+    etag, list_etag = detail.headers["etag"], listing.headers["etag"]
+    assert etag.startswith('W/"') and list_etag.startswith('W/"')
+
+    assert client.get(f"/api/machines/{machine_pk}", headers={"If-None-Match": etag}).status_code == 304
+    assert client.get("/api/machines", headers={"If-None-Match": f'"other", {list_etag}'}).status_code == 304
+    assert client.get("/api/machines/999999", headers={"If-None-Match": "*"}).status_code == 404
+
+    # reports and heartbeats (which move last_checkin) change both ETags
+    state_hash = "etag-hash"
+    client.post("/api/report", json={"machine_id": "etag-1", "state_hash": state_hash, "checks": []})
+    r = client.get(f"/api/machines/{machine_pk}", headers={"If-None-Match": etag})
+    assert r.status_code == 200 and r.headers["etag"] != etag
+    assert client.get("/api/machines", headers={"If-None-Match": list_etag}).status_code == 200
+    etag = r.headers["etag"]
+    list_etag = client.get("/api/machines").headers["etag"]
+    assert client.post("/api/heartbeat", json={"machine_id": "etag-1", "state_hash": state_hash}).json()[
+        "full_report_required"] is False
+    r = client.get(f"/api/machines/{machine_pk}", headers={"If-None-Match": etag})
+    assert r.status_code == 200 and r.json()["last_checkin"] != detail.json()["last_checkin"]
+    assert client.get("/api/machines", headers={"If-None-Match": list_etag}).status_code == 200
+    list_etag = client.get("/api/machines").headers["etag"]
+
+    # a report for any other machine moves the list ETag
+    client.post("/api/report/batch", json=[{"machine_id": "etag-2", "checks": []}])
+    assert client.get("/api/machines", headers={"If-None-Match": list_etag}).status_code == 200
+
+
+def test_ingest_publishes_change_events():
+    import asyncio
+    from services.events import EventBroadcaster, broadcaster, format_sse
+
+    async def scenario():
+        sub, backlog = broadcaster.subscribe()
+        assert backlog == []
+        report = {"machine_id": "events-1", "metadata": {"overall_status": "healthy"},
+                  "checks": [{"name": "antivirus", "status": "protected"}, {"name": "firewall", "status": "on"}]}
+        await asyncio.to_thread(client.post, "/api/report", json=report)
+        report["checks"][1]["status"] = "off"
+        await asyncio.to_thread(client.post, "/api/report/batch", json=[report])
+        events = [await asyncio.wait_for(sub.queue.get(), 5) for _ in range(2)]
+        broadcaster.unsubscribe(sub)
+        return events
+
+    first, second = asyncio.run(scenario())
+    assert first.type == "machine" and first.data["created"] is True
+    assert [c["check_name"] for c in first.data["checks"]] == ["antivirus", "firewall"]
+    assert [(c["check_name"], c["status"]) for c in second.data["checks"]] == [("firewall", "off")]
+    assert second.data["overall_status"] == "healthy" and second.data["created"] is False
+    assert format_sse(second).startswith(f"id: {second.id}\nevent: machine\ndata: {{")
+
+    # resume from Last-Event-ID, and resync when events were lost
+    async def resume(b, last_event_id):
+        sub, backlog = b.subscribe(last_event_id)
+        b.unsubscribe(sub)
+        return backlog
+
+    assert [e.id for e in asyncio.run(resume(broadcaster, first.id))][:1] == [second.id]
+    small = EventBroadcaster(history_size=2)
+    ids = [small.publish("machine", {"n": n}).id for n in range(4)]
+    assert [e.data["n"] for e in asyncio.run(resume(small, ids[1]))] == [2, 3]
+    assert [e.type for e in asyncio.run(resume(small, ids[0]))] == ["resync"]
+    assert [e.type for e in asyncio.run(resume(small, "other-3"))] == ["resync"]
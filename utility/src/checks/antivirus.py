@@ -1,8 +1,32 @@
 import platform
-import subprocess
 import os
 import re
+from .registry import register_check
+from utils import linux_probes, process_snapshot
+from utils.subprocess_runner import run_command
+from .av_signatures import signatures_for
 
+def _detect_products(system):
+    """Match the platform's AV signatures against this cycle's process snapshot."""
+    snapshot = process_snapshot.get()
+    found = []
+    for sig in signatures_for(system):
+        # products with a known binary only count when it is installed
+        if "binary" in sig and not linux_probes.which(sig["binary"]):
+            continue
+        running = False
+        if snapshot is not None:
+            if "image_prefix" in sig:
+                running = snapshot.has_image_prefix(sig["image_prefix"])
+            elif "cmdline" in sig:
+                running = snapshot.cmdline_contains(sig["cmdline"])
+        if running:
+            found.append({"name": sig["name"], "status": "running", "type": "third_party"})
+        elif "binary" in sig:
+            found.append({"name": sig["name"], "status": "installed", "type": "third_party"})
+    return found
+
+@register_check("antivirus")
 def check_antivirus():
     """Check antivirus presence and status on the system."""
     try:
@@ -13,11 +37,7 @@ def check_antivirus():
             
             # Check Windows Defender
             try:
-                result = subprocess.run(
-                    ["sc", "query", "WinDefend"], 
-                    capture_output=True, 
-                    text=True
-                )
+                result = run_command(["sc", "query", "WinDefend"])
                 if result.returncode == 0 and "RUNNING" in result.stdout:
                     antivirus_list.append({
                         "name": "Windows Defender",
@@ -33,32 +53,8 @@ def check_antivirus():
             except:
                 pass
             
-            # Check for other common antivirus software
-            common_av = [
-                ("McAfee", "mcafee"),
-                ("Norton", "norton"),
-                ("Kaspersky", "kaspersky"),
-                ("Avast", "avast"),
-                ("AVG", "avg"),
-                ("Bitdefender", "bitdefender"),
-                ("Malwarebytes", "malwarebytes")
-            ]
-            
-            for av_name, process_name in common_av:
-                try:
-                    result = subprocess.run(
-                        ["tasklist", "/FI", f"IMAGENAME eq {process_name}*"], 
-                        capture_output=True, 
-                        text=True
-                    )
-                    if result.returncode == 0 and process_name in result.stdout.lower():
-                        antivirus_list.append({
-                            "name": av_name,
-                            "status": "running",
-                            "type": "third_party"
-                        })
-                except:
-                    pass
+            # Check for other common antivirus software in the shared process snapshot
+            antivirus_list.extend(_detect_products(system))
             
             if antivirus_list:
                 return {
@@ -85,29 +81,7 @@ def check_antivirus():
             })
             
             # Check for common macOS antivirus software
-            common_av = [
-                ("Malwarebytes", "Malwarebytes"),
-                ("Avast", "Avast"),
-                ("AVG", "AVG"),
-                ("Bitdefender", "Bitdefender"),
-                ("Sophos", "Sophos")
-            ]
-            
-            for av_name, app_name in common_av:
-                try:
-                    result = subprocess.run(
-                        ["pgrep", "-f", app_name], 
-                        capture_output=True, 
-                        text=True
-                    )
-                    if result.returncode == 0 and result.stdout.strip():
-                        antivirus_list.append({
-                            "name": av_name,
-                            "status": "running",
-                            "type": "third_party"
-                        })
-                except:
-                    pass
+            antivirus_list.extend(_detect_products(system))
             
             return {
                 "status": "protected",
@@ -120,41 +94,9 @@ def check_antivirus():
         elif system == "Linux":
             antivirus_list = []
             
-            # Check for common Linux antivirus software
-            common_av = [
-                ("ClamAV", "clamscan"),
-                ("Sophos", "sav"),
-                ("Comodo", "comodo"),
-                ("F-Prot", "f-prot"),
-                ("Avast", "avast")
-            ]
-            
-            for av_name, command in common_av:
-                try:
-                    result = subprocess.run(
-                        ["which", command], 
-                        capture_output=True, 
-                        text=True
-                    )
-                    if result.returncode == 0 and result.stdout.strip():
-                        # Check if it's running
-                        try:
-                            running_check = subprocess.run(
-                                ["pgrep", "-f", command], 
-                                capture_output=True, 
-                                text=True
-                            )
-                            status = "running" if running_check.returncode == 0 else "installed"
-                        except:
-                            status = "installed"
-                        
-                        antivirus_list.append({
-                            "name": av_name,
-                            "status": status,
-                            "type": "third_party"
-                        })
-                except:
-                    pass
+            # Check for common Linux antivirus software: installed if its
+            # binary is on PATH, running if it shows up in the process snapshot
+            antivirus_list.extend(_detect_products(system))
             
             if antivirus_list:
                 return {
@@ -0,0 +1,39 @@
+"""Antivirus product signatures, matched against the shared process snapshot.
+
+Each entry names a product and how to recognise it on one platform:
+
+    image_prefix  process image name prefix, case-insensitive (Windows)
+    cmdline       literal substring of a process command line
+    binary        executable whose presence on PATH means "installed" (Linux);
+                  products with a binary are reported even when not running
+
+Adding a product is a new row here; it costs no extra process scans.
+"""
+
+AV_SIGNATURES = [
+    # Windows third-party products
+    {"name": "McAfee", "os": "Windows", "image_prefix": "mcafee"},
+    {"name": "Norton", "os": "Windows", "image_prefix": "norton"},
+    {"name": "Kaspersky", "os": "Windows", "image_prefix": "kaspersky"},
+    {"name": "Avast", "os": "Windows", "image_prefix": "avast"},
+    {"name": "AVG", "os": "Windows", "image_prefix": "avg"},
+    {"name": "Bitdefender", "os": "Windows", "image_prefix": "bitdefender"},
+    {"name": "Malwarebytes", "os": "Windows", "image_prefix": "malwarebytes"},
+
+    # macOS third-party products
+    {"name": "Malwarebytes", "os": "Darwin", "cmdline": "Malwarebytes"},
+    {"name": "Avast", "os": "Darwin", "cmdline": "Avast"},
+    {"name": "AVG", "os": "Darwin", "cmdline": "AVG"},
+    {"name": "Bitdefender", "os": "Darwin", "cmdline": "Bitdefender"},
+    {"name": "Sophos", "os": "Darwin", "cmdline": "Sophos"},
+
+    # Linux products
+    {"name": "ClamAV", "os": "Linux", "binary": "clamscan", "cmdline": "clamscan"},
+    {"name": "Sophos", "os": "Linux", "binary": "sav", "cmdline": "sav"},
+    {"name": "Comodo", "os": "Linux", "binary": "comodo", "cmdline": "comodo"},
+    {"name": "F-Prot", "os": "Linux", "binary": "f-prot", "cmdline": "f-prot"},
+    {"name": "Avast", "os": "Linux", "binary": "avast", "cmdline": "avast"},
+]
+
+def signatures_for(system):
+    return [sig for sig in AV_SIGNATURES if sig["os"] == system]
@@ -1,8 +1,11 @@
 import platform
-import subprocess
 import os
 import re
+from .registry import register_check
+from utils import linux_probes
+from utils.subprocess_runner import run_command
 
+@register_check("disk_encryption", interval_minutes=24 * 60)  # rarely changes
 def check_disk_encryption():
     """Check if disk encryption is enabled on the system."""
     try:
@@ -10,12 +13,7 @@ def check_disk_encryption():
         
         if system == "Windows":
             # Check BitLocker status
-            result = subprocess.run(
-                ["manage-bde", "-status", "C:"], 
-                capture_output=True, 
-                text=True, 
-                shell=True
-            )
+            result = run_command(["manage-bde", "-status", "C:"], shell=True)
             if result.returncode == 0:
                 # Look for encryption percentage
                 if "Percentage Encrypted" in result.stdout:
@@ -32,11 +30,7 @@ def check_disk_encryption():
                 
         elif system == "Darwin":  # macOS
             # Check FileVault status
-            result = subprocess.run(
-                ["fdesetup", "status"], 
-                capture_output=True, 
-                text=True
-            )
+            result = run_command(["fdesetup", "status"])
             if result.returncode == 0:
                 if "FileVault is On" in result.stdout:
                     return {"status": "encrypted", "details": {"encryption_type": "FileVault"}}
@@ -46,12 +40,18 @@ def check_disk_encryption():
                 return {"status": "unknown", "details": {"error": "Unable to check FileVault status"}}
                 
         elif system == "Linux":
-            # Check for LUKS/dm-crypt
-            result = subprocess.run(
-                ["lsblk", "-o", "NAME,TYPE,FSTYPE,MOUNTPOINT"], 
-                capture_output=True, 
-                text=True
-            )
+            # Active dm-crypt mappings straight from sysfs, no lsblk fork
+            devices = linux_probes.crypt_devices()
+            if devices is not None:
+                if devices:
+                    return {
+                        "status": "encrypted",
+                        "details": {"encryption_type": "LUKS/dm-crypt", "devices": devices}
+                    }
+                return {"status": "not_encrypted", "details": {"encryption_type": "LUKS/dm-crypt"}}
+            
+            # Fallback: check for LUKS/dm-crypt with lsblk
+            result = run_command(["lsblk", "-o", "NAME,TYPE,FSTYPE,MOUNTPOINT"])
             if result.returncode == 0:
                 # Look for crypt devices
                 lines = result.stdout.strip().split('\n')
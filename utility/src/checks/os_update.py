@@ -1,9 +1,13 @@
 import platform
-import subprocess
 import re
 import json
 from datetime import datetime
+from .registry import register_check
+from utils import linux_probes
+from utils.config import PACKAGE_MANAGER_TIMEOUT_SECONDS
+from utils.subprocess_runner import run_command
 
+@register_check("os_updates", interval_minutes=60)  # package manager scan
 def check_os_updates():
     """Check if the operating system is up to date."""
     try:
@@ -11,11 +15,7 @@ def check_os_updates():
         
         if system == "Windows":
             # Check Windows Update status
-            result = subprocess.run(
-                ["wmic", "qfe", "list", "brief", "/format:csv"], 
-                capture_output=True, 
-                text=True
-            )
+            result = run_command(["wmic", "qfe", "list", "brief", "/format:csv"], timeout=PACKAGE_MANAGER_TIMEOUT_SECONDS)
             if result.returncode == 0:
                 lines = result.stdout.strip().split('\n')
                 if len(lines) > 1:  # Has header + at least one update
@@ -60,11 +60,7 @@ def check_os_updates():
                 
         elif system == "Darwin":  # macOS
             # Check macOS software updates
-            result = subprocess.run(
-                ["softwareupdate", "-l"], 
-                capture_output=True, 
-                text=True
-            )
+            result = run_command(["softwareupdate", "-l"], timeout=PACKAGE_MANAGER_TIMEOUT_SECONDS)
             if result.returncode == 0:
                 if "No updates available" in result.stdout:
                     return {"status": "up_to_date", "details": {"message": "No updates available"}}
@@ -90,33 +86,37 @@ def check_os_updates():
                 return {"status": "unknown", "details": {"error": "Unable to check macOS updates"}}
                 
         elif system == "Linux":
+            # Debian/Ubuntu: read update-notifier's cached count instead of
+            # running apt; other distributions use the package managers below
+            pending = linux_probes.apt_pending_updates()
+            if pending is not None:
+                if pending == 0:
+                    return {"status": "up_to_date", "details": {"message": "No updates available"}}
+                return {
+                    "status": "updates_available",
+                    "details": {"count": pending, "source": "update-notifier"}
+                }
+            
             # Check for available package updates
             updates = []
             
             # Try apt (Debian/Ubuntu)
-            try:
-                result = subprocess.run(
-                    ["apt", "list", "--upgradable"], 
-                    capture_output=True, 
-                    text=True
-                )
-                if result.returncode == 0 and result.stdout.strip():
-                    lines = result.stdout.strip().split('\n')
-                    if len(lines) > 1:  # Has updates
-                        for line in lines[1:]:
-                            if line.strip():
-                                updates.append(line.strip())
-            except:
-                pass
+            if linux_probes.which("apt"):
+                try:
+                    result = run_command(["apt", "list", "--upgradable"], timeout=PACKAGE_MANAGER_TIMEOUT_SECONDS)
+                    if result.returncode == 0 and result.stdout.strip():
+                        lines = result.stdout.strip().split('\n')
+                        if len(lines) > 1:  # Has updates
+                            for line in lines[1:]:
+                                if line.strip():
+                                    updates.append(line.strip())
+                except:
+                    pass
             
             # Try yum (RHEL/CentOS)
-            if not updates:
+            if not updates and linux_probes.which("yum"):
                 try:
-                    result = subprocess.run(
-                        ["yum", "check-update", "--quiet"], 
-                        capture_output=True, 
-                        text=True
-                    )
+                    result = run_command(["yum", "check-update", "--quiet"], timeout=PACKAGE_MANAGER_TIMEOUT_SECONDS)
                     if result.returncode == 100:  # 100 means updates available
                         lines = result.stdout.strip().split('\n')
                         for line in lines:
@@ -126,13 +126,9 @@ def check_os_updates():
                     pass
             
             # Try pacman (Arch)
-            if not updates:
+            if not updates and linux_probes.which("pacman"):
                 try:
-                    result = subprocess.run(
-                        ["pacman", "-Qu"], 
-                        capture_output=True, 
-                        text=True
-                    )
+                    result = run_command(["pacman", "-Qu"], timeout=PACKAGE_MANAGER_TIMEOUT_SECONDS)
                     if result.returncode == 0 and result.stdout.strip():
                         lines = result.stdout.strip().split('\n')
                         for line in lines:
@@ -0,0 +1,84 @@
+import os
+import time
+from dataclasses import dataclass
+from typing import Callable, Dict, List, Optional
+
+@dataclass
+class CheckSpec:
+    """A registered check and its schedule.
+
+    interval_minutes: how often the check is re-run, i.e. how long its result
+        is reused (None = the agent's CHECK_INTERVAL_MINUTES).
+    """
+    name: str
+    func: Callable[[], dict]
+    interval_minutes: Optional[float] = None
+
+# Registered checks by report name, in registration (= report) order
+REGISTRY: Dict[str, CheckSpec] = {}
+
+def _env_minutes(name: str, default: Optional[float]) -> Optional[float]:
+    value = os.getenv(f"CHECK_{name.upper()}_INTERVAL_MINUTES")
+    return float(value) if value else default
+
+def register_check(name: str, interval_minutes: Optional[float] = None):
+    """Decorator registering a check function under its report name.
+
+    The interval can be overridden per check with the environment variable
+    CHECK_<NAME>_INTERVAL_MINUTES.
+    """
+    def decorator(func):
+        REGISTRY[name] = CheckSpec(
+            name=name,
+            func=func,
+            interval_minutes=_env_minutes(name, interval_minutes),
+        )
+        return func
+    return decorator
+
+def registered_checks() -> List[CheckSpec]:
+    return list(REGISTRY.values())
+
+class CheckCache:
+    """Last result per check, used to skip checks that are not due.
+
+    Results with status "error" or "timeout" are kept for at most the default
+    interval, so a failing daily check is retried on the next regular cycle.
+    """
+
+    RETRY_STATUSES = ("error", "timeout")
+
+    def __init__(self, default_interval_minutes: float, clock: Callable[[], float] = time.monotonic):
+        self.default_interval_minutes = default_interval_minutes
+        self._clock = clock
+        self._entries = {}  # name -> (result, ran_at)
+
+    def _max_age(self, spec: CheckSpec, result: dict) -> float:
+        max_age = spec.interval_minutes if spec.interval_minutes is not None else self.default_interval_minutes
+        if result.get("status") in self.RETRY_STATUSES:
+            max_age = min(max_age, self.default_interval_minutes)
+        return max_age * 60
+
+    def is_due(self, spec: CheckSpec) -> bool:
+        entry = self._entries.get(spec.name)
+        return entry is None or self._clock() - entry[1] >= self._max_age(spec, entry[0])
+
+    def get(self, name: str) -> Optional[dict]:
+        entry = self._entries.get(name)
+        return entry[0] if entry else None
+
+    def put(self, name: str, result: dict):
+        self._entries[name] = (result, self._clock())
+
+    def invalidate(self, name: str):
+        self._entries.pop(name, None)
+
+    def seconds_until_next_due(self, specs: List[CheckSpec]) -> float:
+        """Seconds until the earliest cached result expires (0 if any check is due now)."""
+        waits = []
+        for spec in specs:
+            entry = self._entries.get(spec.name)
+            if entry is None:
+                return 0.0
+            waits.append(self._max_age(spec, entry[0]) - (self._clock() - entry[1]))
+        return max(0.0, min(waits)) if waits else 0.0
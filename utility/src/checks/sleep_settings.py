@@ -1,8 +1,12 @@
+import os
 import platform
-import subprocess
 import re
 import json
+from .registry import register_check
+from utils import linux_probes
+from utils.subprocess_runner import run_command
 
+@register_check("inactivity_settings")
 def check_inactivity_settings():
     """Check sleep/inactivity settings to ensure they are ≤ 10 minutes."""
     try:
@@ -12,11 +16,7 @@ def check_inactivity_settings():
             # Check Windows power settings
             try:
                 # Get current power scheme
-                result = subprocess.run(
-                    ["powercfg", "/getactivescheme"], 
-                    capture_output=True, 
-                    text=True
-                )
+                result = run_command(["powercfg", "/getactivescheme"])
                 if result.returncode == 0:
                     # Extract GUID from output
                     match = re.search(r'Power Scheme GUID: ([a-f0-9\-]+)', result.stdout)
@@ -24,25 +24,13 @@ def check_inactivity_settings():
                         guid = match.group(1)
                         
                         # Check monitor timeout
-                        monitor_result = subprocess.run(
-                            ["powercfg", "/q", guid, "7516b95f-f776-4464-8c53-06167f40cc99", "ad9a0e66-8e09-4356-97a3-eb511a9dfa9f"], 
-                            capture_output=True, 
-                            text=True
-                        )
+                        monitor_result = run_command(["powercfg", "/q", guid, "7516b95f-f776-4464-8c53-06167f40cc99", "ad9a0e66-8e09-4356-97a3-eb511a9dfa9f"])
                         
                         # Check disk timeout
-                        disk_result = subprocess.run(
-                            ["powercfg", "/q", guid, "0012ee47-9041-4b5d-9b77-535fba8b1442", "0b2d69d7-a2a1-449c-9680-f91c70521c60"], 
-                            capture_output=True, 
-                            text=True
-                        )
+                        disk_result = run_command(["powercfg", "/q", guid, "0012ee47-9041-4b5d-9b77-535fba8b1442", "0b2d69d7-a2a1-449c-9680-f91c70521c60"])
                         
                         # Check sleep timeout
-                        sleep_result = subprocess.run(
-                            ["powercfg", "/q", guid, "0012ee47-9041-4b5d-9b77-535fba8b1442", "29f6c1db-86da-48c5-9fdb-f2b67b1f44da"], 
-                            capture_output=True, 
-                            text=True
-                        )
+                        sleep_result = run_command(["powercfg", "/q", guid, "0012ee47-9041-4b5d-9b77-535fba8b1442", "29f6c1db-86da-48c5-9fdb-f2b67b1f44da"])
                         
                         # Parse timeouts (convert from seconds to minutes)
                         timeouts = {}
@@ -100,11 +88,7 @@ def check_inactivity_settings():
         elif system == "Darwin":  # macOS
             try:
                 # Check macOS sleep settings
-                result = subprocess.run(
-                    ["pmset", "-g"], 
-                    capture_output=True, 
-                    text=True
-                )
+                result = run_command(["pmset", "-g"])
                 
                 if result.returncode == 0:
                     timeouts = {}
@@ -158,53 +142,59 @@ def check_inactivity_settings():
                 timeouts = {}
                 issues = []
                 
-                # Check systemd-logind settings
-                try:
-                    result = subprocess.run(
-                        ["systemctl", "show", "systemd-logind"], 
-                        capture_output=True, 
-                        text=True
-                    )
-                    if result.returncode == 0:
-                        for line in result.stdout.strip().split('\n'):
-                            if 'IdleAction=' in line:
-                                match = re.search(r'IdleAction=(\w+)', line)
-                                if match:
-                                    action = match.group(1)
-                                    if action == "suspend":
-                                        timeouts["idle_action"] = "suspend"
-                                    else:
-                                        timeouts["idle_action"] = action
+                # Check systemd-logind settings, read from logind.conf and its
+                # drop-ins; fall back to systemctl when none can be read
+                logind = linux_probes.logind_settings()
+                if logind is not None:
+                    if "IdleAction" in logind:
+                        timeouts["idle_action"] = logind["IdleAction"]
+                    if "IdleActionSec" in logind:
+                        seconds = linux_probes.parse_timespan(logind["IdleActionSec"])
+                        if seconds is not None:
+                            minutes = seconds // 60
+                            timeouts["idle_timeout"] = minutes
+                            if minutes > 10:
+                                issues.append(f"idle_timeout: {minutes} minutes")
+                else:
+                    try:
+                        result = run_command(["systemctl", "show", "systemd-logind"])
+                        if result.returncode == 0:
+                            for line in result.stdout.strip().split('\n'):
+                                if 'IdleAction=' in line:
+                                    match = re.search(r'IdleAction=(\w+)', line)
+                                    if match:
+                                        action = match.group(1)
+                                        if action == "suspend":
+                                            timeouts["idle_action"] = "suspend"
+                                        else:
+                                            timeouts["idle_action"] = action
                             
-                            elif 'IdleActionSec=' in line:
-                                match = re.search(r'IdleActionSec=(\d+)', line)
-                                if match:
-                                    seconds = int(match.group(1))
-                                    minutes = seconds // 60
-                                    timeouts["idle_timeout"] = minutes
-                                    if minutes > 10:
-                                        issues.append(f"idle_timeout: {minutes} minutes")
-                except:
-                    pass
+                                elif 'IdleActionSec=' in line:
+                                    match = re.search(r'IdleActionSec=(\d+)', line)
+                                    if match:
+                                        seconds = int(match.group(1))
+                                        minutes = seconds // 60
+                                        timeouts["idle_timeout"] = minutes
+                                        if minutes > 10:
+                                            issues.append(f"idle_timeout: {minutes} minutes")
+                    except:
+                        pass
                 
-                # Check X11 screen saver settings
-                try:
-                    result = subprocess.run(
-                        ["xset", "q"], 
-                        capture_output=True, 
-                        text=True
-                    )
-                    if result.returncode == 0:
-                        for line in result.stdout.strip().split('\n'):
-                            if 'timeout:' in line:
-                                match = re.search(r'timeout:\s+(\d+)', line)
-                                if match:
-                                    minutes = int(match.group(1))
-                                    timeouts["screen_saver"] = minutes
-                                    if minutes > 10:
-                                        issues.append(f"screen_saver: {minutes} minutes")
-                except:
-                    pass
+                # Check X11 screen saver settings (needs a display to query)
+                if os.environ.get("DISPLAY"):
+                    try:
+                        result = run_command(["xset", "q"])
+                        if result.returncode == 0:
+                            for line in result.stdout.strip().split('\n'):
+                                if 'timeout:' in line:
+                                    match = re.search(r'timeout:\s+(\d+)', line)
+                                    if match:
+                                        minutes = int(match.group(1))
+                                        timeouts["screen_saver"] = minutes
+                                        if minutes > 10:
+                                            issues.append(f"screen_saver: {minutes} minutes")
+                    except:
+                        pass
                 
                 if issues:
                     return {
@@ -2,19 +2,98 @@ import time
 import signal
 import sys
 from utils import system_checks, api_client, state_manager, logger, config
+from utils.outbox import Outbox
+from utils.watcher import start_watcher
 
 # Global flag for graceful shutdown
 running = True
+# File watcher in watch mode (None otherwise)
+watcher = None
 
 def signal_handler(signum, frame):
     """Handle shutdown signals gracefully."""
     global running
     logger.logger.info(f"Received signal {signum}, shutting down gracefully...")
     running = False
+    if watcher is not None:
+        watcher.stop()
+
+def _send_now(state, payload, delta):
+    """
+    Send one report immediately.
+    
+    Returns:
+        bool: True if the report was delivered
+    """
+    if not delta:
+        return api_client.send_report(state)
+    reply = api_client.send_delta_report(payload)
+    if reply is None:
+        return False
+    if reply.get("full_report_required"):
+        # The server has no baseline for this machine yet
+        logger.logger.info("Server requested a full report")
+        return api_client.send_report(state)
+    return True
+
+def deliver_report(state, outbox, last_state=None):
+    """
+    Send a report, falling back to the outbox when the backend is unreachable.
+    
+    In delta mode, and when a previous state is known, only the checks that
+    changed since ``last_state`` are sent; otherwise the full report is.
+    Reports already waiting in the outbox are uploaded first, so the backend
+    receives history in the order it was collected.
+    
+    The outbox only ever holds full reports: it may drop or dead-letter an
+    entry, and a lost delta would leave the server with a state that its
+    stored state hash claims is current.
+    
+    Returns:
+        str: "sent", "queued" (stored for a later attempt) or "failed"
+    """
+    try:
+        delta = config.REPORT_MODE == "delta" and last_state is not None
+        if delta:
+            payload = api_client.build_delta_payload(state, state_manager.changed_checks(state, last_state))
+        else:
+            payload = api_client.build_report_payload(state)
+        
+        if len(outbox) == 0:
+            if _send_now(state, payload, delta):
+                return "sent"
+            outbox.append(api_client.build_report_payload(state))
+            return "queued"
+        outbox.append(api_client.build_report_payload(state))
+        outbox.drain(api_client.send_report_batch)
+        return "sent" if len(outbox) == 0 else "queued"
+    except Exception as e:
+        logger.logger.error(f"Failed to queue report: {str(e)}")
+        return "failed"
+
+def send_heartbeat(state, outbox):
+    """
+    Tell the backend the machine is alive when nothing changed.
+    
+    If the backend's copy of this machine's state is stale (its state hash
+    differs), a full report is sent instead.
+    
+    Returns:
+        bool: True if the backend acknowledged it
+    """
+    try:
+        reply = api_client.send_heartbeat(state.get("machine_id"), state_manager.state_hash(state))
+        if reply is not None and reply.get("full_report_required"):
+            logger.logger.info("Server requested a full report")
+            return deliver_report(state, outbox) == "sent"
+        return reply is not None
+    except Exception as e:
+        logger.logger.error(f"Failed to send heartbeat: {str(e)}")
+        return False
 
 def main():
     """Main function for the system utility."""
-    global running
+    global running, watcher
     
     # Set up signal handlers for graceful shutdown
     signal.signal(signal.SIGINT, signal_handler)
@@ -22,6 +101,16 @@ def main():
     
     logger.logger.info("System Utility starting...")
     
+    # Cached check results; each check is re-run on its own schedule
+    check_cache = system_checks.new_check_cache()
+    
+    # Reports that could not be sent, kept on disk until the backend is back
+    outbox = Outbox()
+    
+    # Watch mode: wake up early for the checks whose files changed
+    if config.WATCH_MODE:
+        watcher = start_watcher([spec.name for spec in system_checks.registered_checks()])
+    
     # Test backend connection
     if not api_client.test_connection():
         logger.logger.warning("Backend connection test failed. Continuing anyway...")
@@ -29,18 +118,22 @@ def main():
     # Send initial report
     try:
         logger.logger.info("Collecting initial system information...")
-        initial_state = system_checks.collect_system_info()
+        initial_state = system_checks.collect_system_info(check_cache)
         
         if initial_state.get("overall_status") == "error":
             logger.logger.error("Failed to collect initial system information")
             return 1
         
         logger.logger.info("Sending initial report...")
-        if api_client.send_report(initial_state):
+        outcome = deliver_report(initial_state, outbox)
+        if outcome == "sent":
             logger.logger.info("Initial report sent successfully")
-            state_manager.save_state(initial_state)
+        elif outcome == "queued":
+            logger.logger.warning(f"Failed to send initial report; {len(outbox)} report(s) queued in outbox")
         else:
             logger.logger.warning("Failed to send initial report")
+        if outcome != "failed":
+            state_manager.save_state(initial_state)
     
     except Exception as e:
         logger.logger.error(f"Error during initialization: {str(e)}")
@@ -52,7 +145,7 @@ def main():
         while running:
             try:
                 # Collect current system information
-                current_state = system_checks.collect_system_info()
+                current_state = system_checks.collect_system_info(check_cache)
                 
                 if current_state.get("overall_status") == "error":
                     logger.logger.error("Failed to collect system information")
@@ -66,13 +159,22 @@ def main():
                 if state_manager.has_state_changed(current_state, last_state):
                     logger.logger.info("System state changes detected, sending report...")
                     
-                    if api_client.send_report(current_state):
+                    outcome = deliver_report(current_state, outbox, last_state)
+                    if outcome == "sent":
                         logger.logger.info("Report sent successfully")
-                        state_manager.save_state(current_state)
+                    elif outcome == "queued":
+                        logger.logger.warning(f"Failed to send report; {len(outbox)} report(s) queued in outbox")
                     else:
                         logger.logger.error("Failed to send report")
+                    # A queued report will be delivered later; don't queue the same state again
+                    if outcome != "failed":
+                        state_manager.save_state(current_state)
                 else:
                     logger.logger.debug("No system state changes detected")
+                    if len(outbox):
+                        outbox.drain(api_client.send_report_batch)
+                    else:
+                        send_heartbeat(current_state, outbox)
                 
                 # Log system health summary
                 overall_status = current_state.get("overall_status", "unknown")
@@ -85,9 +187,18 @@ def main():
                 else:
                     logger.logger.info(f"System health: {overall_status}")
                 
-                # Wait for next check
-                logger.logger.debug(f"Waiting {config.CHECK_INTERVAL_MINUTES} minutes until next check...")
-                time.sleep(config.CHECK_INTERVAL_MINUTES * 60)
+                # Wait until the next check is due (at most one base interval)
+                wait_seconds = min(
+                    config.CHECK_INTERVAL_MINUTES * 60,
+                    max(1.0, check_cache.seconds_until_next_due(system_checks.registered_checks())),
+                )
+                logger.logger.debug(f"Waiting {wait_seconds / 60:.1f} minutes until next check...")
+                if watcher is not None:
+                    for check_name in watcher.wait(wait_seconds):
+                        logger.logger.info(f"Watched files changed, re-running {check_name}")
+                        check_cache.invalidate(check_name)
+                else:
+                    time.sleep(wait_seconds)
                 
             except KeyboardInterrupt:
                 logger.logger.info("Interrupted by user")
@@ -97,6 +208,9 @@ def main():
                 time.sleep(config.CHECK_INTERVAL_MINUTES * 60)
     
     finally:
+        if watcher is not None:
+            watcher.stop()
+        outbox.close()
         logger.logger.info("System Utility stopped")
     
     return 0
@@ -1,23 +1,160 @@
 import requests
+import gzip
 import json
+import random
+import threading
 import time
-from typing import Dict, Any
-from .config import API_BASE_URL, API_ENDPOINT, API_TIMEOUT, MAX_RETRIES, RETRY_DELAY
+from email.utils import parsedate_to_datetime
+from datetime import datetime, timezone
+from typing import Dict, Any, List, Optional
+from requests.adapters import HTTPAdapter
+from .config import (
+    API_BASE_URL, API_ENDPOINT, API_BATCH_ENDPOINT, API_DELTA_ENDPOINT, API_HEARTBEAT_ENDPOINT,
+    API_TIMEOUT, MAX_RETRIES, RETRY_DELAY, RETRY_MAX_DELAY,
+    API_COMPRESS_MIN_BYTES
+)
 from .logger import logger
+from .state_manager import state_hash
 
-def send_report(data: Dict[str, Any]) -> bool:
+# Statuses worth retrying; any other 4xx means the request itself is wrong
+RETRYABLE_STATUSES = {408, 425, 429, 500, 502, 503, 504}
+# Statuses that reject the payload itself, so resending it can never succeed
+# (unlike e.g. 401/404, which point at configuration and may be fixed)
+PAYLOAD_REJECTED_STATUSES = {400, 413, 422}
+
+class RequestRejected(Exception):
+    """The backend permanently rejected a request body."""
+
+    def __init__(self, status_code: int):
+        super().__init__(f"Request rejected with status {status_code}")
+        self.status_code = status_code
+
+_session = None
+_session_lock = threading.Lock()
+
+def get_session() -> requests.Session:
     """
-    Send system health report to the backend API.
-    
+    Return the process-wide HTTP session.
+
+    The session keeps connections to the backend alive between reports, so a
+    report does not pay for a new TCP/TLS handshake. urllib3's own retries are
+    disabled; post_json() handles retries with backoff.
+    """
+    global _session
+    with _session_lock:
+        if _session is None:
+            session = requests.Session()
+            adapter = HTTPAdapter(pool_connections=1, pool_maxsize=4, max_retries=0)
+            session.mount("http://", adapter)
+            session.mount("https://", adapter)
+            session.headers.update({"Accept": "application/json", "Accept-Encoding": "gzip"})
+            _session = session
+        return _session
+
+def encode_body(payload: Any):
+    """
+    Serialize a JSON payload, gzip-compressing it when it is large enough.
+
+    Returns:
+        tuple: (body bytes, request headers)
+    """
+    body = json.dumps(payload, separators=(",", ":")).encode("utf-8")
+    headers = {"Content-Type": "application/json"}
+    if API_COMPRESS_MIN_BYTES and len(body) >= API_COMPRESS_MIN_BYTES:
+        body = gzip.compress(body, compresslevel=6)
+        headers["Content-Encoding"] = "gzip"
+    return body, headers
+
+def retry_after_seconds(response: requests.Response) -> Optional[float]:
+    """
+    Parse a Retry-After header given either as seconds or as an HTTP date.
+
+    Returns:
+        float: seconds to wait, or None if the header is missing or invalid
+    """
+    value = response.headers.get("Retry-After")
+    if not value:
+        return None
+    value = value.strip()
+    if value.isdigit():
+        return float(value)
+    try:
+        when = parsedate_to_datetime(value)
+    except (TypeError, ValueError):
+        return None
+    if when.tzinfo is None:
+        when = when.replace(tzinfo=timezone.utc)
+    return max(0.0, (when - datetime.now(timezone.utc)).total_seconds())
+
+def backoff_delay(attempt: int, retry_after: Optional[float] = None) -> float:
+    """
+    Seconds to wait before retry number ``attempt`` (0-based).
+
+    Uses exponential backoff with full jitter, so agents that failed together
+    do not retry together. A server-provided Retry-After is honored as the
+    minimum wait, plus jitter on top.
+    """
+    if retry_after is not None:
+        return min(RETRY_MAX_DELAY, retry_after) + random.uniform(0, RETRY_DELAY)
+    return random.uniform(0, min(RETRY_MAX_DELAY, RETRY_DELAY * (2 ** attempt)))
+
+def post_json(path: str, payload: Any, raise_rejected: bool = False) -> Optional[requests.Response]:
+    """
+    POST a JSON payload to the backend, retrying transient failures.
+
     Args:
-        data: Dictionary containing system health data
-        
+        path: API path appended to API_BASE_URL
+        payload: JSON-serializable request body
+        raise_rejected: raise RequestRejected instead of returning None when
+            the backend rejects the payload itself (PAYLOAD_REJECTED_STATUSES)
+
     Returns:
-        bool: True if successful, False otherwise
+        requests.Response: the successful (2xx) response, or None on failure
+    """
+    url = f"{API_BASE_URL}{path}"
+    body, headers = encode_body(payload)
+    session = get_session()
+
+    for attempt in range(MAX_RETRIES):
+        retry_after = None
+        try:
+            response = session.post(url, data=body, headers=headers, timeout=API_TIMEOUT)
+
+            if 200 <= response.status_code < 300:
+                logger.info(f"Request to {path} succeeded (attempt {attempt + 1})")
+                logger.debug(f"Response: {response.text}")
+                return response
+
+            logger.warning(f"API request failed with status {response.status_code} (attempt {attempt + 1})")
+            logger.debug(f"Response: {response.text}")
+            if response.status_code not in RETRYABLE_STATUSES:
+                if raise_rejected and response.status_code in PAYLOAD_REJECTED_STATUSES:
+                    raise RequestRejected(response.status_code)
+                return None
+            retry_after = retry_after_seconds(response)
+
+        except requests.exceptions.RequestException as e:
+            logger.error(f"Request failed (attempt {attempt + 1}): {str(e)}")
+
+        # Wait before retry (except on last attempt)
+        if attempt < MAX_RETRIES - 1:
+            delay = backoff_delay(attempt, retry_after)
+            logger.info(f"Retrying in {delay:.1f} seconds...")
+            time.sleep(delay)
+
+    logger.error(f"Request to {path} failed after {MAX_RETRIES} attempts")
+    return None
+
+def build_report_payload(data: Dict[str, Any]) -> Dict[str, Any]:
+    """
+    Convert collected system info into the backend's report schema.
+
+    Args:
+        data: Dictionary returned by collect_system_info()
+
+    Returns:
+        dict: Payload for POST /report
     """
-    url = f"{API_BASE_URL}{API_ENDPOINT}"
-    
-    # Prepare the payload according to the backend schema
     payload = {
         "machine_id": data.get("machine_id"),
         "hostname": data.get("system_info", {}).get("hostname"),
@@ -29,9 +166,12 @@ def send_report(data: Dict[str, Any]) -> bool:
             "overall_status": data.get("overall_status"),
             "issues": data.get("issues", [])
         },
-        "checks": []
+        "checks": [],
+        # collection time, so reports delivered late keep their place in history
+        "observed_at": data.get("timestamp"),
+        "state_hash": state_hash(data)
     }
-    
+
     # Convert checks to the expected format
     for check in data.get("checks", []):
         payload["checks"].append({
@@ -39,61 +179,123 @@ def send_report(data: Dict[str, Any]) -> bool:
             "status": check.get("status"),
             "details": check.get("details")
         })
-    
+
     # Add timestamp if not present
     if "timestamp" not in payload["metadata"]:
         payload["metadata"]["timestamp"] = data.get("timestamp")
-    
-    logger.logger.info(f"Sending report to {url}")
-    logger.logger.debug(f"Payload: {json.dumps(payload, indent=2)}")
-    
-    for attempt in range(MAX_RETRIES):
-        try:
-            response = requests.post(
-                url,
-                json=payload,
-                timeout=API_TIMEOUT,
-                headers={"Content-Type": "application/json"}
-            )
-            
-            if response.status_code in [200, 201]:
-                logger.logger.info(f"Report sent successfully (attempt {attempt + 1})")
-                logger.logger.debug(f"Response: {response.text}")
-                return True
-            else:
-                logger.logger.warning(
-                    f"API request failed with status {response.status_code} (attempt {attempt + 1})"
-                )
-                logger.logger.debug(f"Response: {response.text}")
-                
-        except requests.exceptions.RequestException as e:
-            logger.logger.error(f"Request failed (attempt {attempt + 1}): {str(e)}")
-        
-        # Wait before retry (except on last attempt)
-        if attempt < MAX_RETRIES - 1:
-            logger.logger.info(f"Retrying in {RETRY_DELAY} seconds...")
-            time.sleep(RETRY_DELAY)
-    
-    logger.logger.error(f"Failed to send report after {MAX_RETRIES} attempts")
-    return False
+
+    return payload
+
+def build_delta_payload(data: Dict[str, Any], check_names: List[str]) -> Dict[str, Any]:
+    """
+    Build a delta report carrying only the named checks.
+
+    Host fields are omitted (the server keeps its stored values); the
+    metadata is small and always sent so the overall status stays current.
+
+    Args:
+        data: Dictionary returned by collect_system_info()
+        check_names: Checks to include
+
+    Returns:
+        dict: Payload for POST /report/delta
+    """
+    full = build_report_payload(data)
+    wanted = set(check_names)
+    return {
+        "machine_id": full["machine_id"],
+        "metadata": full["metadata"],
+        "checks": [check for check in full["checks"] if check["name"] in wanted],
+        "observed_at": full["observed_at"],
+        "state_hash": full["state_hash"]
+    }
+
+def send_delta_report(payload: Dict[str, Any]) -> Optional[Dict[str, Any]]:
+    """
+    Send a delta report built with build_delta_payload().
+
+    Returns:
+        Optional[Dict]: The server's reply, or None if it could not be sent.
+            A reply with "full_report_required" means the server has no
+            baseline for this machine and a full report must follow.
+    """
+    logger.info(f"Sending delta report ({len(payload['checks'])} checks) to {API_BASE_URL}{API_DELTA_ENDPOINT}")
+    response = post_json(API_DELTA_ENDPOINT, payload)
+    if response is None:
+        return None
+    try:
+        return response.json()
+    except ValueError:
+        return {}
+
+def send_report(data: Dict[str, Any]) -> bool:
+    """
+    Send system health report to the backend API.
+
+    Args:
+        data: Dictionary containing system health data
+
+    Returns:
+        bool: True if successful, False otherwise
+    """
+    payload = build_report_payload(data)
+
+    logger.info(f"Sending report to {API_BASE_URL}{API_ENDPOINT}")
+    logger.debug(f"Payload: {json.dumps(payload, indent=2)}")
+
+    return post_json(API_ENDPOINT, payload) is not None
+
+def send_report_batch(payloads: List[Dict[str, Any]]) -> bool:
+    """
+    Send several report payloads, in order, in one request.
+
+    Args:
+        payloads: Payloads built with build_report_payload()
+
+    Returns:
+        bool: True if successful, False otherwise
+
+    Raises:
+        RequestRejected: the backend rejected the batch (e.g. 413 or 422);
+            sending it again unchanged will not succeed
+    """
+    logger.info(f"Sending batch of {len(payloads)} reports to {API_BASE_URL}{API_BATCH_ENDPOINT}")
+    return post_json(API_BATCH_ENDPOINT, payloads, raise_rejected=True) is not None
+
+def send_heartbeat(machine_id: str, current_hash: str) -> Optional[Dict[str, Any]]:
+    """
+    Report liveness without sending any check data.
+
+    Returns:
+        Optional[Dict]: The server's reply, or None if it could not be sent.
+            A reply with "full_report_required" means the server's copy of
+            this machine's state does not match ``current_hash``.
+    """
+    response = post_json(API_HEARTBEAT_ENDPOINT, {"machine_id": machine_id, "state_hash": current_hash})
+    if response is None:
+        return None
+    try:
+        return response.json()
+    except ValueError:
+        return {}
 
 def test_connection() -> bool:
     """
     Test the connection to the backend API.
-    
+
     Returns:
         bool: True if connection successful, False otherwise
     """
     url = f"{API_BASE_URL}/"
-    
+
     try:
-        response = requests.get(url, timeout=10)
+        response = get_session().get(url, timeout=10)
         if response.status_code == 200:
-            logger.logger.info("Backend connection test successful")
+            logger.info("Backend connection test successful")
             return True
         else:
-            logger.logger.warning(f"Backend connection test failed with status {response.status_code}")
+            logger.warning(f"Backend connection test failed with status {response.status_code}")
             return False
     except requests.exceptions.RequestException as e:
-        logger.logger.error(f"Backend connection test failed: {str(e)}")
+        logger.error(f"Backend connection test failed: {str(e)}")
         return False
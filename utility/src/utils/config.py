@@ -5,6 +5,12 @@ from typing import List
 API_BASE_URL = os.getenv("API_BASE_URL", "http://localhost:8001")
 API_ENDPOINT = os.getenv("API_ENDPOINT", "/api/v1/report")
 API_TIMEOUT = int(os.getenv("API_TIMEOUT", "30"))
+API_BATCH_ENDPOINT = os.getenv("API_BATCH_ENDPOINT", f"{API_ENDPOINT}/batch")
+API_DELTA_ENDPOINT = os.getenv("API_DELTA_ENDPOINT", f"{API_ENDPOINT}/delta")
+API_HEARTBEAT_ENDPOINT = os.getenv("API_HEARTBEAT_ENDPOINT", API_ENDPOINT.rsplit("/", 1)[0] + "/heartbeat")
+# "delta" sends only checks whose status or details changed; "full" always
+# sends every check. Cycles with no changes send a heartbeat either way.
+REPORT_MODE = os.getenv("REPORT_MODE", "delta")
 
 # Check intervals (in minutes)
 CHECK_INTERVAL_MINUTES = int(os.getenv("CHECK_INTERVAL_MINUTES", "30"))
@@ -17,6 +23,25 @@ if CHECK_INTERVAL_MINUTES < MIN_CHECK_INTERVAL:
 elif CHECK_INTERVAL_MINUTES > MAX_CHECK_INTERVAL:
     CHECK_INTERVAL_MINUTES = MAX_CHECK_INTERVAL
 
+# Check execution (seconds). Checks run in parallel; a check that misses its
+# own deadline, or is still running when the cycle deadline passes, is
+# reported with status "timeout".
+CHECK_TIMEOUT_SECONDS = float(os.getenv("CHECK_TIMEOUT_SECONDS", "60"))
+CYCLE_TIMEOUT_SECONDS = float(os.getenv("CYCLE_TIMEOUT_SECONDS", "120"))
+
+# Commands run by the checks (seconds / bytes). A command that overruns is
+# killed together with its process group and the check reports "timeout".
+# Package managers get longer, but still below CHECK_TIMEOUT_SECONDS.
+SUBPROCESS_TIMEOUT_SECONDS = float(os.getenv("SUBPROCESS_TIMEOUT_SECONDS", "15"))
+PACKAGE_MANAGER_TIMEOUT_SECONDS = float(os.getenv("PACKAGE_MANAGER_TIMEOUT_SECONDS", "45"))
+SUBPROCESS_MAX_OUTPUT_BYTES = int(os.getenv("SUBPROCESS_MAX_OUTPUT_BYTES", str(1024 * 1024)))
+
+# Watch mode: re-run a check as soon as the files behind it change (inotify on
+# Linux, stat polling elsewhere), in addition to the periodic sweep
+WATCH_MODE = os.getenv("WATCH_MODE", "false").lower() in ("1", "true", "yes")
+WATCH_DEBOUNCE_SECONDS = float(os.getenv("WATCH_DEBOUNCE_SECONDS", "2"))
+WATCH_POLL_SECONDS = float(os.getenv("WATCH_POLL_SECONDS", "10"))
+
 # Logging Configuration
 LOG_LEVEL = os.getenv("LOG_LEVEL", "INFO")
 LOG_FILE = os.getenv("LOG_FILE", "system_utility.log")
@@ -24,12 +49,28 @@ LOG_FORMAT = "%(asctime)s - %(name)s - %(levelname)s - %(message)s"
 
 # Retry Configuration
 MAX_RETRIES = int(os.getenv("MAX_RETRIES", "3"))
-RETRY_DELAY = int(os.getenv("RETRY_DELAY", "5"))  # seconds
+RETRY_DELAY = int(os.getenv("RETRY_DELAY", "5"))  # seconds, base of the exponential backoff
+RETRY_MAX_DELAY = int(os.getenv("RETRY_MAX_DELAY", "300"))  # seconds, cap on a single backoff
+# Report bodies at least this large are sent gzip-compressed (0 disables compression)
+API_COMPRESS_MIN_BYTES = int(os.getenv("API_COMPRESS_MIN_BYTES", "1024"))
 
 # System Information
 MACHINE_ID_FILE = "machine_id.txt"
 STATE_FILE = "last_state.json"
 
+# Outbox for reports that could not be sent (SQLite file next to STATE_FILE).
+# Oldest reports are dropped first once a cap is exceeded; queued reports are
+# uploaded in order, OUTBOX_BATCH_SIZE at a time, when the backend is reachable.
+OUTBOX_FILE = "outbox.db"
+OUTBOX_MAX_ITEMS = int(os.getenv("OUTBOX_MAX_ITEMS", "5000"))
+OUTBOX_MAX_BYTES = int(os.getenv("OUTBOX_MAX_BYTES", str(50 * 1024 * 1024)))
+OUTBOX_MAX_AGE_HOURS = float(os.getenv("OUTBOX_MAX_AGE_HOURS", str(14 * 24)))
+OUTBOX_BATCH_SIZE = int(os.getenv("OUTBOX_BATCH_SIZE", "100"))
+# Reports the backend rejects outright (400/413/422) are moved aside to a
+# dead-letter table, newest OUTBOX_DEAD_LETTER_MAX_ITEMS kept, so they cannot
+# block the reports queued behind them.
+OUTBOX_DEAD_LETTER_MAX_ITEMS = int(os.getenv("OUTBOX_DEAD_LETTER_MAX_ITEMS", "100"))
+
 # Health Check Thresholds
 DISK_ENCRYPTION_REQUIRED = True
 ANTIVIRUS_REQUIRED = True
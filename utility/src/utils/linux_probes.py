@@ -0,0 +1,159 @@
+"""Fork-free probes for the Linux checks.
+
+Each probe reads kernel or package-manager state straight from /proc, /sys
+or /var and returns None when that source is unavailable, in which case the
+calling check falls back to its subprocess-based implementation.
+"""
+import glob
+import os
+import re
+from functools import lru_cache
+from typing import Dict, List, Optional, Set
+
+PROC_DIR = "/proc"
+SYS_BLOCK_DIR = "/sys/block"
+LOGIND_CONF_FILE = "/etc/systemd/logind.conf"
+# lowest precedence first; a drop-in overrides one of the same name in an earlier directory
+LOGIND_DROPIN_DIRS = ["/usr/lib/systemd/logind.conf.d", "/run/systemd/logind.conf.d",
+                      "/etc/systemd/logind.conf.d"]
+# every file logind_settings() may read, as glob patterns (for the file watcher)
+LOGIND_CONF_FILES = [LOGIND_CONF_FILE] + [os.path.join(d, "*.conf") for d in LOGIND_DROPIN_DIRS]
+UPDATE_NOTIFIER_FILE = "/var/lib/update-notifier/updates-available"
+DPKG_STATUS_FILE = "/var/lib/dpkg/status"
+
+def _read(path: str) -> Optional[str]:
+    try:
+        with open(path, "rb") as f:
+            return f.read().decode("utf-8", "replace")
+    except OSError:
+        return None
+
+def process_table() -> Optional[List[Dict[str, str]]]:
+    """Name and full command line of every visible process, from /proc."""
+    if not os.path.isdir(PROC_DIR):
+        return None
+    processes = []
+    for pid in os.listdir(PROC_DIR):
+        if not pid.isdigit():
+            continue
+        comm = _read(os.path.join(PROC_DIR, pid, "comm"))
+        if comm is None:
+            continue  # exited while we were scanning
+        cmdline = _read(os.path.join(PROC_DIR, pid, "cmdline")) or ""
+        processes.append({"name": comm.strip(), "cmdline": cmdline.replace("\0", " ").strip()})
+    return processes
+
+@lru_cache(maxsize=4)
+def _path_executables(path_env: str) -> Set[str]:
+    names = set()
+    for directory in path_env.split(os.pathsep):
+        try:
+            entries = os.scandir(directory)
+        except OSError:
+            continue
+        with entries:
+            for entry in entries:
+                try:
+                    if entry.is_file() and os.access(entry.path, os.X_OK):
+                        names.add(entry.name)
+                except OSError:
+                    continue
+    return names
+
+def which(command: str) -> bool:
+    """Whether ``command`` is an executable on PATH; the PATH scan is cached until invalidate_path_cache()."""
+    return command in _path_executables(os.environ.get("PATH", os.defpath))
+
+def invalidate_path_cache():
+    """Forget the cached PATH scan, so software installed since is found."""
+    _path_executables.cache_clear()
+
+def crypt_devices() -> Optional[List[str]]:
+    """Active dm-crypt mappings, from /sys/block/*/dm/uuid ("CRYPT-<type>-...")."""
+    if not os.path.isdir(SYS_BLOCK_DIR):
+        return None
+    devices = []
+    for uuid_path in sorted(glob.glob(os.path.join(SYS_BLOCK_DIR, "*", "dm", "uuid"))):
+        uuid = (_read(uuid_path) or "").strip()
+        if not uuid.startswith("CRYPT-"):
+            continue
+        dm_dir = os.path.dirname(uuid_path)
+        name = (_read(os.path.join(dm_dir, "name")) or "").strip() or os.path.basename(os.path.dirname(dm_dir))
+        crypt_type = uuid.split("-")[1] if uuid.count("-") >= 2 else "CRYPT"
+        devices.append(f"{name} ({crypt_type})")
+    return devices
+
+_TIMESPAN_UNITS = {
+    "us": 1e-6, "ms": 1e-3, "s": 1, "sec": 1, "second": 1, "seconds": 1,
+    "m": 60, "min": 60, "minute": 60, "minutes": 60,
+    "h": 3600, "hr": 3600, "hour": 3600, "hours": 3600,
+    "d": 86400, "day": 86400, "days": 86400,
+}
+
+def parse_timespan(value: str) -> Optional[int]:
+    """Parse a systemd time span such as "900", "15min" or "1h 30min" into seconds."""
+    value = value.strip()
+    if value.isdigit():
+        return int(value)
+    parts = re.findall(r"(\d+(?:\.\d+)?)\s*([a-z]+)", value.lower())
+    if not parts or any(unit not in _TIMESPAN_UNITS for _, unit in parts):
+        return None
+    return int(sum(float(n) * _TIMESPAN_UNITS[unit] for n, unit in parts))
+
+def logind_conf_files() -> List[str]:
+    """logind.conf followed by its drop-ins, in the order systemd applies them.
+
+    Drop-ins are merged by file name across LOGIND_DROPIN_DIRS (a later
+    directory's file replaces an earlier one of the same name) and applied in
+    lexical order of that name, after the main file.
+    """
+    dropins = {}
+    for directory in LOGIND_DROPIN_DIRS:
+        for path in glob.glob(os.path.join(directory, "*.conf")):
+            dropins[os.path.basename(path)] = path
+    return [LOGIND_CONF_FILE] + [dropins[name] for name in sorted(dropins)]
+
+def logind_settings() -> Optional[Dict[str, str]]:
+    """Explicitly configured [Login] keys from logind.conf and its drop-ins.
+
+    Later files override earlier ones, matching systemd's precedence (see
+    logind_conf_files). Returns None when no configuration file could be read.
+    """
+    settings = {}
+    found = False
+    for path in logind_conf_files():
+        text = _read(path)
+        if text is None:
+            continue
+        found = True
+        section = None
+        for line in text.splitlines():
+            line = line.strip()
+            if not line or line[0] in "#;":
+                continue
+            if line.startswith("[") and line.endswith("]"):
+                section = line[1:-1]
+            elif section == "Login" and "=" in line:
+                key, _, val = line.partition("=")
+                settings[key.strip()] = val.strip()
+    return settings if found else None
+
+def apt_pending_updates() -> Optional[int]:
+    """Pending update count from update-notifier's cache (Debian/Ubuntu).
+
+    Returns None if the cache is missing or older than the dpkg database,
+    since packages may have been upgraded since it was written.
+    """
+    try:
+        if os.path.getmtime(UPDATE_NOTIFIER_FILE) < os.path.getmtime(DPKG_STATUS_FILE):
+            return None
+    except OSError:
+        return None
+    text = _read(UPDATE_NOTIFIER_FILE)
+    if text is None:
+        return None
+    match = re.search(r"(\d+)\s+(?:updates?|packages?)\s+can be", text)
+    if match:
+        return int(match.group(1))
+    # An empty cache, or one listing only ESM/security notices, means nothing pending
+    return 0
@@ -0,0 +1,161 @@
+"""Durable queue of reports that could not be delivered.
+
+Reports are appended to a small SQLite database next to STATE_FILE and
+uploaded in their original order, in batches through the backend's batch
+endpoint, once it is reachable again. Size, count and age caps drop the
+oldest reports first, so a machine that stays offline for a long time keeps
+its most recent history without filling the disk. A report the backend
+rejects outright is moved to a dead-letter table rather than blocking the
+queue behind it.
+"""
+import json
+import os
+import sqlite3
+import threading
+import time
+from typing import Any, Callable, Dict, List, Optional, Tuple
+
+from .api_client import RequestRejected
+from .config import (
+    OUTBOX_FILE, OUTBOX_MAX_ITEMS, OUTBOX_MAX_BYTES, OUTBOX_MAX_AGE_HOURS, OUTBOX_BATCH_SIZE,
+    OUTBOX_DEAD_LETTER_MAX_ITEMS
+)
+from .logger import logger
+
+def default_path() -> str:
+    """Outbox location: the directory that holds STATE_FILE."""
+    script_dir = os.path.dirname(os.path.abspath(__file__))
+    return os.path.join(script_dir, '..', OUTBOX_FILE)
+
+class Outbox:
+    def __init__(self, path: Optional[str] = None, max_items: int = OUTBOX_MAX_ITEMS,
+                 max_bytes: int = OUTBOX_MAX_BYTES, max_age_hours: float = OUTBOX_MAX_AGE_HOURS,
+                 clock: Callable[[], float] = time.time,
+                 dead_letter_max_items: int = OUTBOX_DEAD_LETTER_MAX_ITEMS):
+        self.path = path or default_path()
+        self.max_items = max_items
+        self.dead_letter_max_items = dead_letter_max_items
+        self.max_bytes = max_bytes
+        self.max_age_seconds = max_age_hours * 3600
+        self._clock = clock
+        self._lock = threading.Lock()
+        self._conn = sqlite3.connect(self.path, check_same_thread=False, isolation_level=None)
+        self._conn.execute("PRAGMA journal_mode=WAL")
+        self._conn.execute(
+            "CREATE TABLE IF NOT EXISTS outbox ("
+            " id INTEGER PRIMARY KEY AUTOINCREMENT,"
+            " created_at REAL NOT NULL,"
+            " size INTEGER NOT NULL,"
+            " payload TEXT NOT NULL)"
+        )
+        self._conn.execute(
+            "CREATE TABLE IF NOT EXISTS dead_letter ("
+            " id INTEGER PRIMARY KEY,"
+            " created_at REAL NOT NULL,"
+            " rejected_at REAL NOT NULL,"
+            " status INTEGER NOT NULL,"
+            " payload TEXT NOT NULL)"
+        )
+
+    def __len__(self):
+        with self._lock:
+            return self._conn.execute("SELECT COUNT(*) FROM outbox").fetchone()[0]
+
+    def close(self):
+        with self._lock:
+            self._conn.close()
+
+    def append(self, payload: Dict[str, Any]):
+        """Queue one report payload, then enforce the caps."""
+        body = json.dumps(payload, separators=(",", ":"))
+        with self._lock:
+            self._conn.execute(
+                "INSERT INTO outbox (created_at, size, payload) VALUES (?, ?, ?)",
+                (self._clock(), len(body), body),
+            )
+            dropped = self._enforce_caps()
+        if dropped:
+            logger.warning(f"Outbox full: dropped {dropped} oldest queued report(s)")
+
+    def _enforce_caps(self) -> int:
+        before = self._conn.total_changes
+        self._conn.execute("DELETE FROM outbox WHERE created_at < ?", (self._clock() - self.max_age_seconds,))
+        # keep the newest reports that fit within both the count and byte caps
+        self._conn.execute(
+            "DELETE FROM outbox WHERE id IN ("
+            " SELECT id FROM ("
+            "  SELECT id, ROW_NUMBER() OVER w AS n, SUM(size) OVER w AS total"
+            "  FROM outbox WINDOW w AS (ORDER BY id DESC)"
+            " ) WHERE n > ? OR total > ?)",
+            (self.max_items, self.max_bytes),
+        )
+        return self._conn.total_changes - before
+
+    def peek(self, limit: int) -> List[Tuple[int, Dict[str, Any]]]:
+        """The oldest ``limit`` queued reports as (id, payload) pairs."""
+        with self._lock:
+            rows = self._conn.execute("SELECT id, payload FROM outbox ORDER BY id LIMIT ?", (limit,)).fetchall()
+        return [(row_id, json.loads(body)) for row_id, body in rows]
+
+    def ack(self, last_id: int):
+        """Remove every queued report up to and including ``last_id``."""
+        with self._lock:
+            self._conn.execute("DELETE FROM outbox WHERE id <= ?", (last_id,))
+
+    def dead_letter(self, row_id: int, status: int):
+        """Move one queued report to the dead-letter table, keeping the newest entries."""
+        with self._lock:
+            self._conn.execute("BEGIN")
+            self._conn.execute(
+                "INSERT INTO dead_letter (id, created_at, rejected_at, status, payload)"
+                " SELECT id, created_at, ?, ?, payload FROM outbox WHERE id = ?",
+                (self._clock(), status, row_id),
+            )
+            self._conn.execute("DELETE FROM outbox WHERE id = ?", (row_id,))
+            self._conn.execute(
+                "DELETE FROM dead_letter WHERE id NOT IN"
+                " (SELECT id FROM dead_letter ORDER BY id DESC LIMIT ?)",
+                (self.dead_letter_max_items,),
+            )
+            self._conn.execute("COMMIT")
+
+    def dead_letters(self) -> List[Tuple[int, Dict[str, Any]]]:
+        """Rejected reports, oldest first, as (HTTP status, payload) pairs."""
+        with self._lock:
+            rows = self._conn.execute("SELECT status, payload FROM dead_letter ORDER BY id").fetchall()
+        return [(status, json.loads(body)) for status, body in rows]
+
+    def drain(self, send_batch: Callable[[List[Dict[str, Any]]], bool], batch_size: int = OUTBOX_BATCH_SIZE) -> int:
+        """
+        Upload queued reports oldest first, ``batch_size`` per request.
+
+        Stops at the first batch that fails; that batch stays queued and is
+        retried on the next drain. A batch the backend rejects outright
+        (``send_batch`` raises RequestRejected) is halved until the rejected
+        report is alone; that report is dead-lettered and draining goes on.
+
+        Returns:
+            int: number of reports delivered
+        """
+        sent = 0
+        size = batch_size
+        while True:
+            rows = self.peek(size)
+            if not rows:
+                return sent
+            try:
+                ok = send_batch([payload for _, payload in rows])
+            except RequestRejected as e:
+                if len(rows) > 1:
+                    size = max(1, len(rows) // 2)
+                    continue
+                logger.error(f"Backend rejected a queued report (status {e.status_code}); moved to dead letters")
+                self.dead_letter(rows[0][0], e.status_code)
+                size = batch_size
+                continue
+            if not ok:
+                logger.warning(f"Outbox drain stopped; {len(self)} report(s) still queued")
+                return sent
+            self.ack(rows[-1][0])
+            sent += len(rows)
+            logger.info(f"Delivered {len(rows)} queued report(s) from the outbox")
@@ -0,0 +1,120 @@
+"""One process-table scan per agent cycle, shared by every check.
+
+collect_system_info() calls invalidate() at the start of each cycle; the
+first check that asks for the snapshot takes it and the others reuse it.
+"""
+import bisect
+import os
+import platform
+import threading
+from typing import Dict, List, Optional
+
+try:
+    import psutil
+except ImportError:  # psutil is optional; fall back to /proc, ps or tasklist
+    psutil = None
+
+from . import linux_probes
+from .subprocess_runner import run_command
+
+class ProcessSnapshot:
+    """Process table indexed by image name and searchable by command line."""
+
+    def __init__(self, processes: List[Dict[str, str]]):
+        self.processes = processes
+        self._by_name: Dict[str, List[Dict[str, str]]] = {}
+        for proc in processes:
+            self._by_name.setdefault(proc["name"].lower(), []).append(proc)
+        self._sorted_names = sorted(self._by_name)
+        # one blob so each substring lookup is a single C-level scan
+        self._cmdlines = "\n".join(p["cmdline"] or p["name"] for p in processes)
+        self._cmdlines_lower = self._cmdlines.lower()
+
+    def __len__(self):
+        return len(self.processes)
+
+    def has_image(self, name: str) -> bool:
+        return name.lower() in self._by_name
+
+    def has_image_prefix(self, prefix: str) -> bool:
+        """Like ``tasklist /FI "IMAGENAME eq prefix*"``, case-insensitive."""
+        prefix = prefix.lower()
+        i = bisect.bisect_left(self._sorted_names, prefix)
+        return i < len(self._sorted_names) and self._sorted_names[i].startswith(prefix)
+
+    def cmdline_contains(self, pattern: str, case_sensitive: bool = True) -> bool:
+        """Like ``pgrep -f pattern`` for a literal pattern."""
+        if case_sensitive:
+            return pattern in self._cmdlines
+        return pattern.lower() in self._cmdlines_lower
+
+def _scan_psutil() -> Optional[List[Dict[str, str]]]:
+    processes = []
+    for proc in psutil.process_iter(["name", "cmdline"]):
+        info = proc.info
+        processes.append({
+            "name": info.get("name") or "",
+            "cmdline": " ".join(info.get("cmdline") or []),
+        })
+    return processes
+
+def _scan_tasklist() -> Optional[List[Dict[str, str]]]:
+    result = run_command(["tasklist", "/FO", "CSV", "/NH"])
+    if result.returncode != 0:
+        return None
+    processes = []
+    for line in result.stdout.splitlines():
+        if line.startswith('"'):
+            name = line.split('","', 1)[0].strip('"')
+            processes.append({"name": name, "cmdline": name})
+    return processes
+
+def _scan_ps() -> Optional[List[Dict[str, str]]]:
+    result = run_command(["ps", "-axww", "-o", "args="])
+    if result.returncode != 0:
+        return None
+    processes = []
+    for line in result.stdout.splitlines():
+        args = line.strip()
+        if args:
+            processes.append({"name": os.path.basename(args.split(" ", 1)[0]), "cmdline": args})
+    return processes
+
+def take_snapshot() -> Optional[ProcessSnapshot]:
+    """Scan the process table once; None if no scanning method works."""
+    scanners = []
+    if psutil is not None:
+        scanners.append(_scan_psutil)
+    system = platform.system()
+    if system == "Linux":
+        scanners.append(linux_probes.process_table)
+    scanners.append(_scan_tasklist if system == "Windows" else _scan_ps)
+
+    for scan in scanners:
+        try:
+            processes = scan()
+        except Exception:
+            continue
+        if processes is not None:
+            return ProcessSnapshot(processes)
+    return None
+
+_lock = threading.Lock()
+_current: Optional[ProcessSnapshot] = None
+_taken = False
+
+def invalidate():
+    """Drop the current snapshot; the next get() takes a fresh one."""
+    global _current, _taken
+    with _lock:
+        _current = None
+        _taken = False
+
+def get() -> Optional[ProcessSnapshot]:
+    """The snapshot for the current cycle, taken on first use."""
+    global _current, _taken
+    with _lock:
+        if not _taken:
+            _current = take_snapshot()
+            _taken = True
+        return _current
@@ -1,9 +1,37 @@
+import hashlib
 import json
 import os
-from typing import Dict, Any, Optional
+from typing import Dict, Any, List, Optional
 from .config import STATE_FILE
 from .logger import logger
 
+# Detail keys that differ on every run and do not mean the check result changed
+VOLATILE_DETAIL_KEYS = ("duration_ms",)
+
+def check_hash(check: Dict[str, Any]) -> str:
+    """
+    Hash a check's status and details, ignoring volatile detail keys.
+    
+    Args:
+        check: Check result with "status" and "details"
+        
+    Returns:
+        str: Hex digest that changes only when the result meaningfully changes
+    """
+    details = {k: v for k, v in (check.get("details") or {}).items() if k not in VOLATILE_DETAIL_KEYS}
+    canonical = json.dumps([check.get("status"), details], sort_keys=True, separators=(",", ":"), default=str)
+    return hashlib.sha256(canonical.encode("utf-8")).hexdigest()
+
+def state_hash(state: Dict[str, Any]) -> str:
+    """
+    Hash the whole check state (every check's name and check_hash).
+    
+    The server stores the hash sent with each report, and heartbeats carrying
+    the same hash confirm that its copy of this machine's state is current.
+    """
+    entries = sorted((check.get("name") or "", check_hash(check)) for check in state.get("checks", []))
+    return hashlib.sha256(json.dumps(entries, separators=(",", ":")).encode("utf-8")).hexdigest()
+
 def save_state(data: Dict[str, Any]) -> bool:
     """
     Save the current system state to a file.
@@ -30,17 +58,18 @@ def save_state(data: Dict[str, Any]) -> bool:
         for check in data.get("checks", []):
             state_to_save["checks"].append({
                 "name": check.get("name"),
-                "status": check.get("status")
+                "status": check.get("status"),
+                "hash": check_hash(check)
             })
         
         with open(state_file_path, 'w') as f:
             json.dump(state_to_save, f, indent=2)
         
-        logger.logger.debug(f"State saved to {state_file_path}")
+        logger.debug(f"State saved to {state_file_path}")
         return True
         
     except Exception as e:
-        logger.logger.error(f"Failed to save state: {str(e)}")
+        logger.error(f"Failed to save state: {str(e)}")
         return False
 
 def load_last_state() -> Optional[Dict[str, Any]]:
@@ -55,17 +84,17 @@ def load_last_state() -> Optional[Dict[str, Any]]:
         state_file_path = os.path.join(script_dir, '..', STATE_FILE)
         
         if not os.path.exists(state_file_path):
-            logger.logger.debug("No previous state file found")
+            logger.debug("No previous state file found")
             return None
         
         with open(state_file_path, 'r') as f:
             state = json.load(f)
         
-        logger.logger.debug(f"State loaded from {state_file_path}")
+        logger.debug(f"State loaded from {state_file_path}")
         return state
         
     except Exception as e:
-        logger.logger.error(f"Failed to load state: {str(e)}")
+        logger.error(f"Failed to load state: {str(e)}")
         return None
 
 def has_state_changed(current_state: Dict[str, Any], last_state: Optional[Dict[str, Any]]) -> bool:
@@ -80,38 +109,61 @@ def has_state_changed(current_state: Dict[str, Any], last_state: Optional[Dict[s
         bool: True if state has changed, False otherwise
     """
     if last_state is None:
-        logger.logger.debug("No previous state to compare with")
+        logger.debug("No previous state to compare with")
         return True
     
     try:
         # Compare overall status
         if current_state.get("overall_status") != last_state.get("overall_status"):
-            logger.logger.debug("Overall status changed")
+            logger.debug("Overall status changed")
             return True
         
         # Compare individual checks
-        current_checks = {check["name"]: check["status"] for check in current_state.get("checks", [])}
-        last_checks = {check["name"]: check["status"] for check in last_state.get("checks", [])}
-        
-        # Check if any check statuses have changed
-        for check_name, current_status in current_checks.items():
-            if check_name not in last_checks:
-                logger.logger.debug(f"New check found: {check_name}")
-                return True
-            if last_checks[check_name] != current_status:
-                logger.logger.debug(f"Check status changed for {check_name}: {last_checks[check_name]} -> {current_status}")
-                return True
+        if changed_checks(current_state, last_state):
+            return True
         
         # Check if any checks were removed
-        for check_name in last_checks:
-            if check_name not in current_checks:
-                logger.logger.debug(f"Check removed: {check_name}")
+        current_names = {check["name"] for check in current_state.get("checks", [])}
+        for check in last_state.get("checks", []):
+            if check["name"] not in current_names:
+                logger.debug(f"Check removed: {check['name']}")
                 return True
         
-        logger.logger.debug("No meaningful changes detected")
+        logger.debug("No meaningful changes detected")
         return False
         
     except Exception as e:
-        logger.logger.error(f"Error comparing states: {str(e)}")
+        logger.error(f"Error comparing states: {str(e)}")
         # If we can't compare, assume there's a change to be safe
         return True
+
+def changed_checks(current_state: Dict[str, Any], last_state: Optional[Dict[str, Any]]) -> List[str]:
+    """
+    Names of checks that are new or whose status or details hash changed.
+    
+    Args:
+        current_state: Current system state (from collect_system_info)
+        last_state: Previous saved state, as returned by load_last_state
+        
+    Returns:
+        List[str]: Changed check names, in report order (all checks if there is no last state)
+    """
+    current_checks = current_state.get("checks", [])
+    if last_state is None:
+        return [check["name"] for check in current_checks]
+    
+    last_checks = {check["name"]: check for check in last_state.get("checks", [])}
+    changed = []
+    for check in current_checks:
+        last = last_checks.get(check["name"])
+        if last is None:
+            logger.debug(f"New check found: {check['name']}")
+            changed.append(check["name"])
+        elif last.get("status") != check.get("status"):
+            logger.debug(f"Check status changed for {check['name']}: {last.get('status')} -> {check.get('status')}")
+            changed.append(check["name"])
+        elif "hash" in last and last["hash"] != check_hash(check):
+            # state files written before hashes were recorded compare by status only
+            logger.debug(f"Check details changed for {check['name']}")
+            changed.append(check["name"])
+    return changed
@@ -0,0 +1,151 @@
+"""Bounded subprocess execution for the checks.
+
+Every command gets a hard timeout, runs in its own process group so that a
+timeout kills the whole tree (shells, helpers), and has its captured output
+capped. Per-command timing is kept in module-level metrics.
+
+Timeouts are also recorded for the calling thread while a ``track()`` block
+is active, which lets the check runner report a check as "timeout" even
+when the check itself swallowed the error.
+"""
+import os
+import signal
+import subprocess
+import threading
+import time
+from contextlib import contextmanager
+from dataclasses import dataclass
+from typing import Optional, Sequence, Union
+
+from .config import SUBPROCESS_TIMEOUT_SECONDS, SUBPROCESS_MAX_OUTPUT_BYTES
+
+# Seconds between the polite terminate and the hard kill
+KILL_GRACE_SECONDS = 2
+
+class CommandTimeout(subprocess.TimeoutExpired):
+    """Raised when a command exceeds its timeout; the process group has been killed."""
+
+@dataclass
+class CommandResult:
+    args: Union[str, Sequence[str]]
+    returncode: int
+    stdout: str
+    stderr: str
+    duration: float  # seconds
+    truncated: bool = False
+
+_local = threading.local()
+_metrics_lock = threading.Lock()
+_metrics = {}
+
+def _command_name(args) -> str:
+    if isinstance(args, str):
+        return args.split(" ", 1)[0]
+    return os.path.basename(str(args[0])) if args else ""
+
+def _record(args, duration: float, timed_out: bool):
+    name = _command_name(args)
+    with _metrics_lock:
+        m = _metrics.setdefault(name, {"calls": 0, "timeouts": 0, "total_ms": 0.0, "max_ms": 0.0})
+        m["calls"] += 1
+        m["timeouts"] += int(timed_out)
+        m["total_ms"] += duration * 1000
+        m["max_ms"] = max(m["max_ms"], duration * 1000)
+    if timed_out and getattr(_local, "timeouts", None) is not None:
+        _local.timeouts.append(name)
+
+def metrics() -> dict:
+    """Per-command call counts, timeouts and wall time (ms) since startup."""
+    with _metrics_lock:
+        return {name: dict(m) for name, m in _metrics.items()}
+
+@contextmanager
+def track():
+    """Collect the names of commands that time out on this thread."""
+    previous = getattr(_local, "timeouts", None)
+    _local.timeouts = []
+    try:
+        yield _local.timeouts
+    finally:
+        _local.timeouts = previous
+
+def _drain(stream, limit: int, sink: list, overflow: list):
+    """Read a pipe to EOF, keeping at most ``limit`` bytes."""
+    kept = 0
+    for chunk in iter(lambda: stream.read(65536), b""):
+        room = limit - kept
+        if room > 0:
+            sink.append(chunk[:room])
+            kept += len(sink[-1])
+        if len(chunk) > room:
+            overflow.append(True)  # keep reading so the child never blocks on a full pipe
+    stream.close()
+
+def _kill_tree(proc: subprocess.Popen):
+    if os.name == "nt":
+        subprocess.run(["taskkill", "/T", "/F", "/PID", str(proc.pid)], capture_output=True)
+        return
+    try:
+        os.killpg(proc.pid, signal.SIGTERM)
+    except ProcessLookupError:
+        return
+    try:
+        proc.wait(KILL_GRACE_SECONDS)
+    except subprocess.TimeoutExpired:
+        pass
+    # the leader exiting says nothing about the rest of the group (e.g. an
+    # apt/yum child that ignores SIGTERM), so always finish with SIGKILL
+    try:
+        os.killpg(proc.pid, signal.SIGKILL)
+    except ProcessLookupError:
+        pass
+
+def run_command(args, timeout: Optional[float] = None, max_output: Optional[int] = None,
+                shell: bool = False) -> CommandResult:
+    """Run a command with a hard timeout and capped output.
+
+    Raises CommandTimeout if it does not finish in ``timeout`` seconds and
+    FileNotFoundError if the executable does not exist.
+    """
+    timeout = SUBPROCESS_TIMEOUT_SECONDS if timeout is None else timeout
+    max_output = SUBPROCESS_MAX_OUTPUT_BYTES if max_output is None else max_output
+
+    kwargs = {}
+    if os.name == "nt":
+        kwargs["creationflags"] = subprocess.CREATE_NEW_PROCESS_GROUP
+    else:
+        kwargs["start_new_session"] = True  # own process group for killpg
+
+    started = time.perf_counter()
+    proc = subprocess.Popen(args, stdout=subprocess.PIPE, stderr=subprocess.PIPE,
+                            stdin=subprocess.DEVNULL, shell=shell, **kwargs)
+    out, err, overflow = [], [], []
+    readers = [
+        threading.Thread(target=_drain, args=(proc.stdout, max_output, out, overflow), daemon=True),
+        threading.Thread(target=_drain, args=(proc.stderr, max_output, err, overflow), daemon=True),
+    ]
+    for reader in readers:
+        reader.start()
+
+    try:
+        proc.wait(timeout)
+    except subprocess.TimeoutExpired:
+        _kill_tree(proc)
+        proc.wait()
+        duration = time.perf_counter() - started
+        _record(args, duration, timed_out=True)
+        raise CommandTimeout(args, timeout)
+    finally:
+        for reader in readers:
+            reader.join(KILL_GRACE_SECONDS)
+
+    duration = time.perf_counter() - started
+    _record(args, duration, timed_out=False)
+    return CommandResult(
+        args=args,
+        returncode=proc.returncode,
+        stdout=b"".join(out).decode(errors="replace"),
+        stderr=b"".join(err).decode(errors="replace"),
+        duration=duration,
+        truncated=bool(overflow),
+    )
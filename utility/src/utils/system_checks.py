@@ -3,11 +3,21 @@ import subprocess
 import os
 import uuid
 import socket
+import time
+from concurrent.futures import ThreadPoolExecutor
+from concurrent.futures import TimeoutError as FutureTimeoutError
 from datetime import datetime
 from checks.disk_encryption import check_disk_encryption
 from checks.os_update import check_os_updates
 from checks.antivirus import check_antivirus
 from checks.sleep_settings import check_inactivity_settings
+from checks.registry import CheckCache, registered_checks
+from . import linux_probes, process_snapshot, subprocess_runner
+from .config import CHECK_TIMEOUT_SECONDS, CYCLE_TIMEOUT_SECONDS, CHECK_INTERVAL_MINUTES
+
+def new_check_cache():
+    """Result cache for the agent loop; cheap checks default to CHECK_INTERVAL_MINUTES."""
+    return CheckCache(default_interval_minutes=CHECK_INTERVAL_MINUTES)
 
 def get_machine_id():
     """Generate or retrieve a unique machine identifier."""
@@ -57,49 +67,97 @@ def get_system_info():
             "error": str(e)
         }
 
-def collect_system_info():
-    """Collect all system checks and information."""
+def _timed_check(check_func):
+    """Run a check and record its wall time in the result details.
+
+    If any command the check ran was killed for overrunning its timeout, the
+    check is reported as "timeout" whatever it concluded from the partial
+    output.
+    """
+    started = time.perf_counter()
+    with subprocess_runner.track() as timed_out:
+        try:
+            result = check_func()
+        except Exception as e:
+            result = {"status": "error", "details": {"error": str(e)}}
+    if timed_out:
+        result = {
+            "status": "timeout",
+            "details": {"error": f"Command timed out: {', '.join(timed_out)}", "timed_out_commands": timed_out},
+        }
+    details = dict(result.get("details") or {})
+    details["duration_ms"] = round((time.perf_counter() - started) * 1000, 1)
+    return {"status": result.get("status", "unknown"), "details": details}
+
+def run_checks(checks=None, check_timeout=None, cycle_timeout=None):
+    """Run checks concurrently, bounded by per-check and per-cycle deadlines.
+
+    Returns results in the order of ``checks``. Checks still running at their
+    deadline are reported with status "timeout"; their worker threads are
+    abandoned rather than waited for.
+    """
+    if checks is None:
+        checks = [(spec.name, spec.func) for spec in registered_checks()]
+    check_timeout = CHECK_TIMEOUT_SECONDS if check_timeout is None else check_timeout
+    cycle_timeout = CYCLE_TIMEOUT_SECONDS if cycle_timeout is None else cycle_timeout
+
+    executor = ThreadPoolExecutor(max_workers=max(1, len(checks)), thread_name_prefix="check")
+    try:
+        started = time.monotonic()
+        futures = [(name, executor.submit(_timed_check, func)) for name, func in checks]
+        deadline = started + min(check_timeout, cycle_timeout)
+
+        results = []
+        for name, future in futures:
+            try:
+                result = future.result(timeout=max(0.0, deadline - time.monotonic()))
+            except FutureTimeoutError:
+                future.cancel()
+                result = {
+                    "status": "timeout",
+                    "details": {
+                        "error": f"Check did not finish within {min(check_timeout, cycle_timeout):g} seconds",
+                        "duration_ms": round((time.monotonic() - started) * 1000, 1),
+                    },
+                }
+            results.append({"name": name, "status": result["status"], "details": result["details"]})
+        return results
+    finally:
+        executor.shutdown(wait=False)
+
+def run_due_checks(cache):
+    """Run only the checks whose cached result has expired; reuse the rest."""
+    specs = registered_checks()
+    due = [(spec.name, spec.func) for spec in specs if cache.is_due(spec)]
+    fresh = {r["name"]: r for r in run_checks(due)} if due else {}
+    for result in fresh.values():
+        cache.put(result["name"], result)
+    return [fresh.get(spec.name) or cache.get(spec.name) for spec in specs]
+
+def collect_system_info(cache=None):
+    """Collect all system checks and information.
+
+    With a CheckCache, only checks that are due are run and the cached
+    results of the others are reported; without one every check runs.
+    """
     try:
         # Get basic system info
         system_info = get_system_info()
         machine_id = get_machine_id()
         
-        # Perform all checks
-        disk_encryption_result = check_disk_encryption()
-        os_updates_result = check_os_updates()
-        antivirus_result = check_antivirus()
-        inactivity_result = check_inactivity_settings()
+        # Checks share one process-table scan and one PATH scan per cycle
+        process_snapshot.invalidate()
+        linux_probes.invalidate_path_cache()
         
-        # Compile results
-        checks = [
-            {
-                "name": "disk_encryption",
-                "status": disk_encryption_result["status"],
-                "details": disk_encryption_result["details"]
-            },
-            {
-                "name": "os_updates",
-                "status": os_updates_result["status"],
-                "details": os_updates_result["details"]
-            },
-            {
-                "name": "antivirus",
-                "status": antivirus_result["status"],
-                "details": antivirus_result["details"]
-            },
-            {
-                "name": "inactivity_settings",
-                "status": inactivity_result["status"],
-                "details": inactivity_result["details"]
-            }
-        ]
+        # Perform checks concurrently
+        checks = run_due_checks(cache) if cache is not None else run_checks()
         
         # Determine overall system health
         overall_status = "healthy"
         issues = []
         
         for check in checks:
-            if check["status"] in ["error", "unknown"]:
+            if check["status"] in ["error", "unknown", "timeout"]:
                 overall_status = "unknown"
             elif check["status"] in ["non_compliant", "unprotected", "outdated"]:
                 overall_status = "unhealthy"
@@ -0,0 +1,220 @@
+"""Wake the agent early when files behind a check change (watch mode).
+
+Each check can name the files its result depends on. On Linux the parent
+directories are watched with inotify (through ctypes, no extra dependency);
+elsewhere the files are polled with stat(). Changes are debounced and
+reported by check name, so the agent re-runs only the affected checks; the
+periodic sweep still runs as a safety net for state that is not file-based,
+such as a stopped antivirus service.
+"""
+import ctypes
+import ctypes.util
+import fnmatch
+import glob
+import os
+import platform
+import select
+import struct
+import threading
+import time
+from typing import Dict, List, Optional, Set
+
+from . import linux_probes
+from .config import WATCH_DEBOUNCE_SECONDS, WATCH_POLL_SECONDS
+from .logger import logger
+
+def default_watches(system: Optional[str] = None) -> Dict[str, List[str]]:
+    """Paths (glob patterns) whose changes invalidate each check, per platform."""
+    system = system or platform.system()
+    if system == "Linux":
+        return {
+            "inactivity_settings": list(linux_probes.LOGIND_CONF_FILES),
+            "os_updates": [
+                linux_probes.DPKG_STATUS_FILE,
+                linux_probes.UPDATE_NOTIFIER_FILE,
+                "/var/lib/apt/periodic/update-success-stamp",
+                "/var/lib/rpm/*",
+                "/var/lib/pacman/local/*",
+            ],
+            "disk_encryption": ["/etc/crypttab"],
+        }
+    if system == "Darwin":
+        return {
+            "inactivity_settings": [
+                "/Library/Preferences/com.apple.PowerManagement.plist",
+                "/Library/Preferences/SystemConfiguration/com.apple.PowerManagement*.plist",
+            ],
+            "os_updates": ["/Library/Receipts/InstallHistory.plist", "/Library/Updates/*"],
+        }
+    if system == "Windows":
+        windir = os.environ.get("SystemRoot", r"C:\Windows")
+        return {"os_updates": [os.path.join(windir, "SoftwareDistribution", "ReportingEvents.log")]}
+    return {}
+
+class PollingBackend:
+    """Detect changes by comparing (mtime, size) of every matching file."""
+
+    def __init__(self, patterns: List[str], interval: float = WATCH_POLL_SECONDS):
+        self.patterns = patterns
+        self.interval = interval
+        self._state = self._scan()
+
+    def _scan(self) -> Dict[str, tuple]:
+        state = {}
+        for pattern in self.patterns:
+            for path in glob.glob(pattern):
+                try:
+                    st = os.stat(path)
+                except OSError:
+                    continue
+                state[path] = (st.st_mtime_ns, st.st_size)
+        return state
+
+    def poll(self, timeout: float) -> Set[str]:
+        time.sleep(min(timeout, self.interval))
+        current = self._scan()
+        changed = {p for p in current.keys() | self._state.keys() if current.get(p) != self._state.get(p)}
+        self._state = current
+        return changed
+
+    def close(self):
+        pass
+
+class InotifyBackend:
+    """Watch the parent directories of the patterns with Linux inotify."""
+
+    IN_MODIFY = 0x002
+    IN_ATTRIB = 0x004
+    IN_CLOSE_WRITE = 0x008
+    IN_MOVED_FROM = 0x040
+    IN_MOVED_TO = 0x080
+    IN_CREATE = 0x100
+    IN_DELETE = 0x200
+    IN_NONBLOCK = 0o4000
+    IN_CLOEXEC = 0o2000000
+    MASK = IN_MODIFY | IN_ATTRIB | IN_CLOSE_WRITE | IN_MOVED_FROM | IN_MOVED_TO | IN_CREATE | IN_DELETE
+    _EVENT = struct.Struct("iIII")
+
+    def __init__(self, patterns: List[str]):
+        libc = ctypes.CDLL(ctypes.util.find_library("c") or "libc.so.6", use_errno=True)
+        self._fd = libc.inotify_init1(self.IN_NONBLOCK | self.IN_CLOEXEC)
+        if self._fd < 0:
+            raise OSError(ctypes.get_errno(), "inotify_init1 failed")
+        self._dirs = {}  # watch descriptor -> directory
+        # Files are often replaced by rename, so watch directories rather than files
+        for directory in sorted({os.path.dirname(p) for p in patterns}):
+            if not os.path.isdir(directory):
+                continue
+            wd = libc.inotify_add_watch(self._fd, os.fsencode(directory), self.MASK)
+            if wd >= 0:
+                self._dirs[wd] = directory
+        if not self._dirs:
+            os.close(self._fd)
+            raise OSError("no watchable directories")
+
+    def poll(self, timeout: float) -> Set[str]:
+        ready, _, _ = select.select([self._fd], [], [], timeout)
+        if not ready:
+            return set()
+        try:
+            data = os.read(self._fd, 64 * 1024)
+        except BlockingIOError:
+            return set()
+        changed = set()
+        offset = 0
+        while offset + self._EVENT.size <= len(data):
+            wd, _mask, _cookie, length = self._EVENT.unpack_from(data, offset)
+            offset += self._EVENT.size
+            name = data[offset:offset + length].rstrip(b"\0")
+            offset += length
+            if wd in self._dirs and name:
+                changed.add(os.path.join(self._dirs[wd], os.fsdecode(name)))
+        return changed
+
+    def close(self):
+        os.close(self._fd)
+
+class Watcher:
+    """Background watcher that maps file changes to check names, debounced."""
+
+    def __init__(self, watches: Dict[str, List[str]], backend=None, debounce: float = WATCH_DEBOUNCE_SECONDS):
+        self.watches = watches
+        self.debounce = debounce
+        patterns = [p for paths in watches.values() for p in paths]
+        self._backend = backend or make_backend(patterns)
+        self._cond = threading.Condition()
+        self._pending: Set[str] = set()
+        self._last_event = 0.0
+        self._stopped = False
+        self._thread = threading.Thread(target=self._run, name="watcher", daemon=True)
+
+    def start(self):
+        self._thread.start()
+        return self
+
+    def stop(self):
+        with self._cond:
+            self._stopped = True
+            self._cond.notify_all()
+
+    def checks_for(self, paths: Set[str]) -> Set[str]:
+        return {
+            name
+            for name, patterns in self.watches.items()
+            for path in paths
+            if any(fnmatch.fnmatch(path, pattern) for pattern in patterns)
+        }
+
+    def _run(self):
+        try:
+            while not self._stopped:
+                checks = self.checks_for(self._backend.poll(1.0))
+                if checks:
+                    with self._cond:
+                        self._pending |= checks
+                        self._last_event = time.monotonic()
+                        self._cond.notify_all()
+        except Exception as e:
+            logger.error(f"File watcher stopped: {str(e)}")
+        finally:
+            self._backend.close()
+
+    def wait(self, timeout: float) -> Set[str]:
+        """
+        Sleep until watched files change (and stay quiet for the debounce
+        period), the timeout passes, or the watcher is stopped.
+
+        Returns:
+            Set[str]: Names of the checks affected by changes, possibly empty
+        """
+        deadline = time.monotonic() + timeout
+        with self._cond:
+            while not self._stopped:
+                now = time.monotonic()
+                if self._pending and now - self._last_event >= self.debounce:
+                    break
+                if now >= deadline:
+                    break
+                wake = deadline
+                if self._pending:
+                    wake = min(deadline, self._last_event + self.debounce)
+                self._cond.wait(wake - now)
+            changed, self._pending = self._pending, set()
+        return changed
+
+def make_backend(patterns: List[str]):
+    """inotify on Linux when available, stat polling everywhere else."""
+    if platform.system() == "Linux":
+        try:
+            return InotifyBackend(patterns)
+        except (OSError, AttributeError) as e:
+            logger.info(f"inotify unavailable ({e}); polling watched files instead")
+    return PollingBackend(patterns)
+
+def start_watcher(check_names: List[str]) -> Optional[Watcher]:
+    """Start watching the files behind the given checks; None if there is nothing to watch."""
+    watches = {name: paths for name, paths in default_watches().items() if name in check_names}
+    if not watches:
+        return None
+    logger.info(f"Watch mode: watching files for {', '.join(sorted(watches))}")
+    return Watcher(watches).start()
@@ -0,0 +1,189 @@
+import gzip
+import json
+
+from utils import api_client
+
+
+class FakeResponse:
+    def __init__(self, status_code, headers=None):
+        self.status_code = status_code
+        self.headers = headers or {}
+        self.text = ""
+
+
+class FakeSession:
+    def __init__(self, responses):
+        self.responses = list(responses)
+        self.calls = []
+
+    def post(self, url, data=None, headers=None, timeout=None):
+        self.calls.append({"url": url, "data": data, "headers": headers})
+        return self.responses.pop(0)
+
+
+def test_backoff_uses_full_jitter_and_retry_after(monkeypatch):
+    monkeypatch.setattr(api_client, "RETRY_DELAY", 5)
+    monkeypatch.setattr(api_client, "RETRY_MAX_DELAY", 60)
+
+    delays = [api_client.backoff_delay(4) for _ in range(200)]
+    assert all(0 <= d <= 60 for d in delays)
+    assert len(set(delays)) > 100  # spread out, not lockstep
+
+    assert 30 <= api_client.backoff_delay(0, retry_after=30) <= 35
+    assert api_client.backoff_delay(0, retry_after=10_000) <= 65
+    assert api_client.retry_after_seconds(FakeResponse(503, {"Retry-After": "7"})) == 7
+    assert api_client.retry_after_seconds(FakeResponse(503, {"Retry-After": "soon"})) is None
+
+
+def test_post_json_compresses_and_retries_transient_failures(monkeypatch):
+    session = FakeSession([FakeResponse(503, {"Retry-After": "2"}), FakeResponse(201)])
+    sleeps = []
+    monkeypatch.setattr(api_client, "get_session", lambda: session)
+    monkeypatch.setattr(api_client.time, "sleep", sleeps.append)
+    monkeypatch.setattr(api_client, "API_COMPRESS_MIN_BYTES", 10)
+
+    payload = {"machine_id": "m-1", "checks": [{"name": "antivirus", "status": "protected"}] * 20}
+    assert api_client.post_json("/report", payload).status_code == 201
+
+    assert len(session.calls) == 2
+    assert session.calls[0]["headers"]["Content-Encoding"] == "gzip"
+    assert json.loads(gzip.decompress(session.calls[0]["data"])) == payload
+    assert len(sleeps) == 1 and sleeps[0] >= 2
+
+    # client errors are not retried
+    session = FakeSession([FakeResponse(422), FakeResponse(201)])
+    monkeypatch.setattr(api_client, "get_session", lambda: session)
+    assert api_client.post_json("/report", payload) is None
+    assert len(session.calls) == 1
+
+
+def test_outbox_caps_and_drains_in_order(tmp_path):
+    from utils.outbox import Outbox
+
+    now = [1000.0]
+    outbox = Outbox(str(tmp_path / "outbox.db"), max_items=5, max_bytes=10_000, max_age_hours=1,
+                    clock=lambda: now[0])
+    outbox.append({"n": 0})
+    now[0] += 7200  # report 0 is now past the age cap
+    for n in range(1, 8):
+        outbox.append({"n": n})
+    assert [p["n"] for _, p in outbox.peek(10)] == [3, 4, 5, 6, 7]
+
+    batches = []
+    outbox.drain(lambda b: batches.append([p["n"] for p in b]) or len(batches) < 2, batch_size=2)
+    assert batches == [[3, 4], [5, 6]]
+    assert [p["n"] for _, p in outbox.peek(10)] == [5, 6, 7]  # failed batch stays queued
+
+    outbox.drain(lambda b: batches.append([p["n"] for p in b]) or True, batch_size=2)
+    assert batches[-2:] == [[5, 6], [7]]
+    assert len(outbox) == 0
+
+    small = Outbox(str(tmp_path / "small.db"), max_bytes=45)  # two 21-byte payloads
+    for n in range(5):
+        small.append({"n": n, "pad": "x" * 5})
+    assert [p["n"] for _, p in small.peek(10)] == [3, 4]
+
+
+def test_outbox_dead_letters_rejected_report_at_head(tmp_path, monkeypatch):
+    from utils.outbox import Outbox
+
+    outbox = Outbox(str(tmp_path / "outbox.db"))
+    for n in range(6):
+        outbox.append({"n": n, "bad": n == 0})
+
+    delivered = []
+
+    def send_batch(batch):
+        if any(p["bad"] for p in batch):
+            raise api_client.RequestRejected(422)
+        delivered.extend(p["n"] for p in batch)
+        return True
+
+    assert outbox.drain(send_batch, batch_size=4) == 5
+    assert delivered == [1, 2, 3, 4, 5]
+    assert outbox.dead_letters() == [(422, {"n": 0, "bad": True})]
+    assert len(outbox) == 0
+
+    # post_json only raises for rejected payloads when asked to
+    session = FakeSession([FakeResponse(413)])
+    monkeypatch.setattr(api_client, "get_session", lambda: session)
+    try:
+        api_client.post_json("/report/batch", [{"n": 0}], raise_rejected=True)
+    except api_client.RequestRejected as e:
+        assert e.status_code == 413
+    else:
+        raise AssertionError("RequestRejected not raised")
+
+
+def test_deliver_report_queues_when_offline(tmp_path, monkeypatch):
+    import main
+    from utils.outbox import Outbox
+
+    outbox = Outbox(str(tmp_path / "outbox.db"))
+    sent_batches = []
+    online = [False]
+    monkeypatch.setattr(api_client, "send_report", lambda data: online[0])
+    monkeypatch.setattr(api_client, "send_report_batch", lambda b: online[0] and not sent_batches.append(b))
+
+    state = {"machine_id": "m-1", "timestamp": "2026-01-01T00:00:00", "checks": []}
+    assert main.deliver_report(state, outbox) == "queued"
+    assert main.deliver_report(dict(state, timestamp="2026-01-01T00:30:00"), outbox) == "queued"
+    online[0] = True
+    assert main.deliver_report(dict(state, timestamp="2026-01-01T01:00:00"), outbox) == "sent"
+    assert [p["observed_at"] for p in sent_batches[0]] == [
+        "2026-01-01T00:00:00", "2026-01-01T00:30:00", "2026-01-01T01:00:00"]
+
+
+def test_delta_report_sends_only_changed_checks(tmp_path, monkeypatch):
+    import main
+    from utils import state_manager
+    from utils.outbox import Outbox
+
+    def state(os_status, pending):
+        return {"machine_id": "m-1", "timestamp": "2026-01-01T00:00:00", "checks": [
+            {"name": "antivirus", "status": "protected", "details": {"duration_ms": 12.5}},
+            {"name": "os_updates", "status": os_status, "details": {"count": pending}},
+        ]}
+
+    last = {"checks": [
+        {"name": c["name"], "status": c["status"], "hash": state_manager.check_hash(c)}
+        for c in state("up_to_date", 0)["checks"]
+    ]}
+    current = state("up_to_date", 0)
+    current["checks"][0]["details"]["duration_ms"] = 40.0  # volatile, not a change
+    assert state_manager.changed_checks(current, last) == []
+    assert state_manager.changed_checks(state("up_to_date", 3), last) == ["os_updates"]
+
+    sent = []
+    monkeypatch.setattr(main.config, "REPORT_MODE", "delta")
+    monkeypatch.setattr(api_client, "send_delta_report", lambda p: sent.append(p) or {"checks_stored": 1})
+    outbox = Outbox(str(tmp_path / "outbox.db"))
+    assert main.deliver_report(state("outdated", 3), outbox, last) == "sent"
+    assert [c["name"] for c in sent[0]["checks"]] == ["os_updates"]
+    assert "hostname" not in sent[0]
+
+    # a delta that cannot be sent is queued as the full report
+    monkeypatch.setattr(api_client, "send_delta_report", lambda p: None)
+    assert main.deliver_report(state("outdated", 4), outbox, last) == "queued"
+    [(_, queued)] = outbox.peek(10)
+    assert [c["name"] for c in queued["checks"]] == ["antivirus", "os_updates"]
+    assert "hostname" in queued
+
+
+def test_heartbeat_falls_back_to_full_report(tmp_path, monkeypatch):
+    import main
+    from utils import state_manager
+    from utils.outbox import Outbox
+
+    state = {"machine_id": "m-1", "timestamp": "2026-01-01T00:00:00",
+             "checks": [{"name": "antivirus", "status": "protected", "details": {}}]}
+    beats, reports = [], []
+    replies = [{"full_report_required": False}, {"full_report_required": True}]
+    monkeypatch.setattr(api_client, "send_heartbeat", lambda mid, h: beats.append(h) or replies.pop(0))
+    monkeypatch.setattr(api_client, "send_report", lambda data: reports.append(data) or True)
+    outbox = Outbox(str(tmp_path / "outbox.db"))
+
+    assert main.send_heartbeat(state, outbox) and reports == []
+    assert main.send_heartbeat(state, outbox) and reports == [state]
+    assert beats == [state_manager.state_hash(state)] * 2
+    assert api_client.build_report_payload(state)["state_hash"] == beats[0]
@@ -0,0 +1,215 @@
+import sys
+import time
+
+import pytest
+
+from utils import system_checks
+
+
+def test_run_checks_runs_concurrently_and_records_duration():
+    def slow():
+        time.sleep(0.3)
+        return {"status": "ok", "details": {}}
+
+    started = time.monotonic()
+    results = system_checks.run_checks([("a", slow), ("b", slow), ("c", slow)], check_timeout=5, cycle_timeout=5)
+    elapsed = time.monotonic() - started
+
+    assert [r["name"] for r in results] == ["a", "b", "c"]
+    assert all(r["status"] == "ok" for r in results)
+    assert all(r["details"]["duration_ms"] >= 250 for r in results)
+    assert elapsed < 0.8
+
+
+def test_run_checks_reports_timeout_and_errors():
+    def hang():
+        time.sleep(2)
+        return {"status": "ok", "details": {}}
+
+    def boom():
+        raise RuntimeError("probe failed")
+
+    results = system_checks.run_checks([("hang", hang), ("boom", boom)], check_timeout=0.2, cycle_timeout=5)
+    by_name = {r["name"]: r for r in results}
+
+    assert by_name["hang"]["status"] == "timeout"
+    assert by_name["boom"]["status"] == "error"
+    assert by_name["boom"]["details"]["error"] == "probe failed"
+
+
+def test_check_cache_reruns_only_due_checks():
+    from checks.registry import CheckCache, CheckSpec
+
+    now = [0.0]
+    calls = []
+
+    def make(name, status="ok"):
+        def check():
+            calls.append(name)
+            return {"status": status, "details": {}}
+        return check
+
+    specs = [
+        CheckSpec("cheap", make("cheap"), interval_minutes=15),
+        CheckSpec("daily", make("daily"), interval_minutes=24 * 60),
+        CheckSpec("flaky", make("flaky", status="error"), interval_minutes=24 * 60),
+    ]
+    cache = CheckCache(default_interval_minutes=30, clock=lambda: now[0])
+
+    def cycle():
+        due = [(s.name, s.func) for s in specs if cache.is_due(s)]
+        for result in system_checks.run_checks(due):
+            cache.put(result["name"], result)
+
+    cycle()
+    assert sorted(calls) == ["cheap", "daily", "flaky"]
+    assert cache.seconds_until_next_due(specs) == 15 * 60
+
+    calls.clear()
+    now[0] = 16 * 60
+    cycle()
+    assert calls == ["cheap"]
+
+    # errors are retried at the default interval, not the check's own
+    calls.clear()
+    now[0] = 31 * 60
+    cycle()
+    assert sorted(calls) == ["cheap", "flaky"]
+
+
+def test_linux_probes_read_sysfs_and_logind(tmp_path, monkeypatch):
+    from utils import linux_probes
+
+    dm = tmp_path / "block" / "dm-0" / "dm"
+    dm.mkdir(parents=True)
+    (dm / "uuid").write_text("CRYPT-LUKS2-0123abcd-cryptroot\n")
+    (dm / "name").write_text("cryptroot\n")
+    plain = tmp_path / "block" / "dm-1" / "dm"
+    plain.mkdir(parents=True)
+    (plain / "uuid").write_text("LVM-abcdef\n")
+    monkeypatch.setattr(linux_probes, "SYS_BLOCK_DIR", str(tmp_path / "block"))
+    assert linux_probes.crypt_devices() == ["cryptroot (LUKS2)"]
+
+    conf = tmp_path / "logind.conf"
+    conf.write_text("[Login]\n#IdleAction=ignore\nIdleAction=suspend\nIdleActionSec=30min\n")
+    vendor, etc = tmp_path / "lib" / "logind.conf.d", tmp_path / "etc" / "logind.conf.d"
+    vendor.mkdir(parents=True)
+    etc.mkdir(parents=True)
+    (vendor / "10-idle.conf").write_text("[Login]\nIdleActionSec=1min\nHandleLidSwitch=ignore\n")
+    (vendor / "20-idle.conf").write_text("[Login]\nIdleActionSec=5min\n")
+    (etc / "10-idle.conf").write_text("[Login]\nIdleAction=lock\n")  # replaces the vendor 10-idle.conf
+    monkeypatch.setattr(linux_probes, "LOGIND_CONF_FILE", str(conf))
+    monkeypatch.setattr(linux_probes, "LOGIND_DROPIN_DIRS", [str(vendor), str(tmp_path / "run"), str(etc)])
+    assert linux_probes.logind_conf_files() == [str(conf), str(etc / "10-idle.conf"), str(vendor / "20-idle.conf")]
+    settings = linux_probes.logind_settings()
+    assert settings == {"IdleAction": "lock", "IdleActionSec": "5min"}
+    assert linux_probes.parse_timespan("1h 30min") == 5400
+    assert linux_probes.parse_timespan("soon") is None
+
+    # PATH is scanned once and rescanned after invalidate_path_cache()
+    bin_dir = tmp_path / "bin"
+    bin_dir.mkdir()
+    monkeypatch.setenv("PATH", str(bin_dir))
+    assert not linux_probes.which("clamscan")
+    tool = bin_dir / "clamscan"
+    tool.write_text("#!/bin/sh\n")
+    tool.chmod(0o755)
+    assert not linux_probes.which("clamscan")
+    linux_probes.invalidate_path_cache()
+    assert linux_probes.which("clamscan")
+
+
+def test_process_snapshot_drives_antivirus_detection(monkeypatch):
+    from checks import antivirus
+    from utils import linux_probes, process_snapshot
+
+    snapshot = process_snapshot.ProcessSnapshot([
+        {"name": "McShield.exe", "cmdline": "McShield.exe"},
+        {"name": "mcafee-agent.exe", "cmdline": "C:\\Program Files\\McAfee\\mcafee-agent.exe"},
+        {"name": "clamscan", "cmdline": "/usr/bin/clamscan -r /home"},
+    ])
+    assert snapshot.has_image("MCSHIELD.EXE")
+    assert snapshot.has_image_prefix("mcafee")
+    assert not snapshot.has_image_prefix("norton")
+    assert snapshot.cmdline_contains("clamscan -r")
+
+    scans = []
+    monkeypatch.setattr(process_snapshot, "take_snapshot", lambda: scans.append(1) or snapshot)
+    monkeypatch.setattr(linux_probes, "which", lambda cmd: cmd in ("clamscan", "avast"))
+    process_snapshot.invalidate()
+
+    windows = antivirus._detect_products("Windows")
+    linux = antivirus._detect_products("Linux")
+
+    assert [p["name"] for p in windows] == ["McAfee"]
+    assert {p["name"]: p["status"] for p in linux} == {"ClamAV": "running", "Avast": "installed"}
+    assert len(scans) == 1
+
+
+def test_subprocess_runner_kills_process_group_and_caps_output():
+    from utils import subprocess_runner
+
+    result = subprocess_runner.run_command(["sh", "-c", "head -c 5000 /dev/zero"], max_output=1000)
+    assert result.returncode == 0
+    assert len(result.stdout) == 1000 and result.truncated
+
+    def hung_command():
+        # the grandchild keeps the pipe open; only a group kill ends it
+        subprocess_runner.run_command(["sh", "-c", "sleep 30 & sleep 30"], timeout=0.3)
+        return {"status": "ok", "details": {}}
+
+    started = time.monotonic()
+    results = system_checks.run_checks([("hung", hung_command)], check_timeout=10, cycle_timeout=10)
+    assert time.monotonic() - started < 5
+    assert results[0]["status"] == "timeout"
+    assert results[0]["details"]["timed_out_commands"] == ["sh"]
+    assert subprocess_runner.metrics()["sh"]["timeouts"] >= 1
+
+
+@pytest.mark.skipif(not sys.platform.startswith("linux"), reason="reads /proc")
+def test_subprocess_runner_kills_group_members_that_ignore_sigterm(tmp_path):
+    from utils import subprocess_runner
+
+    pid_file = tmp_path / "pid"
+    # the leader dies on SIGTERM at once; its child ignores SIGTERM
+    script = f"sh -c 'trap \"\" TERM; exec sleep 30' & echo $! > {pid_file}; wait"
+    with pytest.raises(subprocess_runner.CommandTimeout):
+        subprocess_runner.run_command(["sh", "-c", script], timeout=0.3)
+
+    pid = int(pid_file.read_text())
+    deadline = time.monotonic() + 5
+    while time.monotonic() < deadline:
+        try:
+            with open(f"/proc/{pid}/stat") as f:
+                alive = f.read().split(")")[-1].split()[0] != "Z"
+        except FileNotFoundError:
+            alive = False
+        if not alive:
+            break
+        time.sleep(0.05)
+    assert not alive
+
+
+def test_watcher_debounces_changes_into_check_names(tmp_path):
+    from utils import watcher as watcher_mod
+
+    conf = tmp_path / "logind.conf"
+    conf.write_text("[Login]\n")
+    watches = {"inactivity_settings": [str(conf)], "os_updates": [str(tmp_path / "status")]}
+
+    patterns = sum(watches.values(), [])
+    factories = [lambda: watcher_mod.PollingBackend(patterns, interval=0.05)]
+    if sys.platform.startswith("linux"):
+        factories.append(lambda: watcher_mod.InotifyBackend(patterns))
+    for make_backend in factories:
+        w = watcher_mod.Watcher(watches, backend=make_backend(), debounce=0.2).start()
+        try:
+            assert w.wait(0.1) == set()
+            time.sleep(0.05)
+            for i in range(3):  # a burst of writes is one wake-up
+                conf.write_text(f"[Login]\nIdleAction=suspend\nIdleActionSec={i}min\n")
+                time.sleep(0.05)
+            assert w.wait(5) == {"inactivity_settings"}
+            assert w.wait(0.3) == set()
+        finally:
+            w.stop()